@@ -0,0 +1,169 @@
+import argparse
+import logging
+import time
+from typing import List
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+from peerscout.shared.database import Database
+from peerscout.utils.pandas import iter_records
+from peerscout.shared.database_bulk_load import BulkLoadMethods, COPY_DIALECT_NAMES
+
+LOGGER = logging.getLogger(__name__)
+
+STAGE_NAMES = ['Contacting Reviewers', 'Reviewers Accept', 'Review Received']
+
+
+class BulkLoadPaths:
+    # Entity.write_frame into the empty table
+    WRITE_FRAME = 'write_frame'
+    # the staged import into the populated table (see load_frames_staged of the import)
+    STAGED_UPSERT = 'staged upsert'
+
+
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description=(
+            "PeerScout, bulk load (write_frame) throughput benchmark using generated data"
+            " (the schema of the database will be re-created if out of date,"
+            " use a scratch database)"
+        )
+    )
+    parser.add_argument(
+        "--database-url", default='sqlite://',
+        help="SQLAlchemy database URL (defaults to an in-memory SQLite database)"
+    )
+    parser.add_argument(
+        "--rows", type=int, default=100000,
+        help="Number of manuscript stage rows to load"
+    )
+    parser.add_argument(
+        "--methods",
+        help="Comma separated list of bulk load methods (defaults to all supported methods)"
+    )
+    return parser.parse_args(argv)
+
+
+def generate_frames(row_count: int, seed: int = 0) -> dict:
+    random = np.random.RandomState(seed)
+    version_count = max(1, row_count // 10)
+    person_count = max(1, row_count // 5)
+    person_ids = np.array(['p%d' % i for i in range(person_count)], dtype=object)
+    version_ids = np.array(['m%d-1' % i for i in range(version_count)], dtype=object)
+    return {
+        'person': pd.DataFrame({
+            'person_id': person_ids,
+            'first_name': ['First %d' % i for i in range(person_count)],
+            'last_name': ['Last %d' % i for i in range(person_count)],
+            'is_early_career_researcher': False
+        }),
+        'manuscript': pd.DataFrame({
+            'manuscript_id': ['m%d' % i for i in range(version_count)]
+        }),
+        'manuscript_version': pd.DataFrame({
+            'version_id': version_ids,
+            'manuscript_id': ['m%d' % i for i in range(version_count)],
+            'title': ['Title %d' % i for i in range(version_count)],
+            'decision': 'Accept Full Submission'
+        }),
+        'manuscript_stage': pd.DataFrame({
+            'version_id': version_ids[random.randint(0, version_count, row_count)],
+            'person_id': person_ids[random.randint(0, person_count, row_count)],
+            'triggered_by_person_id': None,
+            # unique timestamps keep the primary key unique
+            'stage_timestamp': (
+                pd.Timestamp('2010-01-01') + pd.to_timedelta(np.arange(row_count), unit='s')
+            ),
+            'stage_name': np.array(STAGE_NAMES, dtype=object)[
+                random.randint(0, len(STAGE_NAMES), row_count)
+            ]
+        })
+    }
+
+
+def get_supported_methods(dialect_name: str) -> List[str]:
+    methods = [BulkLoadMethods.EXECUTEMANY]
+    if dialect_name in COPY_DIALECT_NAMES:
+        methods.append(BulkLoadMethods.COPY)
+    return methods
+
+
+def run_benchmark(db: Database, frames: dict, methods: List[str]) -> List[dict]:
+    with db.semi_transaction():
+        for table_name in reversed(db.sorted_table_names()):
+            if table_name in frames:
+                db[table_name].delete_all()
+    with db.semi_transaction():
+        for table_name in ['person', 'manuscript', 'manuscript_version']:
+            db[table_name].write_frame(frames[table_name], index=False)
+    results = []
+    stage_df = frames['manuscript_stage']
+    for method in methods:
+        with db.semi_transaction():
+            db.manuscript_stage.delete_all()
+        start = time.time()
+        with db.semi_transaction():
+            db.manuscript_stage.write_frame(stage_df, bulk_load_method=method, index=False)
+        results.append(_get_result(method, BulkLoadPaths.WRITE_FRAME, stage_df, start))
+        assert db.manuscript_stage.count() == len(stage_df)
+
+        start = time.time()
+        _upsert_staged(db, stage_df, method)
+        results.append(_get_result(method, BulkLoadPaths.STAGED_UPSERT, stage_df, start))
+        assert db.manuscript_stage.count() == len(stage_df)
+    return results
+
+
+def _upsert_staged(db: Database, df, method: str):
+    table = db.manuscript_stage
+    # the rows are staged using the passed in bulk load method
+    table.bulk_load_method = method
+    with db.semi_transaction() as session:
+        staging_table = table.stage_records(iter_records(df))
+        table.delete_stale_staged(staging_table, 'version_id')
+        table.upsert_staged(staging_table)
+        staging_table.drop(session.connection())
+
+
+def _get_result(method: str, path: str, df, start: float) -> dict:
+    duration = time.time() - start
+    LOGGER.info('%s (%s): %d rows in %.3fs', method, path, len(df), duration)
+    return {
+        'method': method,
+        'path': path,
+        'rows': len(df),
+        'duration': duration,
+        'rows_per_second': len(df) / duration
+    }
+
+
+def main(argv: List[str] = None):
+    args = parse_args(argv)
+    db = Database(sqlalchemy.create_engine(args.database_url, echo=False))
+    try:
+        db.update_schema()
+        methods = (
+            [s.strip() for s in args.methods.split(',')]
+            if args.methods
+            else get_supported_methods(db.engine.dialect.name)
+        )
+        frames = generate_frames(args.rows)
+        results = run_benchmark(db, frames, methods)
+    finally:
+        db.close()
+
+    print('dialect: %s, rows: %d' % (db.engine.dialect.name, args.rows))
+    print('%12s %14s %10s %12s' % ('method', 'path', 'time (s)', 'rows/s'))
+    for result in results:
+        print('%12s %14s %10.3f %12.0f' % (
+            result['method'], result['path'], result['duration'], result['rows_per_second']
+        ))
+
+
+if __name__ == "__main__":
+    from peerscout.shared.logging_config import configure_logging
+    configure_logging('benchmark')
+
+    main()
@@ -0,0 +1,331 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import traceback
+from functools import partial
+from typing import Callable, List
+
+import sqlalchemy
+
+from peerscout.shared.database import Database
+from peerscout.shared.database_bulk_load import parse_staged_load_table_names
+
+from peerscout.preprocessing import convertEditorsCsv
+from peerscout.preprocessing import import_editor_roles_and_keywords_csv
+from peerscout.preprocessing import importEarlyCareerResearchersCsv
+from peerscout.preprocessing.importDataToDatabase import (
+    BatchedZipImport,
+    convert_zip_file,
+    default_field_mapping_by_table_name
+)
+from peerscout.preprocessing.synthetic_data import (
+    CSV_DIR_NAME,
+    DEFAULT_MANUSCRIPTS_PER_ZIP,
+    EARLY_CAREER_RESEARCHERS_CSV_PREFIX,
+    EDITOR_ROLES_AND_KEYWORDS_CSV_PREFIX,
+    EDITORS_CSV_PREFIX,
+    XML_DIR_NAME,
+    generate_dataset
+)
+
+LOGGER = logging.getLogger(__name__)
+
+DATABASE_FILENAME = 'import-benchmark.db'
+
+
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description=(
+            "PeerScout, end-to-end import benchmark using a generated dataset"
+            " (the rows of the database will be deleted, use a scratch database)."
+            " The steps requiring network access or language models"
+            " (enrichData, generateTextTokens, generateLdaDocVec, generateDoc2Vec)"
+            " are not included."
+        )
+    )
+    parser.add_argument(
+        "--database-url",
+        help=(
+            "SQLAlchemy database URL, e.g. of a local PostgreSQL database"
+            " (defaults to an SQLite database within the data directory)"
+        )
+    )
+    parser.add_argument(
+        "--data-dir",
+        help="Directory to generate the dataset to (defaults to a temporary directory)"
+    )
+    parser.add_argument(
+        "--manuscripts", type=int, default=10000,
+        help="Number of manuscripts to generate"
+    )
+    parser.add_argument(
+        "--manuscripts-per-zip", type=int, default=DEFAULT_MANUSCRIPTS_PER_ZIP,
+        help="Number of manuscripts per generated zip file"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="Random seed of the generated dataset"
+    )
+    parser.add_argument(
+        "--staged-load", action="store_true",
+        help="Import using staging tables (see staged_load_enabled)"
+    )
+    parser.add_argument(
+        "--staged-load-tables",
+        help=(
+            "Comma separated list of tables imported using staging tables"
+            " (see staged_load_tables, defaults to manuscript_stage, manuscript_author"
+            " on PostgreSQL)"
+        )
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Number of worker processes converting the XML files of each zip file"
+    )
+    parser.add_argument(
+        "--zips-per-commit", type=int, default=1,
+        help="Number of zip files imported per transaction (0: a single transaction)"
+    )
+    parser.add_argument(
+        "--reimport", action="store_true",
+        help="Also measure importing the unchanged XML files again (comparing the rows)"
+    )
+    return parser.parse_args(argv)
+
+
+def get_peak_memory() -> int:
+    """Returns the peak resident set size of the current process (in bytes)."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def _run_and_send_result(fn: Callable, connection):
+    try:
+        start = time.time()
+        row_count = fn()
+        connection.send({
+            'rows': row_count,
+            'duration': time.time() - start,
+            'peak_memory': get_peak_memory()
+        })
+    except Exception:  # pylint: disable=broad-except
+        connection.send({'error': traceback.format_exc()})
+    finally:
+        connection.close()
+
+
+def run_in_separate_process(fn: Callable) -> dict:
+    """Runs fn (returning the number of rows processed) in a new process, to measure the peak
+    memory of just that stage. Returns the rows, duration and peak memory."""
+    receive_connection, send_connection = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_run_and_send_result, args=(fn, send_connection))
+    process.start()
+    send_connection.close()
+    try:
+        result = receive_connection.recv()
+    except EOFError:
+        result = {'error': 'process exited with code %s' % process.exitcode}
+    process.join()
+    if 'error' in result:
+        raise Exception('benchmark stage failed: %s' % result['error'])
+    return result
+
+
+def _connect(database_url: str) -> Database:
+    return Database(sqlalchemy.create_engine(database_url, echo=False))
+
+
+def _list_files(directory: str, ext: str, prefix: str = '') -> List[str]:
+    return sorted(
+        os.path.join(directory, filename)
+        for filename in os.listdir(directory)
+        if filename.endswith(ext) and filename.startswith(prefix)
+    )
+
+
+def _get_converted_row_count(row_counts_by_table_name: dict) -> int:
+    return sum(
+        sum(
+            count for name, count in row_counts.items()
+            if name in {'staged', 'inserted', 'updated', 'unchanged'}
+        )
+        for row_counts in (row_counts_by_table_name or {}).values()
+    )
+
+
+def generate_stage(
+        data_dir: str, manuscript_count: int, seed: int, manuscripts_per_zip: int) -> int:
+    generate_dataset(
+        data_dir, manuscript_count, seed=seed, manuscripts_per_zip=manuscripts_per_zip
+    )
+    return manuscript_count
+
+
+def import_xml_stage(
+        database_url: str, data_dir: str, staged_load: bool, max_workers: int,
+        zips_per_commit: int = 1, reimport: bool = False,
+        staged_load_tables: str = None) -> int:
+    db = _connect(database_url)
+    try:
+        db.staged_load_table_names = parse_staged_load_table_names(
+            staged_load_tables, db.engine.dialect.name
+        )
+        batched_zip_import = BatchedZipImport(db, zips_per_commit=zips_per_commit)
+        row_count = 0
+        for zip_filename in _list_files(os.path.join(data_dir, XML_DIR_NAME), '.zip'):
+            with open(zip_filename, 'rb') as zip_stream:
+                row_count += _get_converted_row_count(batched_zip_import.process(
+                    zip_filename, partial(
+                        convert_zip_file,
+                        zip_filename, zip_stream, db, default_field_mapping_by_table_name,
+                        early_career_researcher_person_ids=set(),
+                        skip_if_processed=not reimport,
+                        staged_load=staged_load,
+                        max_workers=max_workers,
+                        skip_unchanged_files=not reimport,
+                        commit=False
+                    )
+                ))
+        batched_zip_import.finish()
+        return row_count
+    finally:
+        db.close()
+
+
+def refresh_materialized_views_stage(database_url: str) -> int:
+    db = _connect(database_url)
+    try:
+        db.refresh_materialized_views()
+        return db.person_review_stats_overall.count()
+    finally:
+        db.close()
+
+
+def convert_editors_csv_stage(data_dir: str) -> int:
+    csv_filename = _list_files(os.path.join(data_dir, CSV_DIR_NAME), '.csv', EDITORS_CSV_PREFIX)[0]
+    valid_emails_filename = os.path.join(data_dir, 'valid-emails.txt')
+    with open(csv_filename, 'r') as f:
+        convertEditorsCsv.convert_csv_file_to(csv_filename, f, valid_emails_filename)
+    with open(valid_emails_filename, 'r') as f:
+        return len(f.read().splitlines())
+
+
+def import_csv_stage(database_url: str, data_dir: str, module, prefix: str) -> int:
+    csv_filename = _list_files(os.path.join(data_dir, CSV_DIR_NAME), '.csv', prefix)[0]
+    db = _connect(database_url)
+    try:
+        with open(csv_filename, 'r') as f:
+            module.import_csv_file_to_database(csv_filename, f, db)
+        db.commit()
+    finally:
+        db.close()
+    with open(csv_filename, 'r') as f:
+        # excluding the header lines
+        return len(f.read().splitlines()) - 4
+
+
+def get_stages(args, database_url: str, data_dir: str) -> List[tuple]:
+    stages = [
+        ('generate', partial(
+            generate_stage, data_dir, args.manuscripts, args.seed, args.manuscripts_per_zip
+        )),
+        ('importDataToDatabase', partial(
+            import_xml_stage, database_url, data_dir, args.staged_load, args.workers,
+            zips_per_commit=args.zips_per_commit, staged_load_tables=args.staged_load_tables
+        ))
+    ]
+    if args.reimport:
+        stages.append(('importDataToDatabase (unchanged)', partial(
+            import_xml_stage, database_url, data_dir, args.staged_load, args.workers,
+            zips_per_commit=args.zips_per_commit, reimport=True,
+            staged_load_tables=args.staged_load_tables
+        )))
+    return stages + [
+        ('refresh_materialized_views', partial(refresh_materialized_views_stage, database_url)),
+        ('convertEditorsCsv', partial(convert_editors_csv_stage, data_dir)),
+        ('import_editor_roles_and_keywords_csv', partial(
+            import_csv_stage, database_url, data_dir, import_editor_roles_and_keywords_csv,
+            EDITOR_ROLES_AND_KEYWORDS_CSV_PREFIX
+        )),
+        ('importEarlyCareerResearchersCsv', partial(
+            import_csv_stage, database_url, data_dir, importEarlyCareerResearchersCsv,
+            EARLY_CAREER_RESEARCHERS_CSV_PREFIX
+        ))
+    ]
+
+
+def prepare_database(database_url: str):
+    db = _connect(database_url)
+    try:
+        db.update_schema()
+        with db.semi_transaction():
+            for table_name in reversed(db.sorted_table_names()):
+                if table_name != 'schema_version':
+                    db[table_name].delete_all()
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_benchmark(stages: List[tuple]) -> List[dict]:
+    results = []
+    for name, fn in stages:
+        result = {'stage': name, **run_in_separate_process(fn)}
+        result['rows_per_second'] = result['rows'] / max(result['duration'], 1e-9)
+        LOGGER.info(
+            '%s: %d rows in %.3fs (%.0f rows/s), peak %.1f MB', name, result['rows'],
+            result['duration'], result['rows_per_second'], result['peak_memory'] / 1e6
+        )
+        results.append(result)
+    return results
+
+
+def _run_main(args, data_dir: str):
+    database_url = args.database_url
+    if not database_url:
+        database_filename = os.path.join(data_dir, DATABASE_FILENAME)
+        if os.path.exists(database_filename):
+            os.remove(database_filename)
+        database_url = 'sqlite:///%s' % database_filename
+    prepare_database(database_url)
+    results = run_benchmark(get_stages(args, database_url, data_dir))
+
+    backend_name = sqlalchemy.engine.url.make_url(database_url).get_backend_name()
+    print(
+        'database: %s, manuscripts: %d (%d per zip), staged load: %s (tables: %s),'
+        ' workers: %d, zips per commit: %d' % (
+            backend_name, args.manuscripts, args.manuscripts_per_zip, args.staged_load,
+            ', '.join(parse_staged_load_table_names(args.staged_load_tables, backend_name)),
+            args.workers, args.zips_per_commit
+        )
+    )
+    print('%-40s %10s %10s %12s %16s' % (
+        'stage', 'rows', 'time (s)', 'rows/s', 'peak memory (MB)'
+    ))
+    for result in results:
+        print('%-40s %10d %10.3f %12.0f %16.1f' % (
+            result['stage'], result['rows'], result['duration'], result['rows_per_second'],
+            result['peak_memory'] / 1e6
+        ))
+
+
+def main(argv: List[str] = None):
+    args = parse_args(argv)
+    if args.data_dir:
+        _run_main(args, args.data_dir)
+    else:
+        with tempfile.TemporaryDirectory() as data_dir:
+            _run_main(args, data_dir)
+
+
+if __name__ == "__main__":
+    from peerscout.shared.logging_config import configure_logging
+    configure_logging('benchmark')
+
+    main()
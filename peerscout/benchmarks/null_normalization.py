@@ -0,0 +1,124 @@
+import argparse
+import logging
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from peerscout.utils.collection import iter_chunks
+from peerscout.utils.pandas import iter_records, replace_null_with_none
+
+LOGGER = logging.getLogger(__name__)
+
+NULL_FRACTION = 0.1
+RECORDS_CHUNK_SIZE = 1000
+
+
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description=(
+            "PeerScout, peak memory and duration of replacing pandas nulls with None"
+            " using a generated data frame"
+        )
+    )
+    parser.add_argument(
+        "--rows", type=int, default=1000000,
+        help="Number of data frame rows to generate"
+    )
+    return parser.parse_args(argv)
+
+
+def generate_frame(row_count: int, seed: int = 0) -> pd.DataFrame:
+    random = np.random.RandomState(seed)
+
+    def null_mask():
+        return random.random_sample(row_count) < NULL_FRACTION
+
+    ids = np.array(['id%d' % i for i in range(row_count)], dtype=object)
+    names = ids.copy()
+    names[null_mask()] = None
+    return pd.DataFrame({
+        'id': ids,
+        'name': names,
+        'count': random.randint(0, 100, row_count),
+        'score': np.where(null_mask(), np.nan, random.random_sample(row_count)),
+        'timestamp': pd.Series(
+            pd.Timestamp('2010-01-01') + pd.to_timedelta(np.arange(row_count), unit='s')
+        ).where(~null_mask()),
+        'flag': random.random_sample(row_count) < 0.5
+    })
+
+
+def _astype_where(df: pd.DataFrame) -> pd.DataFrame:
+    # the previous implementation of replace_null_with_none
+    return df.astype(object).where((pd.notnull(df)), None)
+
+
+def _consume_records_in_chunks(df: pd.DataFrame) -> int:
+    # e.g. a bulk insert of one chunk at a time
+    count = 0
+    for chunk in iter_chunks(iter_records(df), RECORDS_CHUNK_SIZE):
+        count += len(chunk)
+    return count
+
+
+def get_variants() -> Dict[str, Callable[[pd.DataFrame], object]]:
+    return {
+        'frame: astype(object).where': _astype_where,
+        'frame: replace_null_with_none': replace_null_with_none,
+        'records: astype(object).where': lambda df: (
+            _astype_where(df).to_dict(orient='records')
+        ),
+        'records: replace_null_with_none': lambda df: (
+            replace_null_with_none(df).to_dict(orient='records')
+        ),
+        'records: iter_records (chunks)': _consume_records_in_chunks
+    }
+
+
+def measure(fn: Callable, df: pd.DataFrame) -> dict:
+    start = time.time()
+    fn(df)
+    duration = time.time() - start
+    # separate run, tracing the allocations slows it down
+    tracemalloc.start()
+    try:
+        fn(df)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'duration': duration, 'peak_memory': peak}
+
+
+def run_benchmark(df: pd.DataFrame) -> List[dict]:
+    results = []
+    for name, fn in get_variants().items():
+        result = {'variant': name, **measure(fn, df)}
+        LOGGER.info(
+            '%s: %.3fs, peak %.1f MB', name, result['duration'], result['peak_memory'] / 1e6
+        )
+        results.append(result)
+    return results
+
+
+def main(argv: List[str] = None):
+    args = parse_args(argv)
+    df = generate_frame(args.rows)
+    frame_memory = df.memory_usage(deep=True).sum()
+    results = run_benchmark(df)
+
+    print('rows: %d, frame: %.1f MB' % (args.rows, frame_memory / 1e6))
+    print('%-35s %10s %16s' % ('variant', 'time (s)', 'peak memory (MB)'))
+    for result in results:
+        print('%-35s %10.3f %16.1f' % (
+            result['variant'], result['duration'], result['peak_memory'] / 1e6
+        ))
+
+
+if __name__ == "__main__":
+    from peerscout.shared.logging_config import configure_logging
+    configure_logging('benchmark')
+
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import logging
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+from peerscout.server.services.manuscript_keywords import ManuscriptKeywordService
+from peerscout.server.services.manuscript_person_relationship_service import (
+    ManuscriptPersonRelationshipService,
+    RelationshipTypes
+)
+from peerscout.server.services.manuscript_person_stage_service import (
+    ManuscriptPersonStageService,
+    StageNames
+)
+from peerscout.server.services.person_keywords import PersonKeywordService
+from peerscout.server.services.person_roles import PersonRoleService
+from peerscout.shared.database import Database
+from peerscout.shared.database_schema import Person
+
+from .bulk_load import generate_frames as generate_bulk_load_frames
+
+LOGGER = logging.getLogger(__name__)
+
+KEYWORD_COUNT = 1000
+KEYWORDS_PER_ROW = 5
+ROLES = ['Reviewing Editor', 'Senior Editor']
+SAMPLE_SIZE = 100
+
+WITHOUT_INDEXES = 'without indexes'
+WITH_INDEXES = 'with indexes'
+
+
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description=(
+            "PeerScout, benchmark of the service queries with and without the schema indexes"
+            " using generated data"
+            " (the schema of the database will be re-created if out of date,"
+            " use a scratch database)"
+        )
+    )
+    parser.add_argument(
+        "--database-url", default='sqlite://',
+        help="SQLAlchemy database URL (defaults to an in-memory SQLite database)"
+    )
+    parser.add_argument(
+        "--rows", type=int, default=100000,
+        help="Number of manuscript stage rows to generate (other tables are scaled accordingly)"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5,
+        help="Number of times each query is run"
+    )
+    return parser.parse_args(argv)
+
+
+def _generate_pairs(
+        random, left_name: str, left_values, right_name: str, right_values,
+        count: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        left_name: left_values[random.randint(0, len(left_values), count)],
+        right_name: right_values[random.randint(0, len(right_values), count)]
+    }).drop_duplicates()
+
+
+def generate_frames(row_count: int, seed: int = 0) -> dict:
+    random = np.random.RandomState(seed)
+    frames = generate_bulk_load_frames(row_count, seed=seed)
+    person_ids = frames['person']['person_id'].values
+    version_ids = frames['manuscript_version']['version_id'].values
+    keywords = np.array(['Keyword %d' % i for i in range(KEYWORD_COUNT)], dtype=object)
+    frames['person'] = frames['person'].assign(
+        email=['%s@example.org' % person_id for person_id in person_ids],
+        status=Person.Status.ACTIVE
+    )
+    frames['person_keyword'] = _generate_pairs(
+        random, 'person_id', person_ids, 'keyword', keywords,
+        len(person_ids) * KEYWORDS_PER_ROW
+    )
+    frames['manuscript_keyword'] = _generate_pairs(
+        random, 'version_id', version_ids, 'keyword', keywords,
+        len(version_ids) * KEYWORDS_PER_ROW
+    )
+    frames['person_role'] = _generate_pairs(
+        random, 'person_id', person_ids, 'role', np.array(ROLES, dtype=object),
+        len(person_ids) // 10
+    )
+    frames['manuscript_author'] = _generate_pairs(
+        random, 'version_id', version_ids, 'person_id', person_ids,
+        len(version_ids) * 3
+    )
+    return frames
+
+
+def get_service_queries(db: Database, frames: dict, seed: int = 0) -> Dict[str, Callable]:
+    random = np.random.RandomState(seed)
+    person_ids = list(random.choice(frames['person']['person_id'].values, SAMPLE_SIZE))
+    version_ids = list(random.choice(
+        frames['manuscript_version']['version_id'].values, SAMPLE_SIZE
+    ))
+    keywords = list(random.choice(frames['person_keyword']['keyword'].values, KEYWORDS_PER_ROW))
+    email = frames['person']['email'].values[0]
+    return {
+        'stage person ids by version ids': lambda: (
+            ManuscriptPersonStageService(db).get_person_ids_by_version_id_for_stage_names(
+                version_ids, [StageNames.REVIEW_RECEIVED]
+            )
+        ),
+        'person keyword scores': lambda: (
+            PersonKeywordService(db).get_keyword_scores(keywords)
+        ),
+        'manuscript keyword scores': lambda: (
+            ManuscriptKeywordService(db).get_keyword_scores(keywords)
+        ),
+        'user roles by email': lambda: (
+            PersonRoleService(db).get_user_roles_by_email(email)
+        ),
+        'filter person ids by role': lambda: (
+            PersonRoleService(db).filter_person_ids_by_role(person_ids, ROLES[0])
+        ),
+        'author version ids by person ids': lambda: (
+            ManuscriptPersonRelationshipService(db)
+            .get_version_ids_by_person_id_and_relationship_type(
+                person_ids, [RelationshipTypes.AUTHOR]
+            )
+        )
+    }
+
+
+def load_frames(db: Database, frames: dict):
+    with db.semi_transaction():
+        for table_name in reversed(db.sorted_table_names()):
+            if table_name in frames:
+                db[table_name].delete_all()
+    with db.semi_transaction():
+        for table_name in db.sorted_table_names():
+            if table_name in frames:
+                db[table_name].write_frame(frames[table_name], index=False)
+
+
+def _time_query(query_fn: Callable, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.time()
+        query_fn()
+        durations.append(time.time() - start)
+    return float(np.median(durations))
+
+
+def run_benchmark(db: Database, frames: dict, repeat: int) -> List[dict]:
+    load_frames(db, frames)
+    queries = get_service_queries(db, frames)
+    duration_by_variant_and_name = {}
+    for variant in [WITHOUT_INDEXES, WITH_INDEXES]:
+        if variant == WITHOUT_INDEXES:
+            db.drop_indexes()
+        else:
+            db.create_missing_indexes()
+        # update the statistics used by the query planner
+        db.engine.execute('ANALYZE')
+        for name, query_fn in queries.items():
+            duration = _time_query(query_fn, repeat)
+            LOGGER.info('%s (%s): %.4fs', name, variant, duration)
+            duration_by_variant_and_name[(variant, name)] = duration
+        db.session.rollback()
+    return [
+        {
+            'query': name,
+            'without_indexes': duration_by_variant_and_name[(WITHOUT_INDEXES, name)],
+            'with_indexes': duration_by_variant_and_name[(WITH_INDEXES, name)]
+        }
+        for name in queries.keys()
+    ]
+
+
+def main(argv: List[str] = None):
+    args = parse_args(argv)
+    db = Database(sqlalchemy.create_engine(args.database_url, echo=False))
+    try:
+        db.update_schema()
+        frames = generate_frames(args.rows)
+        results = run_benchmark(db, frames, repeat=args.repeat)
+    finally:
+        db.close()
+
+    print('dialect: %s, rows: %d, repeat: %d' % (
+        db.engine.dialect.name, args.rows, args.repeat
+    ))
+    print('%-35s %16s %16s %8s' % ('query', 'without idx (s)', 'with idx (s)', 'speedup'))
+    for result in results:
+        print('%-35s %16.4f %16.4f %7.1fx' % (
+            result['query'], result['without_indexes'], result['with_indexes'],
+            result['without_indexes'] / max(result['with_indexes'], 1e-9)
+        ))
+
+
+if __name__ == "__main__":
+    from peerscout.shared.logging_config import configure_logging
+    configure_logging('benchmark')
+
+    main()
@@ -0,0 +1,165 @@
+import argparse
+import copy
+import io
+import logging
+import time
+import xml.etree.ElementTree
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from peerscout.preprocessing.convertUtils import parse_xml_file
+from peerscout.preprocessing.importDataToDatabase import (
+    compile_xml_converter,
+    convert_xml,
+    convert_xml_stream,
+    default_field_mapping_by_table_name,
+    filename_to_manuscript_number,
+    iter_xml_tree_events,
+    TableOperationRecorders
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description=(
+            "PeerScout, benchmark of the XML conversion of the import"
+            " (convert_xml vs the compiled converter) using scaled up XML files"
+        )
+    )
+    parser.add_argument(
+        "xml_files", nargs='+',
+        help="XML files (e.g. the test data), the manuscript versions and persons will be repeated"
+    )
+    parser.add_argument(
+        "--scale", type=int, default=100,
+        help="Number of times the manuscript versions and persons are repeated within each file"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5,
+        help="Number of times each variant is run"
+    )
+    return parser.parse_args(argv)
+
+
+def _set_child_text(node, tag: str, text: str):
+    child = node.find(tag)
+    if child is not None:
+        child.text = text
+
+
+def scale_xml_root(root, scale: int):
+    """Repeats the manuscript versions and persons (with distinct keys)."""
+    root = copy.deepcopy(root)
+    for manuscript in root.findall('manuscript'):
+        versions = manuscript.findall('version')
+        for i in range(1, scale):
+            for version in versions:
+                scaled_version = copy.deepcopy(version)
+                key = version.find('key').text
+                key_prefix, _, key_no = key.rpartition('|')
+                _set_child_text(
+                    scaled_version, 'key',
+                    '%s|%d' % (key_prefix, int(key_no) + i * len(versions))
+                )
+                manuscript.append(scaled_version)
+    for people in root.findall('people'):
+        persons = people.findall('person')
+        for i in range(1, scale):
+            for person in persons:
+                scaled_person = copy.deepcopy(person)
+                _set_child_text(
+                    scaled_person, 'person-id', '%s-%d' % (person.find('person-id').text, i)
+                )
+                people.append(scaled_person)
+    return root
+
+
+def load_scaled_xml_contents(xml_files: List[str], scale: int) -> List[Tuple[str, bytes]]:
+    return [
+        (
+            filename_to_manuscript_number(filename),
+            xml.etree.ElementTree.tostring(scale_xml_root(parse_xml_file(filename), scale))
+        )
+        for filename in xml_files
+    ]
+
+
+def _convert_xml(content: bytes, tables, manuscript_number: str):
+    convert_xml(
+        parse_xml_file(io.BytesIO(content)), tables, manuscript_number,
+        default_field_mapping_by_table_name
+    )
+
+
+def _convert_xml_compiled(content: bytes, tables, manuscript_number: str):
+    compile_xml_converter(default_field_mapping_by_table_name).convert_events(
+        iter_xml_tree_events(parse_xml_file(io.BytesIO(content))), tables, manuscript_number
+    )
+
+
+def _convert_xml_stream(content: bytes, tables, manuscript_number: str):
+    convert_xml_stream(
+        io.BytesIO(content), tables, manuscript_number, default_field_mapping_by_table_name
+    )
+
+
+def get_variants() -> Dict[str, Callable]:
+    return {
+        'convert_xml (parsed tree)': _convert_xml,
+        'compiled (parsed tree)': _convert_xml_compiled,
+        'compiled (iterparse)': _convert_xml_stream
+    }
+
+
+def _time_variant(fn: Callable, contents: List[Tuple[str, bytes]], repeat: int) -> dict:
+    durations = []
+    for _ in range(repeat):
+        # recording the operations only, to exclude the costs of the table outputs
+        tables = TableOperationRecorders()
+        start = time.time()
+        for manuscript_number, content in contents:
+            fn(content, tables, manuscript_number)
+        durations.append(time.time() - start)
+    return {
+        'duration': float(np.median(durations)),
+        'operation_count': len(tables.operations)
+    }
+
+
+def run_benchmark(contents: List[Tuple[str, bytes]], repeat: int) -> List[dict]:
+    results = []
+    for name, fn in get_variants().items():
+        result = {'variant': name, **_time_variant(fn, contents, repeat)}
+        LOGGER.info(
+            '%s: %.4fs (%d operations)', name, result['duration'], result['operation_count']
+        )
+        results.append(result)
+    return results
+
+
+def main(argv: List[str] = None):
+    args = parse_args(argv)
+    contents = load_scaled_xml_contents(args.xml_files, args.scale)
+    results = run_benchmark(contents, repeat=args.repeat)
+
+    print('files: %d, scale: %d, size: %.1f MB, repeat: %d' % (
+        len(contents), args.scale, sum(len(content) for _, content in contents) / 1e6,
+        args.repeat
+    ))
+    print('%-30s %10s %12s %8s' % ('variant', 'time (s)', 'operations', 'speedup'))
+    baseline_duration = results[0]['duration']
+    for result in results:
+        print('%-30s %10.4f %12d %7.1fx' % (
+            result['variant'], result['duration'], result['operation_count'],
+            baseline_duration / max(result['duration'], 1e-9)
+        ))
+
+
+if __name__ == "__main__":
+    from peerscout.shared.logging_config import configure_logging
+    configure_logging('benchmark')
+
+    main()
@@ -1,14 +1,31 @@
+import argparse
 import csv
+import io
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from os import SEEK_END
+from typing import List
 
 from peerscout.utils.tqdm import tqdm
 
-from .mbox_parser import split_messages_skip_content, parse_header_properties
+from .mbox_parser import (
+    find_message_shard_boundaries,
+    iter_message_header_lines,
+    split_messages_skip_content,
+    parse_header_properties
+)
 
 from .convertUtils import process_files_in_directory_or_zip
 
 from .preprocessingUtils import get_data_path, get_db_path
 
+from ..shared.app_config import get_app_config
+
+
+# shards per worker, for the workers to finish at about the same time
+SHARDS_PER_WORKER = 4
+
 
 def stream_size(stream):
     if stream.seekable():
@@ -28,7 +45,54 @@ def stream_position(stream):
         return None
 
 
-def convert_mbox_file(filename, stream, writer, fieldnames):
+def get_header_dict(lines, fieldnames):
+    return dict(
+        (k, v)
+        for k, v in parse_header_properties(lines, required_keys=fieldnames)
+    )
+
+
+def get_stream_fileno(stream):
+    """Returns the file descriptor of the stream, or None if it isn't a file
+    (e.g. a file within a zip file)."""
+    try:
+        return stream.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return None
+
+
+def convert_mbox_file_shard(file_path: str, start: int, end: int, fieldnames) -> List[dict]:
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return [
+                get_header_dict(lines, fieldnames)
+                for lines in iter_message_header_lines(buffer, start, end)
+            ]
+
+
+def convert_mbox_file_in_parallel(filename, stream, writer, fieldnames, max_workers: int):
+    """Converts the messages of the mbox file in shards (split at message boundaries),
+    parsed by worker processes memory-mapping the file.
+    The rows are written in the order of the file."""
+    with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        boundaries = find_message_shard_boundaries(buffer, max_workers * SHARDS_PER_WORKER)
+    pos_unit = 1024 * 1024
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        with tqdm(total=boundaries[-1] // pos_unit) as pbar:
+            pbar.set_description(filename)
+            header_dicts_by_shard = executor.map(
+                partial(convert_mbox_file_shard, stream.name, fieldnames=fieldnames),
+                boundaries[:-1], boundaries[1:]
+            )
+            for start, end, header_dicts in zip(boundaries, boundaries[1:], header_dicts_by_shard):
+                writer.writerows(header_dicts)
+                pbar.update(end // pos_unit - start // pos_unit)
+
+
+def convert_mbox_file(filename, stream, writer, fieldnames, max_workers: int = 1):
+    if max_workers > 1 and get_stream_fileno(stream) is not None and stream_size(stream):
+        convert_mbox_file_in_parallel(filename, stream, writer, fieldnames, max_workers)
+        return
     file_size = stream_size(stream)
     prev_pos = 0
     pos_unit = 1024 * 1024
@@ -44,14 +108,28 @@ def convert_mbox_file(filename, stream, writer, fieldnames):
             else:
                 pbar.update()
 
-            header_dict = dict(
-                (k, v)
-                for k, v in parse_header_properties(lines, required_keys=fieldnames)
-            )
-            writer.writerow(header_dict)
+            writer.writerow(get_header_dict(lines, fieldnames))
+
 
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description="PeerScout, convert the headers of mbox files to CSV"
+    )
+    parser.add_argument(
+        "--workers", type=int,
+        help=(
+            "Number of worker processes parsing shards of each mbox file (memory-mapped)"
+            " (defaults to mbox_workers in the pipeline section, 1 being serial)"
+        )
+    )
+    return parser.parse_args(argv)
 
-def main():
+
+def main(argv: List[str] = None):
+    args = parse_args(argv)
+    max_workers = args.workers
+    if max_workers is None:
+        max_workers = get_app_config().getint('pipeline', 'mbox_workers', fallback=1)
 
     csv_path = get_db_path()
     source = get_data_path('emails-mbox')
@@ -67,7 +145,9 @@ def main():
         writer.writeheader()
 
         def process_file(filename, stream):
-            return convert_mbox_file(filename, stream, writer, fieldnames)
+            return convert_mbox_file(
+                filename, stream, writer, fieldnames, max_workers=max_workers
+            )
 
         process_files_in_directory_or_zip(source, process_file, ext='.mbox')
 
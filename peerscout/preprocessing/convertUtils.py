@@ -1,6 +1,7 @@
 import csv
-import itertools
 import xml.etree.ElementTree
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from os import listdir, makedirs
 from os.path import basename, splitext, isfile
 import os
@@ -16,6 +17,10 @@ from peerscout.utils.html import unescape_and_strip_tags
 
 NAME = 'convertUtils'
 
+# the removed rows of a table output are compacted once they are the majority of the rows
+# (and there are at least this many removed rows)
+MIN_REMOVED_ROW_COUNT_TO_COMPACT = 1000
+
 
 def unescape_and_strip_tags_if_not_none(text):
     return unescape_and_strip_tags(text) if text else None
@@ -49,17 +54,14 @@ def debugv(*args):
         logging.getLogger(NAME).debug(*args)
 
 
-def groupby_to_dict(l, kf, vf):
-    return {
-        k: vf(list(v))
-        for k, v in itertools.groupby(l, kf)
-    }
-
-
 def parse_xml_file(f):
     return xml.etree.ElementTree.parse(f).getroot()
 
 
+def iterparse_xml_file(f, events=('end',)):
+    return xml.etree.ElementTree.iterparse(f, events=events)
+
+
 def parse_xml_string(f):
     return xml.etree.ElementTree.fromstring(f)
 
@@ -68,64 +70,119 @@ def has_children(elem):
     return len(list(elem)) > 0
 
 
-class TableOutput:
+def to_object_array(values):
+    # assigning the items individually avoids numpy inspecting each one for a sequence
+    # (e.g. slow for pandas.Timestamp)
+    a = np.empty(len(values), dtype=object)
+    for index, value in enumerate(values):
+        a[index] = value
+    return a
+
+
+class TableOutput:  # pylint: disable=too-many-instance-attributes
+    """Collects the rows of a table, column by column.
+
+    Rows are removed via a hash index of the removal column (created on first use and
+    maintained on append). Removed rows are only marked as such (tombstones),
+    the columns are compacted once most of the rows were removed.
+    """
+
     def __init__(self, name=None, key=None, sort_by=None):
         self.name = name
         self.columns = {}
-        self.rows = []
-        self.key = key
+        self.key = None
         self.sort_by = sort_by
+        self.values_by_column = {}
+        self.row_count = 0
+        self.removed_row_count = 0
+        self.is_removed = bytearray()
+        self.row_indices_by_value_by_column = {}
         if key:
             self.set_index(key)
-        self.rows_by_key = {}
         self.logger = logging.getLogger(NAME)
 
     def __repr__(self):
         return '%s(name=%s, columns=%s, n_rows=%d)' % (
-            type(self).__name__, self.name, self.columns, len(self.rows)
+            type(self).__name__, self.name, self.columns, len(self)
         )
 
+    def __len__(self):
+        return self.row_count - self.removed_row_count
+
     def append(self, props):
+        row_index = self.row_count
         for k, v in props.items():
-            if k not in self.columns:
+            values = self.values_by_column.get(k)
+            if values is None:
                 self.columns[k] = len(self.columns)
-        a = np.empty(len(self.columns), dtype=object)
-        for k, v in props.items():
-            index = self.columns[k]
-            a[index] = v
-        if self.key:
-            debugv(
-                "adding: %s, %s, %s, %d",
-                self.name, self.key, props[self.key], len(self.rows_by_key)
-            )
-            self.rows_by_key.setdefault(props[self.key], []).append(a)
-            debugv(
-                "added: %s, %s, %s, %d",
-                self.name, self.key, props[self.key], len(self.rows_by_key)
-            )
-        else:
-            self.rows.append(a)
+                values = [None] * row_index
+                self.values_by_column[k] = values
+            values.append(v)
+        if len(props) < len(self.columns):
+            for k, values in self.values_by_column.items():
+                if k not in props:
+                    values.append(None)
+        for k, row_indices_by_value in self.row_indices_by_value_by_column.items():
+            row_indices_by_value.setdefault(props.get(k), []).append(row_index)
+        self.is_removed.append(0)
+        self.row_count += 1
 
     def set_index(self, key):
-        if self.key != key:
-            debugv("setting index to: %s, %s", self.name, key)
-            if not key:
-                self.rows = flatten(self.rows_by_key.values())
-                self.rows_by_key = {}
-                self.key = key
-            else:
-                self.set_index(None)
-                self.key = key
-                self.rows_by_key = groupby_to_dict(
-                    self.rows, lambda row: row[self.columns[key]], lambda row: row)
-                self.rows = []
+        if key and key not in self.row_indices_by_value_by_column:
+            debugv("adding index: %s, %s", self.name, key)
+            self.row_indices_by_value_by_column[key] = self._build_index(key)
+        self.key = key
+
+    def _build_index(self, key):
+        values = self.values_by_column.get(key)
+        row_indices_by_value = {}
+        for row_index in range(self.row_count):
+            if not self.is_removed[row_index]:
+                row_indices_by_value.setdefault(
+                    values[row_index] if values is not None else None, []
+                ).append(row_index)
+        return row_indices_by_value
 
     def remove_where_property_is(self, col, value):
         self.set_index(col)
-        if value in self.rows_by_key:
-            debugv("removing: %s, %s, %s", self.name, self.key, value)
-            del self.rows_by_key[value]
-        # self.remove_where(condition=lambda row: row[self.columns[prop]] == value)
+        row_indices = self.row_indices_by_value_by_column[col].pop(value, None)
+        if not row_indices:
+            return
+        debugv("removing: %s, %s, %s", self.name, col, value)
+        for row_index in row_indices:
+            # the other indices may still refer to previously removed rows
+            if not self.is_removed[row_index]:
+                self.is_removed[row_index] = 1
+                self.removed_row_count += 1
+        if (
+            self.removed_row_count >= MIN_REMOVED_ROW_COUNT_TO_COMPACT and
+            self.removed_row_count * 2 > self.row_count
+        ):
+            self._compact()
+
+    def _compact(self):
+        debugv("compacting: %s, %d, %d", self.name, self.row_count, self.removed_row_count)
+        mask = self._get_mask()
+        self.values_by_column = {
+            k: list(self._get_column_values(k, mask))
+            for k in self.columns.keys()
+        }
+        self.row_count = len(self)
+        self.removed_row_count = 0
+        self.is_removed = bytearray(self.row_count)
+        self.row_indices_by_value_by_column = {
+            k: self._build_index(k)
+            for k in self.row_indices_by_value_by_column.keys()
+        }
+
+    def _get_mask(self):
+        if not self.removed_row_count:
+            return None
+        return np.frombuffer(bytes(self.is_removed), dtype=np.uint8) == 0
+
+    def _get_column_values(self, name, mask):
+        values = to_object_array(self.values_by_column[name])
+        return values if mask is None else values[mask]
 
     def header(self):
         a = np.full(len(self.columns), fill_value=None, dtype=object)
@@ -134,23 +191,18 @@ class TableOutput:
         return a
 
     def to_frame(self):
-        m = self.matrix()
-        return pd.DataFrame(m[1:], columns=m[0])
+        mask = self._get_mask()
+        return pd.DataFrame(OrderedDict(
+            (k, self._get_column_values(k, mask))
+            for k in self.columns.keys()
+        ), columns=list(self.columns.keys())).infer_objects()
 
     def matrix(self):
-        column_count = len(self.columns)
-        if self.key:
-            rows = flatten(self.rows_by_key.values())
-            debugv(
-                "rows after flattening: %s, %s, %d, %d",
-                self.name, self.key, len(rows), len(self.rows_by_key)
-            )
-        else:
-            rows = self.rows
-        m = np.full((len(rows) + 1, column_count), fill_value=None, dtype=object)
+        mask = self._get_mask()
+        m = np.full((len(self) + 1, len(self.columns)), fill_value=None, dtype=object)
         m[0] = self.header()
-        for index, row in enumerate(rows):
-            m[index + 1, :len(row)] = row
+        for k, index in self.columns.items():
+            m[1:, index] = self._get_column_values(k, mask)
         return m
 
 
@@ -222,6 +274,86 @@ def process_files_in_zip(zip_filename, process_file, ext=None):
         pbar.set_description("Done")
 
 
+def process_files_in_zip_after_inspecting(zip_filename, inspect_file, process_file, ext=None):
+    """Similar to process_files_in_zip, but streaming every file twice: first to
+    inspect_file(filename, stream) (e.g. hashing the content), then to
+    process_file(filename, stream, inspect_result).
+
+    The files are not read into memory as a whole (they are decompressed twice instead).
+    """
+    with ZipFile(zip_filename) as zip_archive:
+        pbar = tqdm(filter_filenames_by_ext(zip_archive.namelist(), ext), leave=False)
+        for filename in pbar:
+            pbar.set_description(rjust_and_shorten_text(filename, width=40))
+            with zip_archive.open(filename, 'r') as zip_file:
+                inspect_result = inspect_file(filename, zip_file)
+            with zip_archive.open(filename, 'r') as zip_file:
+                try:
+                    process_file(filename, zip_file, inspect_result)
+                except xml.etree.ElementTree.ParseError as err:
+                    pbar.write("Parse error in file {}/{}: {}".format(
+                        zip_filename, filename, err))
+        pbar.set_description("Done")
+
+
+def _map_file_or_return_parse_error(map_file, filename, content):
+    # the parse error is returned as a message, rather than relying on it being picklable
+    try:
+        return map_file(filename, content), None
+    except xml.etree.ElementTree.ParseError as err:
+        return None, str(err)
+
+
+def list_files_in_zip(zip_filename, ext=None):
+    with ZipFile(zip_filename) as zip_archive:
+        return filter_filenames_by_ext(zip_archive.namelist(), ext)
+
+
+def process_files_in_zip_in_parallel(
+        zip_filename, map_file, reduce_result, ext=None, max_workers=None, max_pending=None,
+        get_map_file=None):
+    """Similar to process_files_in_zip, but calling map_file(filename, content) in a process pool.
+
+    map_file needs to be picklable (e.g. a module level function or partial) and receives the
+    content as bytes. reduce_result(filename, result) is called in the order of the files.
+    At most max_pending files (defaulting to twice the number of workers) are read ahead
+    (each held in memory as a whole).
+    get_map_file(filename, content) may select a different map_file by file.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * max_workers
+    with ZipFile(zip_filename) as zip_archive:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            pbar = tqdm(filter_filenames_by_ext(zip_archive.namelist(), ext), leave=False)
+
+            def reduce_next():
+                filename, future = pending.popleft()
+                result, parse_error = future.result()
+                if parse_error is not None:
+                    pbar.write("Parse error in file {}/{}: {}".format(
+                        zip_filename, filename, parse_error))
+                else:
+                    reduce_result(filename, result)
+
+            for filename in pbar:
+                pbar.set_description(rjust_and_shorten_text(filename, width=40))
+                content = zip_archive.read(filename)
+                file_map_file = (
+                    get_map_file(filename, content) if get_map_file is not None else map_file
+                )
+                pending.append((filename, executor.submit(
+                    _map_file_or_return_parse_error, file_map_file, filename, content
+                )))
+                if len(pending) >= max_pending:
+                    reduce_next()
+            while pending:
+                reduce_next()
+            pbar.set_description("Done")
+
+
 def sort_relative_filenames_by_file_modified_time(parent_dir, filenames):
     paired_with_timestamp = [
         (
@@ -1,20 +1,27 @@
 import argparse
+import hashlib
+import io
 import itertools
+from collections import OrderedDict
+from functools import partial
 from os.path import basename, splitext
 import re
 import logging
-from typing import List
+from typing import Callable, Dict, List, Set
 
 import pandas as pd
 
 from peerscout.utils.tqdm import tqdm
-from peerscout.utils.pandas import replace_null_with_none
+from peerscout.utils.pandas import iter_records
 
 from .convertUtils import (
+    list_files_in_zip,
     process_files_in_directory_or_zip,
     process_files_in_zip,
+    process_files_in_zip_after_inspecting,
+    process_files_in_zip_in_parallel,
     has_children,
-    parse_xml_file,
+    iterparse_xml_file,
     unescape_and_strip_tags_if_str,
     TableOutput,
     rjust_and_shorten_text
@@ -24,7 +31,9 @@ from .preprocessingUtils import get_downloads_xml_path
 
 from .dataNormalisationUtils import normalise_subject_area
 
+from ..shared.app_config import get_app_config
 from ..shared.database import connect_managed_configured_database
+from ..shared.database_row_changes import RowChanges
 
 
 LOGGER = logging.getLogger(__name__)
@@ -504,130 +513,600 @@ def update_or_create_record_if_mapped(
         update_or_create_record(db, table_name, field_mapping_by_table_name[table_name], props)
 
 
+def convert_manuscript_node(manuscript, tables, manuscript_number, field_mapping_by_table_name):
+    manuscript_no = manuscript_number_to_no(manuscript_number)
+    tables['manuscript'].remove_where_property_is(
+        'manuscript_id',
+        manuscript_no)
+    tables['manuscript'].append(collect_props(
+        manuscript,
+        {
+            'manuscript-number': manuscript_number,
+            'manuscript-no': manuscript_no
+        },
+        field_mapping=field_mapping_by_table_name['manuscript'],
+        xpaths=['*', 'production-data/*']))
+
+
+def convert_version_node(version, tables, manuscript_number, field_mapping_by_table_name):
+    manuscript_no = manuscript_number_to_no(manuscript_number)
+    version_key = version.find('key').text
+    version_no = version_key_to_no(version_key)
+    version_id = '{}-{}'.format(manuscript_no, version_no)
+    version_manuscript_number = version.find('manuscript-number').text
+    for table_name in all_version_table_names:
+        if table_name in field_mapping_by_table_name:
+            tables[table_name].remove_where_property_is(
+                'version_id',
+                version_id)
+    version_key_props = {
+        'manuscript-no': manuscript_no,
+        'version-no': version_no,
+        'version-id': version_id,
+        'base-manuscript-number': manuscript_number,
+        'manuscript-number': version_manuscript_number,
+        'version-key': version_key
+    }
+    tables['manuscript_version'].append(collect_props(
+        version,
+        props={
+            **version_key_props,
+        },
+        field_mapping=field_mapping_by_table_name['manuscript_version'],
+        exclude=known_version_xml_paths.union(set(['key']))
+    ))
+    for table_name, xpaths in version_copy_paths.items():
+        if table_name in field_mapping_by_table_name:
+            populate_and_append_to_table(
+                tables[table_name],
+                itertools.chain.from_iterable(
+                    [version.findall(xpath) for xpath in xpaths]
+                ),
+                version_key_props,
+                field_mapping=field_mapping_by_table_name[table_name],
+                # filter_func=default_filter_by_table_name.get(table_name),
+                # transformer_func=default_transformer_by_table_name.get(table_name),
+                list_transformer_func=get_combined_list_transformer(
+                    table_name
+                ),
+                exclude=known_version_xml_paths
+            )
+
+
+def convert_person_node(person, tables, field_mapping_by_table_name):
+    person_key = person.find('person-id').text
+    person_key_props = {
+        'person-id': person_key
+    }
+    for table_name in all_persons_table_names:
+        tables[table_name].remove_where_property_is(
+            'person_id',
+            person_key
+        )
+    tables['person'].append(collect_props(
+        person,
+        field_mapping=field_mapping_by_table_name['person'],
+        exclude=known_person_xml_paths))
+    for table_name, xpaths in person_copy_paths.items():
+        if table_name in field_mapping_by_table_name:
+            populate_and_append_to_table(tables[table_name],
+                                         itertools.chain.from_iterable(
+                                             [person.findall(xpath) for xpath in xpaths]),
+                                         person_key_props,
+                                         field_mapping=field_mapping_by_table_name[table_name],
+                                         list_transformer_func=get_combined_list_transformer(
+                                             table_name),
+                                         exclude=known_person_xml_paths)
+    for table_name, extractor in person_custom_extractors_by_table_name.items():
+        for props in extractor(person, person_id=person_key):
+            tables[table_name].append(props)
+
+
 def convert_xml(doc, tables, manuscript_number, field_mapping_by_table_name):
     for manuscript in doc.findall('manuscript'):
         if 'manuscript' not in field_mapping_by_table_name:
             break
-        manuscript_no = manuscript_number_to_no(manuscript_number)
-        tables['manuscript'].remove_where_property_is(
-            'manuscript_id',
-            manuscript_no)
-        tables['manuscript'].append(collect_props(
-            manuscript,
-            {
-                'manuscript-number': manuscript_number,
-                'manuscript-no': manuscript_no
-            },
-            field_mapping=field_mapping_by_table_name['manuscript'],
-            xpaths=['*', 'production-data/*']))
+        convert_manuscript_node(
+            manuscript, tables, manuscript_number, field_mapping_by_table_name
+        )
         for version in manuscript.findall('version'):
-            version_key = version.find('key').text
-            version_no = version_key_to_no(version_key)
-            version_id = '{}-{}'.format(manuscript_no, version_no)
-            version_manuscript_number = version.find('manuscript-number').text
-            for table_name in all_version_table_names:
-                if table_name in field_mapping_by_table_name:
-                    tables[table_name].remove_where_property_is(
-                        'version_id',
-                        version_id)
-            version_key_props = {
-                'manuscript-no': manuscript_no,
-                'version-no': version_no,
-                'version-id': version_id,
-                'base-manuscript-number': manuscript_number,
-                'manuscript-number': version_manuscript_number,
-                'version-key': version_key
-            }
-            tables['manuscript_version'].append(collect_props(
-                version,
-                props={
-                    **version_key_props,
-                },
-                field_mapping=field_mapping_by_table_name['manuscript_version'],
-                exclude=known_version_xml_paths.union(set(['key']))
-            ))
-            for table_name, xpaths in version_copy_paths.items():
-                if table_name in field_mapping_by_table_name:
-                    populate_and_append_to_table(
-                        tables[table_name],
-                        itertools.chain.from_iterable(
-                            [version.findall(xpath) for xpath in xpaths]
-                        ),
-                        version_key_props,
-                        field_mapping=field_mapping_by_table_name[table_name],
-                        # filter_func=default_filter_by_table_name.get(table_name),
-                        # transformer_func=default_transformer_by_table_name.get(table_name),
-                        list_transformer_func=get_combined_list_transformer(
-                            table_name
-                        ),
-                        exclude=known_version_xml_paths
-                    )
+            convert_version_node(
+                version, tables, manuscript_number, field_mapping_by_table_name
+            )
 
     for person in doc.findall('people/person'):
-        person_key = person.find('person-id').text
-        person_key_props = {
-            'person-id': person_key
-        }
-        for table_name in all_persons_table_names:
-            tables[table_name].remove_where_property_is(
-                'person_id',
-                person_key
-            )
-        tables['person'].append(collect_props(
-            person,
-            field_mapping=field_mapping_by_table_name['person'],
-            exclude=known_person_xml_paths))
-        for table_name, xpaths in person_copy_paths.items():
-            if table_name in field_mapping_by_table_name:
-                populate_and_append_to_table(tables[table_name],
-                                             itertools.chain.from_iterable(
-                                                 [person.findall(xpath) for xpath in xpaths]),
-                                             person_key_props,
-                                             field_mapping=field_mapping_by_table_name[table_name],
-                                             list_transformer_func=get_combined_list_transformer(
-                                                 table_name),
-                                             exclude=known_person_xml_paths)
-        for table_name, extractor in person_custom_extractors_by_table_name.items():
-            for props in extractor(person, person_id=person_key):
-                tables[table_name].append(props)
+        convert_person_node(person, tables, field_mapping_by_table_name)
 
     # sanity check (to verify that we haven't missed any tags)
     sanity_check_unknown_paths(doc, known_xml_paths)
 
 
+def is_unknown_path(path, parent_path, node, known_paths):
+    # same as find_unknown_paths, but for a single node
+    return (
+        (not parent_path or parent_path in known_paths) and
+        path not in known_paths and
+        has_children(node)
+    )
+
+
+def iter_xml_tree_events(node):
+    """Same events as iterparse with events=('start', 'end'), but of an already parsed tree."""
+    yield 'start', node
+    for child in node:
+        yield from iter_xml_tree_events(child)
+    yield 'end', node
+
+
+# the nodes converted as a whole (with their removal of previous rows)
+RECORD_XML_PATHS = ['manuscript', 'manuscript/version', 'people/person']
+
+
+def _get_manuscript_key_props(_, manuscript_number):
+    return {
+        'manuscript-number': manuscript_number,
+        'manuscript-no': manuscript_number_to_no(manuscript_number)
+    }
+
+
+def _get_version_key_props(text_by_key_tag, manuscript_number):
+    manuscript_no = manuscript_number_to_no(manuscript_number)
+    version_key = text_by_key_tag['key']
+    version_no = version_key_to_no(version_key)
+    return {
+        'manuscript-no': manuscript_no,
+        'version-no': version_no,
+        'version-id': '{}-{}'.format(manuscript_no, version_no),
+        'base-manuscript-number': manuscript_number,
+        'manuscript-number': text_by_key_tag.get('manuscript-number'),
+        'version-key': version_key
+    }
+
+
+def _get_person_key_props(text_by_key_tag, _):
+    return {
+        'person-id': text_by_key_tag['person-id']
+    }
+
+
+class CompiledTableSpec:
+    """The rows of one table extracted from a record (e.g. the authors of a manuscript version).
+
+    Each xpath is relative to the record ('' being the record itself),
+    the props are collected from the leaf children of the matching nodes.
+    """
+
+    def __init__(
+            self, table_name, field_mapping, xpaths, exclude=None,
+            one_row_per_node=True, use_key_props=True, list_transformer_func=None):
+        self.table_name = table_name
+        self.field_mapping = field_mapping
+        self.xpaths = xpaths
+        # only the mapped props need to be collected (and converted)
+        self.tags = frozenset(field_mapping.values()) - frozenset(exclude or [])
+        self.one_row_per_node = one_row_per_node
+        self.use_key_props = use_key_props
+        self.list_transformer_func = list_transformer_func
+
+
+class CompiledRecordSpec:  # pylint: disable=too-many-instance-attributes
+    def __init__(
+            self, path, key_tags, get_key_props, table_specs,
+            remove_table_names, remove_column, remove_key_prop,
+            custom_extractors_by_table_name=None):
+        self.path = path
+        self.key_tags = frozenset(key_tags)
+        self.get_key_props = get_key_props
+        self.table_specs = table_specs
+        self.remove_table_names = remove_table_names
+        self.remove_column = remove_column
+        self.remove_key_prop = remove_key_prop
+        self.custom_extractors_by_table_name = custom_extractors_by_table_name or {}
+
+
+class _Route:
+    __slots__ = ('record_path', 'key', 'tags', 'one_row_per_node')
+
+    def __init__(self, record_path, key, tags, one_row_per_node):
+        self.record_path = record_path
+        self.key = key
+        self.tags = tags
+        self.one_row_per_node = one_row_per_node
+
+
+class _RecordState:
+    __slots__ = ('text_by_key_tag', 'props_by_route_key', 'rows_by_route_key')
+
+    def __init__(self, spec):
+        self.text_by_key_tag = {}
+        self.props_by_route_key = {}
+        self.rows_by_route_key = {}
+        for table_index, table_spec in enumerate(spec.table_specs):
+            for xpath_index, _ in enumerate(table_spec.xpaths):
+                route_key = (table_index, xpath_index)
+                if table_spec.one_row_per_node:
+                    self.rows_by_route_key[route_key] = []
+                else:
+                    self.props_by_route_key[route_key] = {}
+
+    def start_row(self, route_key):
+        props = {}
+        self.props_by_route_key[route_key] = props
+        self.rows_by_route_key[route_key].append(props)
+
+
+class CompiledXmlConverter:
+    """Converts the XML using a dispatch table by tag path (see compile_xml_converter).
+
+    The nodes are visited once, in a single depth-first pass (e.g. while parsing),
+    routing the leaf nodes to the props of the rows they belong to.
+    The unknown paths are checked in the same pass.
+    """
+
+    def __init__(self, record_specs, known_paths):
+        self.record_spec_by_path = {spec.path: spec for spec in record_specs}
+        self.known_paths = known_paths
+        self.record_paths = frozenset(RECORD_XML_PATHS)
+        # routes by the path of the nodes starting a new row
+        self.row_routes_by_path = {}
+        # routes by the path of the parent nodes of the leaf nodes
+        self.leaf_routes_by_parent_path = {}
+        for spec in record_specs:
+            for table_index, table_spec in enumerate(spec.table_specs):
+                for xpath_index, xpath in enumerate(table_spec.xpaths):
+                    path = spec.path + '/' + xpath if xpath else spec.path
+                    route = _Route(
+                        spec.path, (table_index, xpath_index), table_spec.tags,
+                        table_spec.one_row_per_node
+                    )
+                    self.leaf_routes_by_parent_path.setdefault(path, []).append(route)
+                    if table_spec.one_row_per_node:
+                        self.row_routes_by_path.setdefault(path, []).append(route)
+
+    def convert_events(
+            self, events, tables, manuscript_number, remove_converted_records=False) -> set:
+        """Converts the records of the (start and end) events, returns the unknown paths.
+
+        With remove_converted_records, the converted nodes will be removed from their parent
+        (only valid while parsing, see iterparse_xml_file).
+        """
+        unknown_paths = set()
+        state_by_record_path = {}
+        parents = []
+        paths = []
+        for event, node in events:
+            if event == 'start':
+                if not parents:
+                    # the root node (not part of the paths)
+                    path = ''
+                elif not paths[-1]:
+                    path = node.tag
+                else:
+                    path = paths[-1] + '/' + node.tag
+                parents.append(node)
+                paths.append(path)
+                spec = self.record_spec_by_path.get(path)
+                if spec is not None:
+                    state_by_record_path[path] = _RecordState(spec)
+                for route in self.row_routes_by_path.get(path, []):
+                    state_by_record_path[route.record_path].start_row(route.key)
+                continue
+            path = paths.pop()
+            parents.pop()
+            if not parents:
+                break
+            parent_path = paths[-1]
+            if is_unknown_path(path, parent_path, node, self.known_paths):
+                unknown_paths.add(path)
+            if len(node) == 0:
+                for route in self.leaf_routes_by_parent_path.get(parent_path, []):
+                    if node.tag in route.tags:
+                        state_by_record_path[route.record_path].props_by_route_key[route.key][
+                            node.tag
+                        ] = auto_convert(node.tag, node.text)
+            parent_spec = self.record_spec_by_path.get(parent_path)
+            if parent_spec is not None and node.tag in parent_spec.key_tags:
+                state_by_record_path[parent_path].text_by_key_tag.setdefault(node.tag, node.text)
+            spec = self.record_spec_by_path.get(path)
+            if spec is not None:
+                self._convert_record(
+                    spec, state_by_record_path.pop(path), node, tables, manuscript_number
+                )
+            if remove_converted_records and path in self.record_paths:
+                parents[-1].remove(node)
+        if len(unknown_paths) > 0:
+            LOGGER.warning("unknown_paths: %s", unknown_paths)
+        return unknown_paths
+
+    def _convert_record(self, spec, state, node, tables, manuscript_number):
+        key_props = spec.get_key_props(state.text_by_key_tag, manuscript_number)
+        record_id = key_props[spec.remove_key_prop]
+        for table_name in spec.remove_table_names:
+            tables[table_name].remove_where_property_is(spec.remove_column, record_id)
+        for table_index, table_spec in enumerate(spec.table_specs):
+            base_props = key_props if table_spec.use_key_props else DEFAULT_PROPS
+            if table_spec.one_row_per_node:
+                props_list = [
+                    {**base_props, **props}
+                    for xpath_index, _ in enumerate(table_spec.xpaths)
+                    for props in state.rows_by_route_key[(table_index, xpath_index)]
+                ]
+            else:
+                props = dict(base_props)
+                for xpath_index, _ in enumerate(table_spec.xpaths):
+                    props.update(state.props_by_route_key[(table_index, xpath_index)])
+                props_list = [props]
+            props_list = [
+                {
+                    k: unescape_and_strip_tags_if_str(v)
+                    for k, v in map_properties(props, table_spec.field_mapping).items()
+                }
+                for props in props_list
+            ]
+            table = tables[table_spec.table_name]
+            for props in apply_list_transformer(props_list, table_spec.list_transformer_func):
+                table.append(props)
+        for table_name, extractor in spec.custom_extractors_by_table_name.items():
+            for props in extractor(node, **{spec.remove_column: record_id}):
+                tables[table_name].append(props)
+
+
+def _compile_copy_table_specs(copy_paths, field_mapping_by_table_name, exclude):
+    return [
+        CompiledTableSpec(
+            table_name, field_mapping_by_table_name[table_name], xpaths,
+            exclude=exclude,
+            list_transformer_func=get_combined_list_transformer(table_name)
+        )
+        for table_name, xpaths in copy_paths.items()
+        if table_name in field_mapping_by_table_name
+    ]
+
+
+def compile_xml_converter(field_mapping_by_table_name) -> CompiledXmlConverter:
+    """Compiles the field mapping and copy paths into a converter with the same output
+    as convert_xml (without having to resolve the xpaths for every node)."""
+    record_specs = []
+    if 'manuscript' in field_mapping_by_table_name:
+        record_specs.append(CompiledRecordSpec(
+            'manuscript',
+            key_tags=[],
+            get_key_props=_get_manuscript_key_props,
+            table_specs=[CompiledTableSpec(
+                'manuscript', field_mapping_by_table_name['manuscript'],
+                ['', 'production-data'], one_row_per_node=False
+            )],
+            remove_table_names=['manuscript'],
+            remove_column='manuscript_id',
+            remove_key_prop='manuscript-no'
+        ))
+        record_specs.append(CompiledRecordSpec(
+            'manuscript/version',
+            key_tags=['key', 'manuscript-number'],
+            get_key_props=_get_version_key_props,
+            table_specs=[CompiledTableSpec(
+                'manuscript_version', field_mapping_by_table_name['manuscript_version'],
+                [''], exclude=known_version_xml_paths.union(set(['key'])),
+                one_row_per_node=False
+            )] + _compile_copy_table_specs(
+                version_copy_paths, field_mapping_by_table_name, known_version_xml_paths
+            ),
+            remove_table_names=[
+                table_name for table_name in all_version_table_names
+                if table_name in field_mapping_by_table_name
+            ],
+            remove_column='version_id',
+            remove_key_prop='version-id'
+        ))
+    record_specs.append(CompiledRecordSpec(
+        'people/person',
+        key_tags=['person-id'],
+        get_key_props=_get_person_key_props,
+        table_specs=[CompiledTableSpec(
+            'person', field_mapping_by_table_name['person'],
+            [''], exclude=known_person_xml_paths,
+            one_row_per_node=False, use_key_props=False
+        )] + _compile_copy_table_specs(
+            person_copy_paths, field_mapping_by_table_name, known_person_xml_paths
+        ),
+        remove_table_names=all_persons_table_names,
+        remove_column='person_id',
+        remove_key_prop='person-id',
+        custom_extractors_by_table_name=person_custom_extractors_by_table_name
+    ))
+    return CompiledXmlConverter(record_specs, known_xml_paths)
+
+
+def convert_xml_stream(stream, tables, manuscript_number, field_mapping_by_table_name):
+    """Streaming alternative to convert_xml (including the unknown paths sanity check).
+
+    The records (e.g. manuscript versions and persons) are converted as soon as their end tag
+    was parsed and removed from the tree afterwards
+    (the memory of the parsed tree is bounded by the size of one record).
+    The operations on each table are the same as the ones of convert_xml,
+    the tables are modified while the file is being parsed though.
+    """
+    return compile_xml_converter(field_mapping_by_table_name).convert_events(
+        iterparse_xml_file(stream, events=('start', 'end')), tables, manuscript_number,
+        remove_converted_records=True
+    )
+
+
 def filename_to_manuscript_number(filename):
     return splitext(basename(filename))[0]
 
 
+def convert_xml_stream_to_table_operations(
+        stream, manuscript_number, field_mapping_by_table_name):
+    tables = TableOperationRecorders()
+    convert_xml_stream(stream, tables, manuscript_number, field_mapping_by_table_name)
+    return tables.operations
+
+
 def convert_xml_file_contents(filename, stream, tables, field_mapping_by_table_name):
-    doc = parse_xml_file(stream)
-    manuscript_number = filename_to_manuscript_number(filename)
-    convert_xml(doc, tables, manuscript_number, field_mapping_by_table_name)
+    # the operations are only applied once the whole file was parsed,
+    # an invalid file shouldn't leave partially converted records behind
+    # (the peak memory is therefore bounded by the converted rows of one file, not one record)
+    operations = convert_xml_stream_to_table_operations(
+        stream, filename_to_manuscript_number(filename), field_mapping_by_table_name
+    )
+    replay_table_operations(operations, tables)
 
 
-def remove_records(db, table_name, df, replace_key):
-    if len(df) == 0:
-        return
-    db.commit()
-    db_table = db[table_name]
-    if replace_key is not None:
-        keys = list(df[replace_key].unique())
-        db.commit()
-        # print("deleting:", table_name, replace_key, keys, "\n\n")
-        db_table.delete_where(
-            getattr(db_table.table, replace_key).in_(keys)
-        )
-        db.commit()
+class TableOperationRecorder:
+    """Records the TableOutput operations (e.g. of a worker process) to be replayed in order."""
 
+    def __init__(self, name, operations):
+        self.name = name
+        self.operations = operations
+
+    def append(self, props):
+        self.operations.append((self.name, None, props))
+
+    def remove_where_property_is(self, col, value):
+        self.operations.append((self.name, col, value))
+
+
+class TableOperationRecorders(dict):
+    def __init__(self):
+        super().__init__()
+        self.operations = []
+
+    def __missing__(self, name):
+        recorder = TableOperationRecorder(name, self.operations)
+        self[name] = recorder
+        return recorder
+
+
+def replay_table_operations(operations, tables):
+    """Applies the recorded operations in order (preserving "last write wins" of the removals)."""
+    for table_name, col, value in operations:
+        if col is None:
+            tables[table_name].append(value)
+        else:
+            tables[table_name].remove_where_property_is(col, value)
+
+
+def convert_xml_file_contents_to_table_operations(
+        filename, content: bytes, field_mapping_by_table_name):
+    return convert_xml_stream_to_table_operations(
+        io.BytesIO(content), filename_to_manuscript_number(filename),
+        field_mapping_by_table_name
+    )
+
+
+def get_content_hash(content: bytes) -> str:
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def get_stream_content_hash(stream, chunk_size: int = 1024 * 1024) -> str:
+    """Same as get_content_hash of the content, reading the stream in chunks."""
+    content_hash = hashlib.blake2b(digest_size=16)
+    for chunk in iter(partial(stream.read, chunk_size), b''):
+        content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def get_table_operations_hash(operations) -> str:
+    # the representation of the converted values (e.g. str, Timestamp) is deterministic
+    return get_content_hash(repr(operations).encode('utf-8'))
+
+
+def convert_xml_file_stream_to_hashed_table_operations(
+        filename, stream, field_mapping_by_table_name):
+    operations = convert_xml_stream_to_table_operations(
+        stream, filename_to_manuscript_number(filename), field_mapping_by_table_name
+    )
+    return get_table_operations_hash(operations), operations
+
+
+def convert_xml_file_contents_to_hashed_table_operations(
+        filename, content: bytes, field_mapping_by_table_name):
+    return convert_xml_file_stream_to_hashed_table_operations(
+        filename, io.BytesIO(content), field_mapping_by_table_name
+    )
+
+
+def get_person_field_mapping_by_table_name(field_mapping_by_table_name):
+    """The field mapping of the person tables, to only convert the persons of a file."""
+    return {
+        table_name: field_mapping
+        for table_name, field_mapping in field_mapping_by_table_name.items()
+        if table_name in all_persons_table_names
+    }
+
+
+def filter_person_table_operations(operations):
+    return [
+        operation for operation in operations
+        if operation[0] in all_persons_table_names
+    ]
 
-def insert_records(db, table_name, df):
-    if len(df) == 0:
-        return
-    db_table = db[table_name]
-    db.commit()
-    df = df.drop_duplicates()
-    # print("writing data frame:", df, "\n\n")
-    db_table.write_frame(df, index=False)
+
+class ImportedXmlFiles:
+    """The hashes of the previously imported XML files, by manuscript number.
+
+    Files with unchanged content (imported with the current data version) don't need to be
+    converted again. Converted files only need to be applied if their rows changed
+    (e.g. after a data version change not affecting them).
+    The persons are shared between the files (the last file of a person wins), their rows
+    are therefore always converted and applied in the order of the files.
+    """
+
+    def __init__(self, previous_by_manuscript_number: dict):
+        self.previous_by_manuscript_number = previous_by_manuscript_number
+        self.updated_by_manuscript_number = OrderedDict()
+        self.unchanged_content_count = 0
+        self.unchanged_rows_count = 0
+        self.applied_count = 0
+
+    @staticmethod
+    def from_database(db, filenames: List[str]):
+        table = db.import_xml_file.table
+        manuscript_numbers = sorted({
+            filename_to_manuscript_number(filename) for filename in filenames
+        })
+        with db.in_ids_condition(table.manuscript_number, manuscript_numbers) as condition:
+            return ImportedXmlFiles({
+                row.manuscript_number: row
+                for row in db.session.query(
+                    table.manuscript_number, table.content_hash, table.rows_hash, table.version
+                ).filter(condition)
+            })
+
+    def is_unchanged_content(self, filename: str, content_hash: str) -> bool:
+        previous = self.previous_by_manuscript_number.get(
+            filename_to_manuscript_number(filename)
+        )
+        is_unchanged = (
+            previous is not None and
+            previous.content_hash == content_hash and
+            previous.version == DATA_VERSION
+        )
+        if is_unchanged:
+            self.unchanged_content_count += 1
+        return is_unchanged
+
+    def should_apply(self, filename: str, content_hash: str, rows_hash: str) -> bool:
+        manuscript_number = filename_to_manuscript_number(filename)
+        self.updated_by_manuscript_number[manuscript_number] = {
+            'manuscript_number': manuscript_number,
+            'content_hash': content_hash,
+            'rows_hash': rows_hash,
+            'version': DATA_VERSION
+        }
+        previous = self.previous_by_manuscript_number.get(manuscript_number)
+        if previous is not None and previous.rows_hash == rows_hash:
+            self.unchanged_rows_count += 1
+            return False
+        self.applied_count += 1
+        return True
+
+    def save(self, db):
+        if self.updated_by_manuscript_number:
+            db.import_xml_file.update_or_create_list(
+                list(self.updated_by_manuscript_number.values())
+            )
 
 
 def filter_invalid_person_ids(frame_by_table_name):
@@ -664,10 +1143,78 @@ def apply_early_career_researcher_flag(
     return df
 
 
-def _convert_data(
-        process_fn: callable, db, field_mapping_by_table_name,
-        early_career_researcher_person_ids, export_emails=False):
+def _get_unique_column_values(frame_by_table_name, table_name: str, column: str) -> set:
+    df = frame_by_table_name.get(table_name)
+    if df is None or len(df) == 0:
+        return set()
+    return set(df[column].dropna().unique())
+
+
+def get_review_stats_affected_person_ids(db, frame_by_table_name) -> Set[str]:
+    """Returns the persons with previous or new stages of the imported versions."""
+    version_ids = _get_unique_column_values(frame_by_table_name, 'manuscript_version', 'version_id')
+    return (
+        _get_unique_column_values(frame_by_table_name, 'manuscript_stage', 'person_id') |
+        db.manuscript_stage.get_distinct_values_where_in('person_id', 'version_id', version_ids)
+    )
+
 
+def load_frames_staged(
+        db, table_names: List[str], frame_by_table_name: Dict[str, pd.DataFrame],
+        replace_key_by_table_name: Dict[str, str]) -> Dict[str, Dict[str, int]]:
+    """Bulk loads the rows of each table into a staging table, then deletes the stale rows
+    and upserts the staged rows (within the current transaction).
+
+    Returns the number of staged, deleted and upserted rows by table name.
+    """
+    row_counts_by_table_name = {
+        table_name: {'staged': 0, 'deleted': 0, 'upserted': 0}
+        for table_name in table_names
+    }
+    staging_table_by_name = {}
+    pbar = tqdm(table_names, leave=False)
+    for table_name in pbar:
+        df = frame_by_table_name[table_name]
+        pbar.set_description(rjust_and_shorten_text(
+            'stage {}({})'.format(table_name, len(df)),
+            width=40
+        ))
+        if len(df) > 0:
+            staging_table_by_name[table_name] = db[table_name].stage_records(iter_records(df))
+            row_counts_by_table_name[table_name]['staged'] = len(df)
+
+    pbar = tqdm([
+        t for t in reversed(table_names)
+        if t in staging_table_by_name and replace_key_by_table_name.get(t) is not None
+    ], leave=False)
+    for table_name in pbar:
+        pbar.set_description(rjust_and_shorten_text(
+            'remove stale {}'.format(table_name),
+            width=40
+        ))
+        row_counts_by_table_name[table_name]['deleted'] = db[table_name].delete_stale_staged(
+            staging_table_by_name[table_name], replace_key_by_table_name[table_name]
+        )
+
+    pbar = tqdm([t for t in table_names if t in staging_table_by_name], leave=False)
+    for table_name in pbar:
+        pbar.set_description(rjust_and_shorten_text(
+            'update/insert {}'.format(table_name),
+            width=40
+        ))
+        row_counts_by_table_name[table_name]['upserted'] = db[table_name].upsert_staged(
+            staging_table_by_name[table_name]
+        )
+
+    for staging_table in staging_table_by_name.values():
+        staging_table.drop(db.session.connection())
+
+    for table_name, row_counts in row_counts_by_table_name.items():
+        LOGGER.debug('%s: %s', table_name, row_counts)
+    return row_counts_by_table_name
+
+
+def create_table_outputs(export_emails=False) -> Dict[str, TableOutput]:
     table_names = {
         'person',
         'manuscript_email_meta',
@@ -679,14 +1226,19 @@ def _convert_data(
     for copy_paths in xml_copy_paths.values():
         for table_name in copy_paths.keys():
             table_names.add(table_name)
-    tables = dict((table_name, TableOutput(name=table_name)) for table_name in table_names)
+    return dict((table_name, TableOutput(name=table_name)) for table_name in table_names)
+
+
+def _convert_data(
+        process_fn: callable, db, field_mapping_by_table_name,
+        early_career_researcher_person_ids, export_emails=False, staged_load=False):
+
+    tables = create_table_outputs(export_emails=export_emails)
 
     process_fn(
         tables=tables
     )
 
-    db.session.close_all()
-
     table_names = ['person', 'manuscript', 'manuscript_version']
     table_names = (
         table_names +
@@ -712,92 +1264,243 @@ def _convert_data(
     # ignore entries with invalid person id (perhaps address that differently in the future)
     filter_invalid_person_ids(frame_by_table_name)
 
-    # we currently only support update or inserts with a single primary key
-    # updating relationships is more complicated,
-    # we would need to remove no longer existing relationships for example.
-    # removing parents of relationships seem to be costly (tend to have a single primary key),
-    # the speed gain of just supporting only those for now is still worth it.
-    table_names_supporting_update_or_insert_set = ([
-        t for t in table_names if len(db[t].primary_key) == 1
-    ])
-
-    table_names_supporting_update_or_insert = [
-        t for t in table_names if t in table_names_supporting_update_or_insert_set
+    # the frames keep their dtypes, records (with nulls as None) are created per table when needed
+
+    # the materialized review stats of those persons will need to be refreshed
+    affected_person_ids = get_review_stats_affected_person_ids(db, frame_by_table_name)
+    LOGGER.debug('persons with review stats pending refresh: %d', len(affected_person_ids))
+    if affected_person_ids:
+        db.person_review_stats_refresh.update_or_create_list([
+            {'person_id': person_id} for person_id in sorted(affected_person_ids)
+        ])
+
+    # rows of tables with a composite primary key (e.g. relationships) are replaced
+    # by their key (e.g. version_id), remove the rows that are no longer present
+    table_names_with_composite_primary_key = [
+        t for t in table_names if len(db[t].primary_key) > 1
     ]
 
-    table_names_not_supporting_update_or_insert = [
-        t for t in table_names if t not in table_names_supporting_update_or_insert_set
+    # all tables with staged_load, otherwise the configured tables (e.g. manuscript_stage and
+    # manuscript_author on PostgreSQL, using COPY) are loaded via staging tables,
+    # after the other tables (which they reference)
+    staged_table_names = [
+        t for t in table_names
+        if staged_load or t in db.staged_load_table_names
     ]
+    row_counts_by_table_name = _apply_row_changes(
+        db, tables, [t for t in table_names if t not in staged_table_names],
+        frame_by_table_name, table_names_with_composite_primary_key
+    )
+    if staged_table_names:
+        staged_row_counts_by_table_name = load_frames_staged(
+            db, staged_table_names, frame_by_table_name,
+            replace_key_by_table_name={
+                t: tables[t].key for t in table_names_with_composite_primary_key
+            }
+        )
+        LOGGER.info(
+            'staged load: %d rows staged, %d stale rows deleted, %d rows updated/inserted',
+            *[
+                sum(row_counts[name] for row_counts in staged_row_counts_by_table_name.values())
+                for name in ['staged', 'deleted', 'upserted']
+            ]
+        )
+        row_counts_by_table_name.update(staged_row_counts_by_table_name)
+    return row_counts_by_table_name
 
-    LOGGER.debug('removing records: %s', table_names_not_supporting_update_or_insert)
-    pbar = tqdm(list(reversed(table_names_not_supporting_update_or_insert)), leave=False)
-    for table_name in pbar:
-        pbar.set_description(rjust_and_shorten_text(
-            'remove {}'.format(table_name),
-            width=40
-        ))
-        remove_records(db, table_name, frame_by_table_name[table_name], tables[table_name].key)
 
-    LOGGER.debug('updating/creating records: %s', table_names_supporting_update_or_insert)
-    pbar = tqdm(table_names_supporting_update_or_insert, leave=False)
+def _apply_row_changes(
+        db, tables, table_names: List[str], frame_by_table_name: Dict[str, pd.DataFrame],
+        table_names_with_composite_primary_key: List[str]) -> Dict[str, Dict[str, int]]:
+    if not table_names:
+        return {}
+    table_names_with_composite_primary_key = [
+        t for t in table_names_with_composite_primary_key if t in table_names
+    ]
+
+    # only the inserted, updated and deleted rows are written
+    LOGGER.debug('comparing with existing records: %s', table_names)
+    row_changes_by_table_name = {}
+    pbar = tqdm(table_names, leave=False)
     for table_name in pbar:
         df = frame_by_table_name[table_name]
         pbar.set_description(rjust_and_shorten_text(
-            'update/insert {}({})'.format(table_name, len(df)),
+            'compare {}({})'.format(table_name, len(df)),
             width=40
         ))
-        if len(df) > 0:
-            db[table_name].update_or_create_list(
-                replace_null_with_none(df)
-                .to_dict(orient='records')
+        row_changes_by_table_name[table_name] = (
+            db[table_name].get_row_changes(
+                list(iter_records(df)),
+                replace_key=(
+                    tables[table_name].key
+                    if table_name in table_names_with_composite_primary_key
+                    else None
+                )
             )
+            if len(df) > 0
+            else RowChanges()
+        )
+
+    LOGGER.debug('removing stale records: %s', table_names_with_composite_primary_key)
+    for table_name in reversed(table_names_with_composite_primary_key):
+        db[table_name].apply_row_changes(row_changes_by_table_name[table_name], upsert=False)
 
-    LOGGER.debug('inserting records: %s', table_names_not_supporting_update_or_insert)
-    pbar = tqdm(table_names_not_supporting_update_or_insert, leave=False)
+    LOGGER.debug('updating/creating records: %s', table_names)
+    pbar = tqdm(table_names, leave=False)
     for table_name in pbar:
-        df = frame_by_table_name[table_name]
+        row_changes = row_changes_by_table_name[table_name]
         pbar.set_description(rjust_and_shorten_text(
-            'insert {}({})'.format(table_name, len(df)),
+            'update/insert {}({})'.format(
+                table_name, len(row_changes.inserted) + len(row_changes.updated)
+            ),
             width=40
         ))
-        if len(df) > 0:
-            insert_records(db, table_name, df)
+        db[table_name].apply_row_changes(row_changes, delete=False)
+
+    row_counts_by_table_name = {
+        table_name: row_changes.get_counts()
+        for table_name, row_changes in row_changes_by_table_name.items()
+    }
+    LOGGER.info(
+        'row changes: %d inserted, %d updated, %d deleted, %d unchanged',
+        *[
+            sum(row_counts[name] for row_counts in row_counts_by_table_name.values())
+            for name in ['inserted', 'updated', 'deleted', 'unchanged']
+        ]
+    )
+    LOGGER.debug('row changes by table: %s', row_counts_by_table_name)
+    return row_counts_by_table_name
 
 
 def convert_zip_file(
         zip_filename: str, zip_stream, db, field_mapping_by_table_name,
         early_career_researcher_person_ids, export_emails=False,
-        skip_if_processed=True):
+        skip_if_processed=True, staged_load=False, max_workers=1,
+        skip_unchanged_files=True, commit=True):
 
     if skip_if_processed:
         processed = db.import_processed.get(zip_filename)
         if processed is not None and processed.version == DATA_VERSION:
             LOGGER.debug('skip already processed zip file: %s', zip_filename)
-            return
+            return None
+
+    imported_xml_files = None
+    if skip_unchanged_files:
+        imported_xml_files = ImportedXmlFiles.from_database(
+            db, list_files_in_zip(zip_stream, ext=".xml")
+        )
+
+    def process_zip_skipping_unchanged_files(tables):
+        map_file = partial(
+            convert_xml_file_contents_to_hashed_table_operations,
+            field_mapping_by_table_name=field_mapping_by_table_name
+        )
+        person_field_mapping_by_table_name = get_person_field_mapping_by_table_name(
+            field_mapping_by_table_name
+        )
+        map_unchanged_file = partial(
+            convert_xml_file_contents_to_table_operations,
+            field_mapping_by_table_name=person_field_mapping_by_table_name
+        )
+        # the content hash and whether the content is unchanged, of the files to be applied
+        content_hash_and_is_unchanged_by_filename = {}
+
+        def is_unchanged_file(filename, content_hash):
+            is_unchanged = imported_xml_files.is_unchanged_content(filename, content_hash)
+            content_hash_and_is_unchanged_by_filename[filename] = (content_hash, is_unchanged)
+            return is_unchanged
+
+        def get_map_file(filename, content):
+            if is_unchanged_file(filename, get_content_hash(content)):
+                return map_unchanged_file
+            return map_file
+
+        def apply_result(filename, result):
+            content_hash, is_unchanged = content_hash_and_is_unchanged_by_filename.pop(filename)
+            if is_unchanged:
+                # only the persons were converted
+                replay_table_operations(result, tables)
+                return
+            rows_hash, operations = result
+            if imported_xml_files.should_apply(filename, content_hash, rows_hash):
+                replay_table_operations(operations, tables)
+            else:
+                replay_table_operations(filter_person_table_operations(operations), tables)
+
+        def inspect_file(filename, stream):
+            return get_stream_content_hash(stream)
+
+        def process_file(filename, stream, content_hash):
+            if is_unchanged_file(filename, content_hash):
+                result = convert_xml_stream_to_table_operations(
+                    stream, filename_to_manuscript_number(filename),
+                    person_field_mapping_by_table_name
+                )
+            else:
+                result = convert_xml_file_stream_to_hashed_table_operations(
+                    filename, stream, field_mapping_by_table_name
+                )
+            apply_result(filename, result)
+
+        if max_workers > 1:
+            process_files_in_zip_in_parallel(
+                zip_stream, map_file, apply_result, ext=".xml",
+                max_workers=max_workers, get_map_file=get_map_file
+            )
+        else:
+            process_files_in_zip_after_inspecting(
+                zip_stream, inspect_file, process_file, ext=".xml"
+            )
 
     def process_zip(tables):
         def process_file(filename, stream):
             return convert_xml_file_contents(filename, stream, tables, field_mapping_by_table_name)
 
-        process_files_in_zip(zip_stream, process_file, ext=".xml")
+        if imported_xml_files is not None:
+            process_zip_skipping_unchanged_files(tables)
+        elif max_workers > 1:
+            # the files are parsed and converted in parallel, the results are applied in order
+            process_files_in_zip_in_parallel(
+                zip_stream,
+                partial(
+                    convert_xml_file_contents_to_table_operations,
+                    field_mapping_by_table_name=field_mapping_by_table_name
+                ),
+                lambda _, operations: replay_table_operations(operations, tables),
+                ext=".xml",
+                max_workers=max_workers
+            )
+        else:
+            process_files_in_zip(zip_stream, process_file, ext=".xml")
 
-    _convert_data(
+    row_counts_by_table_name = _convert_data(
         process_fn=process_zip,
         db=db,
         field_mapping_by_table_name=field_mapping_by_table_name,
         early_career_researcher_person_ids=early_career_researcher_person_ids,
-        export_emails=export_emails
+        export_emails=export_emails,
+        staged_load=staged_load
     )
 
+    if imported_xml_files is not None:
+        LOGGER.info(
+            '%s: %d xml files applied, %d skipped (unchanged content), %d unchanged rows',
+            zip_filename, imported_xml_files.applied_count,
+            imported_xml_files.unchanged_content_count, imported_xml_files.unchanged_rows_count
+        )
+        imported_xml_files.save(db)
+
     LOGGER.debug('marking file as processed: %s (%d)', zip_filename, DATA_VERSION)
     db.import_processed.update_or_create(import_processed_id=zip_filename, version=DATA_VERSION)
 
-    db.commit()
+    if commit:
+        db.commit()
+    return row_counts_by_table_name
 
 
 def convert_xml_file(
         xml_filename: str, db, field_mapping_by_table_name,
-        early_career_researcher_person_ids, export_emails=False):
+        early_career_researcher_person_ids, export_emails=False, staged_load=False):
 
     def process_xml(tables):
         with open(xml_filename, 'rb') as stream:
@@ -805,15 +1508,58 @@ def convert_xml_file(
                 xml_filename, stream, tables, field_mapping_by_table_name
             )
 
-    _convert_data(
+    row_counts_by_table_name = _convert_data(
         process_fn=process_xml,
         db=db,
         field_mapping_by_table_name=field_mapping_by_table_name,
         early_career_researcher_person_ids=early_career_researcher_person_ids,
-        export_emails=export_emails
+        export_emails=export_emails,
+        staged_load=staged_load
     )
 
     db.commit()
+    return row_counts_by_table_name
+
+
+class BatchedZipImport:
+    """Imports zip files within a transaction committed after every zips_per_commit zip files
+    (or only when finished, if zero).
+
+    Each zip file is imported within a savepoint. The changes of a zip file failing to import
+    are rolled back, the previously imported zip files are committed and the error re-raised.
+    The newer zip files are therefore not imported before the failed zip file
+    (which will be retried by the next run), keeping the latest data of the newest zip file.
+    """
+
+    def __init__(self, db, zips_per_commit: int = 1):
+        self.db = db
+        self.zips_per_commit = zips_per_commit
+        self.uncommitted_count = 0
+        self.imported_count = 0
+
+    def process(self, filename: str, process_fn: Callable):
+        try:
+            with self.db.savepoint():
+                result = process_fn()
+        except Exception as e:
+            LOGGER.error('failed to import %s (rolled back): %s', filename, e)
+            self.commit()
+            raise
+        self.imported_count += 1
+        self.uncommitted_count += 1
+        if self.zips_per_commit and self.uncommitted_count >= self.zips_per_commit:
+            self.commit()
+        return result
+
+    def commit(self):
+        if self.uncommitted_count:
+            LOGGER.info('committing %d imported zip files', self.uncommitted_count)
+        self.db.commit()
+        self.uncommitted_count = 0
+
+    def finish(self):
+        self.commit()
+        LOGGER.info('imported zip files: %d', self.imported_count)
 
 
 def parse_args(argv: List[str] = None):
@@ -828,6 +1574,34 @@ def parse_args(argv: List[str] = None):
         "--xml-file",
         help="Force processing of particular XML file"
     )
+    parser.add_argument(
+        "--staged-load", action="store_true", default=None,
+        help=(
+            "Bulk load the tables into staging tables, then replace the rows using set-based"
+            " statements (defaults to staged_load_enabled in the database section)"
+        )
+    )
+    parser.add_argument(
+        "--reimport-unchanged", action="store_true",
+        help=(
+            "Also import the XML files of the zip files"
+            " that are unchanged since their last import (by their content or rows hash)"
+        )
+    )
+    parser.add_argument(
+        "--workers", type=int,
+        help=(
+            "Number of worker processes converting the XML files of a zip file"
+            " (defaults to import_workers in the pipeline section, 1 being serial)"
+        )
+    )
+    parser.add_argument(
+        "--zips-per-commit", type=int,
+        help=(
+            "Number of zip files imported per transaction, 0 committing once all of the zip files"
+            " were imported (defaults to import_zips_per_commit in the pipeline section, 1)"
+        )
+    )
     return parser.parse_args(argv)
 
 
@@ -835,6 +1609,16 @@ def main(argv: List[str] = None):
     args = parse_args(argv)
 
     field_mapping_by_table_name = default_field_mapping_by_table_name
+    app_config = get_app_config()
+    staged_load = args.staged_load
+    if staged_load is None:
+        staged_load = app_config.getboolean('database', 'staged_load_enabled', fallback=False)
+    max_workers = args.workers
+    if max_workers is None:
+        max_workers = app_config.getint('pipeline', 'import_workers', fallback=1)
+    zips_per_commit = args.zips_per_commit
+    if zips_per_commit is None:
+        zips_per_commit = app_config.getint('pipeline', 'import_zips_per_commit', fallback=1)
 
     with connect_managed_configured_database() as db:
 
@@ -847,12 +1631,18 @@ def main(argv: List[str] = None):
             ).all()
         )
 
+        batched_zip_import = BatchedZipImport(db, zips_per_commit=zips_per_commit)
+
         def process_zip(filename, stream, skip_if_processed=True):
-            return convert_zip_file(
+            return batched_zip_import.process(filename, lambda: convert_zip_file(
                 filename, stream, db, field_mapping_by_table_name,
                 early_career_researcher_person_ids,
-                skip_if_processed=skip_if_processed
-            )
+                skip_if_processed=skip_if_processed,
+                staged_load=staged_load,
+                max_workers=max_workers,
+                skip_unchanged_files=not args.reimport_unchanged,
+                commit=False
+            ))
 
         if args.xml_file:
             LOGGER.info('processing xml file %s', args.xml_file)
@@ -860,17 +1650,20 @@ def main(argv: List[str] = None):
                 args.xml_file,
                 db=db,
                 field_mapping_by_table_name=field_mapping_by_table_name,
-                early_career_researcher_person_ids=early_career_researcher_person_ids
+                early_career_researcher_person_ids=early_career_researcher_person_ids,
+                staged_load=staged_load
             )
         elif args.zip_file:
             LOGGER.info('processing zip file %s', args.zip_file)
             with open(args.zip_file, 'rb') as zip_stream:
                 process_zip(args.zip_file, zip_stream, skip_if_processed=False)
+            batched_zip_import.finish()
         else:
             source = get_downloads_xml_path()
 
             LOGGER.info('processing zip files in %s', source)
             process_files_in_directory_or_zip(source, process_zip, ext=".zip")
+            batched_zip_import.finish()
 
         LOGGER.info("done")
 
@@ -2,8 +2,18 @@
 specialised mbox file parser that can handle large file sizes
 '''
 
+import re
+
 MESSAGE_START_PREFIX = b'From '
 
+LINE_MESSAGE_START_PREFIX = b'\n' + MESSAGE_START_PREFIX
+
+# a line (group 1 being the message start prefix, group 2 the line without trailing whitespace)
+LINE_PATTERN = re.compile(rb'(From )?((?:[^\n]*[^ \t\n\r\x0b\x0c])?)[^\n]*(?:\n|\Z)')
+
+# (also matches memoryview lines, without copying them)
+HEADER_NAME_SEPARATOR_PATTERN = re.compile(rb'[^:]*:')
+
 
 def split_messages_skip_content(line_generator):
     lines = []
@@ -26,23 +36,90 @@ def split_messages_skip_content(line_generator):
         yield lines
 
 
+def find_message_start(buffer, start: int = 0, end: int = None) -> int:
+    """Returns the position of the first message start line at or after start
+    (or -1 if there is none before end)."""
+    if end is None:
+        end = len(buffer)
+    is_line_start = start == 0 or buffer[start - 1:start] == b'\n'
+    if is_line_start and buffer[start:start + len(MESSAGE_START_PREFIX)] == MESSAGE_START_PREFIX:
+        return start
+    position = buffer.find(LINE_MESSAGE_START_PREFIX, max(start - 1, 0), end)
+    return position + 1 if position >= 0 else -1
+
+
+def find_message_shard_boundaries(buffer, shard_count: int):
+    """Splits the buffer into up to shard_count ranges of messages, of about the same size.
+
+    Returns the boundary positions, starting with zero and ending with the size of the buffer.
+    Every other boundary is the start of a message (found after the evenly spaced offsets).
+    """
+    size = len(buffer)
+    boundaries = [0]
+    for shard_index in range(1, shard_count):
+        offset = max(size * shard_index // shard_count, boundaries[-1] + 1)
+        position = find_message_start(buffer, offset, size)
+        if position < 0:
+            break
+        boundaries.append(position)
+    boundaries.append(size)
+    return boundaries
+
+
+def iter_message_header_lines(buffer, start: int = 0, end: int = None):
+    """Yields the header lines of the messages within buffer[start:end]
+    (the same as split_messages_skip_content for the lines of the range).
+
+    The buffer would usually be a memory-mapped file. The message contents are skipped over
+    without being read and the header lines are memoryview slices of the buffer.
+    """
+    if end is None:
+        end = len(buffer)
+    view = memoryview(buffer)
+    message_start = find_message_start(buffer, start, end)
+    while message_start >= 0:
+        lines = []
+        line_start = buffer.find(b'\n', message_start, end) + 1
+        next_message_start = -1
+        while 0 < line_start < end:
+            line_match = LINE_PATTERN.match(buffer, line_start, end)
+            if line_match.start(1) >= 0:
+                next_message_start = line_start
+                break
+            trimmed_line_end = line_match.end(2)
+            if trimmed_line_end == line_start:
+                # the end of the headers, skipping over the content
+                next_message_start = find_message_start(buffer, line_match.end(), end)
+                break
+            lines.append(view[line_start:trimmed_line_end])
+            line_start = line_match.end()
+        # (like split_messages_skip_content, only the last message may have no header lines)
+        if lines or (next_message_start < 0 and end == len(buffer)):
+            yield lines
+        message_start = next_message_start
+
+
 def parse_header_properties(header_lines, required_keys=None, encoding='utf-8'):
     current_name = None
     current_value = None
     for line in header_lines:
         if len(line) > 0:
             if chr(line[0]).isalpha():
-                sep_index = line.index(b':')
+                # the lines may be bytes or memoryview slices (only the decoded parts are copied)
+                sep_match = HEADER_NAME_SEPARATOR_PATTERN.match(line)
+                if sep_match is None:
+                    raise ValueError('header name separator not found')
+                sep_index = sep_match.end() - 1
                 if sep_index > 0:
                     if current_name is not None and current_value is not None:
                         yield current_name, current_value
-                    current_name = line[:sep_index].decode(encoding)
+                    current_name = str(line[:sep_index], encoding)
                     if required_keys is None or current_name in required_keys:
-                        current_value = line[sep_index + 1:].decode(encoding).strip()
+                        current_value = str(line[sep_index + 1:], encoding).strip()
                     else:
                         current_value = None
                 else:
                     if current_value is not None:
-                        current_value += '\n' + line.decode(encoding).strip()
+                        current_value += '\n' + str(line, encoding).strip()
     if current_name is not None and current_value is not None:
         yield current_name, current_value
@@ -0,0 +1,206 @@
+import json
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PipelineStep:
+    def __init__(self, name: str, run: Callable[[], object], depends_on: List[str] = None):
+        self.name = name
+        self.run = run
+        self.depends_on = list(depends_on or [])
+
+    def __repr__(self):
+        return '%s(%s, depends_on=%s)' % (type(self).__name__, self.name, self.depends_on)
+
+
+class PipelineCheckpoint:
+    """Records the completed steps (and their durations) of a pipeline run in a JSON file,
+    so that a failed run can be resumed without repeating the completed steps."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.duration_by_completed_step_name = OrderedDict()
+        self.failed_step_names = []
+        if os.path.exists(filename):
+            with open(filename, 'r') as f:
+                data = json.load(f)
+            self.duration_by_completed_step_name.update(data.get('completed_steps', []))
+            self.failed_step_names = data.get('failed_steps', [])
+
+    @property
+    def completed_step_names(self) -> List[str]:
+        return list(self.duration_by_completed_step_name.keys())
+
+    def is_completed(self, step_name: str) -> bool:
+        return step_name in self.duration_by_completed_step_name
+
+    def mark_completed(self, step_name: str, duration: float):
+        self.duration_by_completed_step_name[step_name] = duration
+        if step_name in self.failed_step_names:
+            self.failed_step_names.remove(step_name)
+        self.save()
+
+    def mark_failed(self, step_name: str):
+        if step_name not in self.failed_step_names:
+            self.failed_step_names.append(step_name)
+        self.save()
+
+    def save(self):
+        dirname = os.path.dirname(self.filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'w') as f:
+            json.dump({
+                'completed_steps': list(self.duration_by_completed_step_name.items()),
+                'failed_steps': self.failed_step_names
+            }, f, indent=2)
+        os.replace(temp_filename, self.filename)
+
+    def remove(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+        self.duration_by_completed_step_name.clear()
+        self.failed_step_names = []
+
+
+def validate_steps(steps: List[PipelineStep]):
+    step_by_name = {step.name: step for step in steps}
+    if len(step_by_name) != len(steps):
+        raise Exception('duplicate step names: %s' % [step.name for step in steps])
+    for step in steps:
+        unknown_names = [name for name in step.depends_on if name not in step_by_name]
+        if unknown_names:
+            raise Exception('unknown dependencies of step %s: %s' % (step.name, unknown_names))
+    resolved_names = set()
+    remaining_steps = list(steps)
+    while remaining_steps:
+        resolvable_steps = [
+            step for step in remaining_steps
+            if all(name in resolved_names for name in step.depends_on)
+        ]
+        if not resolvable_steps:
+            raise Exception('dependency cycle between steps: %s' % [
+                step.name for step in remaining_steps
+            ])
+        resolved_names.update(step.name for step in resolvable_steps)
+        remaining_steps = [step for step in remaining_steps if step not in resolvable_steps]
+
+
+def get_ready_steps(
+        steps: List[PipelineStep], completed_names: set, started_names: set
+        ) -> List[PipelineStep]:
+    """Returns the steps not started yet whose dependencies are completed (in declared order)."""
+    return [
+        step for step in steps
+        if step.name not in started_names and all(
+            name in completed_names for name in step.depends_on
+        )
+    ]
+
+
+def _run_step_in_process(step: PipelineStep):
+    try:
+        step.run()
+    except Exception as e:  # pylint: disable=broad-except
+        LOGGER.exception('step failed: %s: %s', step.name, e)
+        sys.exit(1)
+
+
+def run_pipeline(
+        steps: List[PipelineStep], checkpoint: PipelineCheckpoint = None,
+        max_workers: int = 1) -> Dict[str, float]:
+    """Runs the steps once their dependencies completed, returning the durations by step name.
+
+    With max_workers > 1, each step runs in a separate process, running up to max_workers
+    independent steps at the same time. Otherwise the steps run in the current process,
+    in the declared order.
+    Steps already completed according to the checkpoint are skipped. After a step failed,
+    no further steps are started (the running steps will complete) and an exception is raised.
+    """
+    validate_steps(steps)
+    completed_names = set(checkpoint.completed_step_names) if checkpoint is not None else set()
+    skipped_names = [step.name for step in steps if step.name in completed_names]
+    if skipped_names:
+        LOGGER.info('resuming, skipping completed steps: %s', skipped_names)
+    started_names = set(completed_names)
+    failed_names = []
+    duration_by_step_name = OrderedDict()
+    running_process_and_start_time_by_step_name = {}
+
+    def on_step_done(step_name: str, start_time: float, success: bool):
+        duration = time.time() - start_time
+        if success:
+            LOGGER.info('step done: %s (%.1fs)', step_name, duration)
+            completed_names.add(step_name)
+            duration_by_step_name[step_name] = duration
+            if checkpoint is not None:
+                checkpoint.mark_completed(step_name, duration)
+        else:
+            LOGGER.warning('step failed: %s (%.1fs)', step_name, duration)
+            failed_names.append(step_name)
+            if checkpoint is not None:
+                checkpoint.mark_failed(step_name)
+
+    while not failed_names:
+        ready_steps = get_ready_steps(steps, completed_names, started_names)
+        if max_workers <= 1:
+            if not ready_steps:
+                break
+            step = ready_steps[0]
+            LOGGER.info('running: %s', step.name)
+            started_names.add(step.name)
+            start_time = time.time()
+            try:
+                step.run()
+            except Exception:
+                on_step_done(step.name, start_time, success=False)
+                raise
+            on_step_done(step.name, start_time, success=True)
+            continue
+        for step in ready_steps[:max_workers - len(running_process_and_start_time_by_step_name)]:
+            LOGGER.info('running (in separate process): %s', step.name)
+            started_names.add(step.name)
+            process = multiprocessing.Process(
+                target=_run_step_in_process, args=(step,), name=step.name
+            )
+            process.start()
+            running_process_and_start_time_by_step_name[step.name] = (process, time.time())
+        if not running_process_and_start_time_by_step_name:
+            break
+        _wait_for_any_process(running_process_and_start_time_by_step_name, on_step_done)
+
+    while running_process_and_start_time_by_step_name:
+        _wait_for_any_process(running_process_and_start_time_by_step_name, on_step_done)
+
+    if failed_names:
+        raise Exception('failed pipeline steps: %s' % failed_names)
+    return duration_by_step_name
+
+
+def _wait_for_any_process(
+        running_process_and_start_time_by_step_name: dict, on_step_done: Callable):
+    multiprocessing.connection.wait([
+        process.sentinel for process, _ in running_process_and_start_time_by_step_name.values()
+    ])
+    for step_name, (process, start_time) in list(
+            running_process_and_start_time_by_step_name.items()):
+        if not process.is_alive():
+            process.join()
+            del running_process_and_start_time_by_step_name[step_name]
+            on_step_done(step_name, start_time, success=process.exitcode == 0)
+
+
+def log_durations(duration_by_step_name: Dict[str, float], logger: logging.Logger = None):
+    if logger is None:
+        logger = LOGGER
+    for step_name, duration in duration_by_step_name.items():
+        logger.info('step duration: %s: %.1fs', step_name, duration)
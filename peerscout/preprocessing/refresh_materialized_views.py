@@ -0,0 +1,39 @@
+import argparse
+import logging
+from typing import List
+
+from ..shared.database import connect_managed_configured_database
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description=(
+            "PeerScout, refresh materialized views"
+            " (by default only for persons affected by the import)"
+        )
+    )
+    parser.add_argument(
+        "--full", action="store_true",
+        help="Fully refresh all of the materialized views"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None):
+    args = parse_args(argv)
+
+    with connect_managed_configured_database() as db:
+        pending_count = db.refresh_materialized_views(full=args.full)
+        LOGGER.info('refreshed materialized views (pending persons: %d)', pending_count)
+
+    LOGGER.info("done")
+
+
+if __name__ == "__main__":
+    from ..shared.logging_config import configure_logging
+    configure_logging('update')
+
+    main()
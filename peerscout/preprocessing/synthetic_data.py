@@ -0,0 +1,449 @@
+import argparse
+import calendar
+import csv
+import logging
+import os
+import time
+import zipfile
+import zlib
+from collections import OrderedDict
+from typing import List
+from xml.etree.ElementTree import Element, SubElement, tostring
+
+import numpy as np
+
+from peerscout.utils.collection import iter_chunks
+from peerscout.utils.tqdm import tqdm
+
+from .import_editor_roles_and_keywords_csv import (
+    ALL_CSV_COLUMNS as EDITOR_ROLES_CSV_COLUMNS,
+    CsvColumns as EditorRolesCsvColumns
+)
+from .importEarlyCareerResearchersCsv import (
+    ALL_CSV_COLUMNS as EARLY_CAREER_RESEARCHERS_CSV_COLUMNS,
+    CsvColumns as EarlyCareerResearchersCsvColumns
+)
+from .import_testing_utils import DEFAULT_CSV_FILE_HEADER
+
+LOGGER = logging.getLogger(__name__)
+
+XML_DIR_NAME = 'downloads-xml'
+CSV_DIR_NAME = 'downloads-csv'
+
+EDITORS_CSV_PREFIX = 'synthetic-editors'
+EDITOR_ROLES_AND_KEYWORDS_CSV_PREFIX = 'synthetic-editor-roles-and-keywords'
+EARLY_CAREER_RESEARCHERS_CSV_PREFIX = 'synthetic-early-career-researchers'
+
+DEFAULT_MANUSCRIPTS_PER_ZIP = 1000
+
+SUBJECT_AREAS = [
+    'Biochemistry and Chemical Biology', 'Cancer Biology', 'Cell Biology',
+    'Chromosomes and Gene Expression', 'Computational and Systems Biology',
+    'Developmental Biology', 'Ecology', 'Epidemiology and Global Health',
+    'Evolutionary Biology', 'Genetics and Genomics', 'Immunology and Inflammation',
+    'Medicine', 'Microbiology and Infectious Disease', 'Neuroscience',
+    'Physics of Living Systems', 'Plant Biology', 'Stem Cells and Regenerative Medicine',
+    'Structural Biology and Molecular Biophysics'
+]
+
+RESEARCH_ORGANISMS = [
+    'Human', 'Mouse', 'Rat', 'Zebrafish', 'D. melanogaster', 'C. elegans', 'S. cerevisiae',
+    'E. coli', 'A. thaliana', 'Xenopus', 'None'
+]
+
+DECISIONS = [
+    'Reject Initial Submission', 'Reject Full Submission', 'Revise Full Submission',
+    'Accept Full Submission'
+]
+DECISION_PROBABILITIES = [0.6, 0.15, 0.15, 0.1]
+
+MANUSCRIPT_TYPES = ['Research Article', 'Short Report', 'Tools and Resources', 'Research Advance']
+MANUSCRIPT_TYPE_PROBABILITIES = [0.8, 0.05, 0.1, 0.05]
+
+REVIEWER_STAGE_NAMES = [
+    'Contacting Reviewers', 'Reviewers Accept', 'Review Started', 'Review Received'
+]
+
+KEYWORD_VOCABULARY_SIZE = 5000
+WORDS = [
+    'cell', 'protein', 'gene', 'neuron', 'signalling', 'receptor', 'expression', 'membrane',
+    'cortex', 'evolution', 'population', 'structure', 'kinase', 'chromatin', 'development',
+    'immune', 'infection', 'metabolism', 'imaging', 'model', 'dynamics', 'network', 'mouse',
+    'zebrafish', 'drosophila', 'yeast', 'plant', 'bacteria', 'virus', 'human'
+]
+
+# seconds since the epoch
+START_TIMESTAMP = calendar.timegm((2012, 1, 1, 0, 0, 0))
+DAY_SECONDS = 24 * 60 * 60
+
+
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description=(
+            "PeerScout, generate a synthetic dataset of eLife style manuscript XML zip files"
+            " and CSV exports (e.g. for benchmarks)"
+        )
+    )
+    parser.add_argument(
+        "--output-dir", required=True,
+        help="Data directory to write the %s and %s directories to" % (
+            XML_DIR_NAME, CSV_DIR_NAME
+        )
+    )
+    parser.add_argument(
+        "--manuscripts", type=int, default=10000,
+        help="Number of manuscripts to generate"
+    )
+    parser.add_argument(
+        "--manuscripts-per-zip", type=int, default=DEFAULT_MANUSCRIPTS_PER_ZIP,
+        help="Number of manuscripts (XML files) per zip file"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="Random seed"
+    )
+    return parser.parse_args(argv)
+
+
+class PersonPools:
+    """The person ids of the authors, reviewers, editors and senior editors.
+
+    Authors are mostly unique, while reviewers and especially editors review many manuscripts
+    (the persons are chosen using a Zipf distribution).
+    """
+
+    def __init__(self, manuscript_count: int):
+        self.author_count = max(10, manuscript_count * 4)
+        self.reviewer_count = max(10, manuscript_count // 2)
+        self.editor_count = max(5, manuscript_count // 50)
+        self.senior_editor_count = max(2, manuscript_count // 250)
+
+    @staticmethod
+    def author_id(i: int) -> str:
+        return 'author%d' % i
+
+    @staticmethod
+    def reviewer_id(i: int) -> str:
+        return 'reviewer%d' % i
+
+    @staticmethod
+    def editor_id(i: int) -> str:
+        return 'editor%d' % i
+
+    @staticmethod
+    def senior_editor_id(i: int) -> str:
+        return 'senior_editor%d' % i
+
+    def editor_ids(self) -> List[str]:
+        return [self.editor_id(i) for i in range(self.editor_count)]
+
+    def senior_editor_ids(self) -> List[str]:
+        return [self.senior_editor_id(i) for i in range(self.senior_editor_count)]
+
+
+def _zipf_choice(random: np.random.RandomState, count: int, size: int = None, a: float = 1.5):
+    return (random.zipf(a, size=size) - 1) % count
+
+
+def _unique(values: list) -> list:
+    return list(OrderedDict.fromkeys(values))
+
+
+def get_keyword(i: int) -> str:
+    return '%s %s %d' % (WORDS[i % len(WORDS)], WORDS[(i // len(WORDS)) % len(WORDS)], i)
+
+
+def get_manuscript_number(manuscript_index: int) -> str:
+    return '%06d' % (manuscript_index + 1)
+
+
+def _format_timestamp(timestamp: int) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
+
+
+def _add_text(parent: Element, tag: str, text) -> Element:
+    child = SubElement(parent, tag)
+    child.text = str(text) if text is not None else ''
+    return child
+
+
+def _add_list(parent: Element, list_tag: str, item_tag: str, items: List[dict]):
+    list_node = SubElement(parent, list_tag)
+    for item in items:
+        item_node = SubElement(list_node, item_tag)
+        for tag, text in item.items():
+            _add_text(item_node, tag, text)
+    return list_node
+
+
+def _add_person(people: Element, person_id: str, seed: int = 0):
+    # the same person (repeated across files) is generated with the same details
+    person_hash = zlib.crc32(('%d:%s' % (seed, person_id)).encode('utf-8'))
+    person = SubElement(people, 'person')
+    _add_text(person, 'email', '%s@example.org' % person_id)
+    _add_text(person, 'first-name', 'First %s' % person_id)
+    _add_text(person, 'institution', 'Institution %d' % (person_hash % 2000))
+    _add_text(person, 'last-name', 'Last %s' % person_id)
+    if (person_hash // 2000) % 10 < 3:
+        memberships = SubElement(person, 'memberships')
+        membership = SubElement(memberships, 'membership')
+        _add_text(membership, 'member-id', '0000-0001-%08d' % (person_hash % 100000000))
+        _add_text(membership, 'member-type', 'ORCID')
+    _add_text(person, 'middle-name', '')
+    _add_text(person, 'person-id', person_id)
+    _add_text(person, 'status', 'Active')
+    _add_text(person, 'title', 'Dr.')
+
+
+def generate_manuscript_xml_root(
+        manuscript_index: int, person_pools: PersonPools, seed: int = 0) -> Element:
+    """Generates the XML of a manuscript (with its versions) and the referenced persons.
+
+    The manuscript is generated using its own random state, i.e. it doesn't depend on
+    the other manuscripts.
+    """
+    random = np.random.RandomState([seed, manuscript_index])
+    manuscript_number = get_manuscript_number(manuscript_index)
+    root = Element('xml')
+    manuscript = SubElement(root, 'manuscript')
+    _add_text(manuscript, 'country', 'Country %d' % random.randint(0, 100))
+    production_data = SubElement(manuscript, 'production-data')
+    _add_text(production_data, 'production-data-doi', '10.7554/eLife.%s' % manuscript_number)
+
+    person_ids = set()
+    version_count = min(4, random.geometric(0.55))
+    author_ids = _unique([
+        person_pools.author_id(i)
+        for i in random.randint(0, person_pools.author_count, min(30, 1 + random.poisson(4)))
+    ])
+    keywords = _unique([
+        get_keyword(i)
+        for i in _zipf_choice(random, KEYWORD_VOCABULARY_SIZE, size=random.randint(3, 7))
+    ])
+    subject_areas = list(random.choice(SUBJECT_AREAS, random.randint(1, 3), replace=False))
+    research_organisms = list(
+        random.choice(RESEARCH_ORGANISMS, random.randint(1, 3), replace=False)
+    )
+    editor_id = person_pools.editor_id(_zipf_choice(random, person_pools.editor_count))
+    senior_editor_id = person_pools.senior_editor_id(
+        _zipf_choice(random, person_pools.senior_editor_count)
+    )
+    submission_timestamp = START_TIMESTAMP + int(random.randint(0, 6 * 365 * DAY_SECONDS))
+    for version_no in range(version_count):
+        is_last_version = version_no == version_count - 1
+        decision = (
+            random.choice(DECISIONS, p=DECISION_PROBABILITIES)
+            if is_last_version
+            else 'Revise Full Submission'
+        )
+        decision_timestamp = submission_timestamp + int(random.randint(7, 90)) * DAY_SECONDS
+        reviewer_ids = (
+            []
+            if decision == 'Reject Initial Submission'
+            else _unique([
+                person_pools.reviewer_id(i)
+                for i in _zipf_choice(
+                    random, person_pools.reviewer_count, size=random.randint(2, 5), a=1.2
+                )
+            ])
+        )
+        version = SubElement(manuscript, 'version')
+        _add_text(version, 'key', '%s|%d' % (manuscript_number, version_no))
+        _add_text(version, 'abstract', ' '.join(
+            random.choice(WORDS, random.randint(50, 250))
+        ))
+        _add_list(version, 'authors', 'author', [{
+            'author-person-id': author_id,
+            'author-seq': seq + 1,
+            'is-corr': 'true' if seq == len(author_ids) - 1 else 'false'
+        } for seq, author_id in enumerate(author_ids)])
+        _add_text(version, 'decision', decision)
+        _add_text(version, 'decision-date', _format_timestamp(decision_timestamp))
+        _add_list(version, 'editors', 'editor', [{
+            'editor-assigned-date': _format_timestamp(submission_timestamp),
+            'editor-person-id': editor_id
+        }])
+        stages = []
+        for reviewer_index, reviewer_id in enumerate(reviewer_ids):
+            # not all of the contacted reviewers will accept and complete the review
+            stage_count = random.randint(1, len(REVIEWER_STAGE_NAMES) + 1)
+            for stage_index, stage_name in enumerate(REVIEWER_STAGE_NAMES[:stage_count]):
+                stages.append({
+                    'stage-affective-person-id': reviewer_id,
+                    'stage-name': stage_name,
+                    'stage-triggered-by-person-id': (
+                        editor_id if stage_index == 0 else reviewer_id
+                    ),
+                    'start-date': _format_timestamp(
+                        submission_timestamp + (1 + stage_index * 5) * DAY_SECONDS
+                        + reviewer_index * 60
+                    )
+                })
+        _add_list(version, 'history', 'stage', stages)
+        _add_text(version, 'is_resubmission', 'false')
+        _add_list(version, 'keywords', 'keywords', [
+            {'sequence': seq + 1, 'word': keyword} for seq, keyword in enumerate(keywords)
+        ])
+        _add_list(version, 'manuscript-funding', 'manuscript-funding', [{
+            'funding-seq': seq + 1,
+            'funding-title': 'Funder %d' % funder_no,
+            'grant-reference-number': 'Grant %d' % random.randint(0, 100000)
+        } for seq, funder_no in enumerate(_zipf_choice(
+            random, 500, size=random.randint(0, 3)
+        ))])
+        _add_text(version, 'manuscript-number', manuscript_number)
+        _add_text(version, 'manuscript-type', random.choice(
+            MANUSCRIPT_TYPES, p=MANUSCRIPT_TYPE_PROBABILITIES
+        ))
+        _add_list(version, 'referees', 'referee', [{
+            'referee-person-id': reviewer_id,
+            'referee-recommendation': 'Accept, no revision',
+            'referee-sequence': seq + 1
+        } for seq, reviewer_id in enumerate(reviewer_ids)])
+        _add_list(version, 'senior-editors', 'senior-editor', [{
+            'senior-editor-assigned-date': _format_timestamp(submission_timestamp),
+            'senior-editor-person-id': senior_editor_id
+        }])
+        # the "subject areas" of the XML are the research organisms, the themes the subject areas
+        _add_list(version, 'subject-areas', 'subject-area', [
+            {'subject-area': research_organism} for research_organism in research_organisms
+        ])
+        _add_text(version, 'submission-date', _format_timestamp(submission_timestamp))
+        _add_list(version, 'themes', 'theme', [
+            {'theme': subject_area} for subject_area in subject_areas
+        ])
+        _add_text(version, 'title', 'Title of %s version %d' % (manuscript_number, version_no))
+        _add_text(version, 'version-number', version_no)
+        person_ids.update(author_ids)
+        person_ids.update(reviewer_ids)
+        person_ids.update([editor_id, senior_editor_id])
+        submission_timestamp = decision_timestamp + int(random.randint(14, 120)) * DAY_SECONDS
+
+    people = SubElement(root, 'people')
+    for person_id in sorted(person_ids):
+        _add_person(people, person_id, seed=seed)
+    return root
+
+
+def write_xml_zip_files(
+        xml_dir: str, manuscript_count: int, person_pools: PersonPools, seed: int = 0,
+        manuscripts_per_zip: int = DEFAULT_MANUSCRIPTS_PER_ZIP) -> List[str]:
+    os.makedirs(xml_dir, exist_ok=True)
+    zip_filenames = []
+    chunks = list(iter_chunks(range(manuscript_count), manuscripts_per_zip))
+    for zip_index, manuscript_indices in enumerate(tqdm(chunks, leave=False)):
+        zip_filename = os.path.join(xml_dir, 'synthetic-%05d.zip' % zip_index)
+        with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for manuscript_index in manuscript_indices:
+                zip_file.writestr(
+                    '%s.xml' % get_manuscript_number(manuscript_index),
+                    tostring(generate_manuscript_xml_root(
+                        manuscript_index, person_pools, seed=seed
+                    ), encoding='UTF-8')
+                )
+        zip_filenames.append(zip_filename)
+    return zip_filenames
+
+
+def _write_csv(filename: str, rows: List[dict], fieldnames: List[str]):
+    with open(filename, 'w', newline='') as f:
+        f.write(DEFAULT_CSV_FILE_HEADER)
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_csv_files(
+        csv_dir: str, person_pools: PersonPools, seed: int = 0) -> List[str]:
+    """Writes the CSV exports of the editors (the valid emails), the editor roles and keywords
+    and the early career researchers."""
+    os.makedirs(csv_dir, exist_ok=True)
+    random = np.random.RandomState(seed)
+    editor_rows = [
+        (person_id, role)
+        for person_ids, role in [
+            (person_pools.editor_ids(), 'Reviewing Editor'),
+            (person_pools.senior_editor_ids(), 'Senior Editor')
+        ]
+        for person_id in person_ids
+    ]
+    editors_filename = os.path.join(csv_dir, EDITORS_CSV_PREFIX + '.csv')
+    _write_csv(editors_filename, [
+        {'person_id': person_id, 'email': '%s@example.org' % person_id}
+        for person_id, _ in editor_rows
+    ], ['person_id', 'email'])
+
+    editor_roles_filename = os.path.join(csv_dir, EDITOR_ROLES_AND_KEYWORDS_CSV_PREFIX + '.csv')
+    _write_csv(editor_roles_filename, [{
+        EditorRolesCsvColumns.PERSON_ID: person_id,
+        EditorRolesCsvColumns.FIRST_NAME: 'First %s' % person_id,
+        EditorRolesCsvColumns.LAST_NAME: 'Last %s' % person_id,
+        EditorRolesCsvColumns.EMAIL: '%s@example.org' % person_id,
+        EditorRolesCsvColumns.INSTITUTION: 'Institution %d' % random.randint(0, 2000),
+        EditorRolesCsvColumns.ROLE: role,
+        EditorRolesCsvColumns.SUBJECT_AREAS: ', '.join(
+            random.choice(SUBJECT_AREAS, random.randint(1, 3), replace=False)
+        ),
+        EditorRolesCsvColumns.KEYWORDS: ', '.join(_unique([
+            get_keyword(i)
+            for i in _zipf_choice(random, KEYWORD_VOCABULARY_SIZE, size=random.randint(3, 10))
+        ]))
+    } for person_id, role in editor_rows], EDITOR_ROLES_CSV_COLUMNS)
+
+    # a small fraction of the authors (with ORCIDs, used when enriching the data)
+    early_career_researcher_ids = sorted(set(
+        person_pools.author_id(i)
+        for i in random.randint(0, person_pools.author_count, person_pools.author_count // 20)
+    ))
+    early_career_researchers_filename = os.path.join(
+        csv_dir, EARLY_CAREER_RESEARCHERS_CSV_PREFIX + '.csv'
+    )
+    _write_csv(early_career_researchers_filename, [{
+        EarlyCareerResearchersCsvColumns.PERSON_ID: person_id,
+        EarlyCareerResearchersCsvColumns.FIRST_NAME: 'First %s' % person_id,
+        EarlyCareerResearchersCsvColumns.LAST_NAME: 'Last %s' % person_id,
+        EarlyCareerResearchersCsvColumns.ORCID: '0000-0002-%04d-%04d' % (
+            random.randint(0, 10000), random.randint(0, 10000)
+        ),
+        EarlyCareerResearchersCsvColumns.FIRST_SUBJECT_AREA: random.choice(SUBJECT_AREAS),
+        EarlyCareerResearchersCsvColumns.SECOND_SUBJECT_AREA: random.choice(SUBJECT_AREAS),
+        EarlyCareerResearchersCsvColumns.KEYWORDS: ''
+    } for person_id in early_career_researcher_ids], EARLY_CAREER_RESEARCHERS_CSV_COLUMNS)
+    return [editors_filename, editor_roles_filename, early_career_researchers_filename]
+
+
+def generate_dataset(
+        output_dir: str, manuscript_count: int, seed: int = 0,
+        manuscripts_per_zip: int = DEFAULT_MANUSCRIPTS_PER_ZIP) -> dict:
+    person_pools = PersonPools(manuscript_count)
+    LOGGER.info('generating %d manuscripts to: %s', manuscript_count, output_dir)
+    zip_filenames = write_xml_zip_files(
+        os.path.join(output_dir, XML_DIR_NAME), manuscript_count, person_pools, seed=seed,
+        manuscripts_per_zip=manuscripts_per_zip
+    )
+    csv_filenames = write_csv_files(os.path.join(output_dir, CSV_DIR_NAME), person_pools, seed=seed)
+    return {
+        'zip_filenames': zip_filenames,
+        'csv_filenames': csv_filenames,
+        'size': sum(os.path.getsize(filename) for filename in zip_filenames + csv_filenames)
+    }
+
+
+def main(argv: List[str] = None):
+    args = parse_args(argv)
+    start = time.time()
+    dataset = generate_dataset(
+        args.output_dir, args.manuscripts, seed=args.seed,
+        manuscripts_per_zip=args.manuscripts_per_zip
+    )
+    print('manuscripts: %d, zip files: %d, csv files: %d, size: %.1f MB, time: %.1fs' % (
+        args.manuscripts, len(dataset['zip_filenames']), len(dataset['csv_filenames']),
+        dataset['size'] / 1e6, time.time() - start
+    ))
+
+
+if __name__ == "__main__":
+    from peerscout.shared.logging_config import configure_logging
+    configure_logging('benchmark')
+
+    main()
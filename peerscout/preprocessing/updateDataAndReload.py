@@ -1,8 +1,19 @@
+import argparse
+import inspect
 import logging
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import List
 
 from importlib import import_module
 
+from ..shared.app_config import get_app_config
+from ..shared.query_instrumentation import collecting_query_stats
+
 from . import downloadFiles
+from .pipeline_runner import PipelineCheckpoint, PipelineStep, log_durations, run_pipeline
+from .preprocessingUtils import get_data_path
 
 LOGGER = logging.getLogger(__name__)
 
@@ -10,21 +21,51 @@ NAME = 'updateDataAndReload'
 
 _MODULE_PREFIX = __package__ + '.'
 
+DOWNLOAD_STEP_NAME = 'downloadFiles'
+
+# the steps (in the order they run without parallel workers) and the steps they depend on:
+# the CSV imports update the same persons and are run one after the other (following the
+# XML import), the CSV file of valid emails is converted independently
+DEPENDENCIES_BY_STEP_NAME = OrderedDict([
+    ('importDataToDatabase', []),
+    ('refresh_materialized_views', ['importDataToDatabase']),
+    ('convertEditorsCsv', []),
+    ('import_editor_roles_and_keywords_csv', ['importDataToDatabase']),
+    ('importEarlyCareerResearchersCsv', ['import_editor_roles_and_keywords_csv']),
+    ('enrichData', ['importEarlyCareerResearchersCsv']),
+    ('generateTextTokens', ['enrichData']),
+    ('generateLdaDocVec', ['generateTextTokens']),
+    ('generateDoc2Vec', ['generateTextTokens']),
+    ('reloadServer', [
+        'refresh_materialized_views', 'convertEditorsCsv', 'generateLdaDocVec', 'generateDoc2Vec'
+    ])
+])
+
 MODULE_NAMES = [
     _MODULE_PREFIX + name
-    for name in [
-        'importDataToDatabase',
-        'convertEditorsCsv',
-        'import_editor_roles_and_keywords_csv',
-        'importEarlyCareerResearchersCsv',
-        'enrichData',
-        'generateTextTokens',
-        'generateLdaDocVec',
-        'generateDoc2Vec',
-        'reloadServer'
-    ]
+    for name in DEPENDENCIES_BY_STEP_NAME.keys()
 ]
 
+CHECKPOINT_NAME = 'update-checkpoint.json'
+
+
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description="PeerScout, download and import updated data and reload the server"
+    )
+    parser.add_argument(
+        "--workers", type=int,
+        help=(
+            "Number of steps run in parallel (in separate processes),"
+            " defaults to update_workers in the pipeline section of the app config (1: serial)"
+        )
+    )
+    parser.add_argument(
+        "--no-resume", action="store_true",
+        help="Ignore the steps completed by a previously failed run and start again"
+    )
+    return parser.parse_args(argv)
+
 
 def load_modules(module_names):
     for module_name in module_names:
@@ -33,16 +74,56 @@ def load_modules(module_names):
         yield pkg
 
 
-def main():
+def run_module_main(module_name: str):
+    pkg = import_module(module_name)
     logger = logging.getLogger(NAME)
-    try:
-        if not downloadFiles.main():
-            logger.info("no files downloaded, skipping further processing")
-            return False
-        modules = load_modules(MODULE_NAMES)
-        for pkg in modules:
-            logger.info("running: %s", pkg.__name__)
+    # only populated if query instrumentation is enabled (see app-example.cfg)
+    with collecting_query_stats() as query_stats:
+        if inspect.signature(pkg.main).parameters:
+            # don't parse the command line arguments of the pipeline
+            pkg.main([])
+        else:
             pkg.main()
+    if query_stats.query_count:
+        query_stats.log_summary(pkg.__name__, logger=logger)
+
+
+def get_pipeline_steps() -> List[PipelineStep]:
+    return [
+        PipelineStep(
+            name, partial(run_module_main, _MODULE_PREFIX + name), depends_on=depends_on
+        )
+        for name, depends_on in DEPENDENCIES_BY_STEP_NAME.items()
+    ]
+
+
+def get_checkpoint_filename():
+    return get_data_path(CHECKPOINT_NAME)
+
+
+def main(argv: List[str] = None):
+    args = parse_args(argv)
+    logger = logging.getLogger(NAME)
+    try:
+        max_workers = args.workers
+        if max_workers is None:
+            max_workers = get_app_config().getint('pipeline', 'update_workers', fallback=1)
+        checkpoint = PipelineCheckpoint(get_checkpoint_filename())
+        if args.no_resume:
+            checkpoint.remove()
+        if checkpoint.is_completed(DOWNLOAD_STEP_NAME):
+            logger.info(
+                "resuming previous run (failed steps: %s)", checkpoint.failed_step_names
+            )
+        else:
+            start_time = time.time()
+            if not downloadFiles.main():
+                logger.info("no files downloaded, skipping further processing")
+                return False
+            checkpoint.mark_completed(DOWNLOAD_STEP_NAME, time.time() - start_time)
+        run_pipeline(get_pipeline_steps(), checkpoint=checkpoint, max_workers=max_workers)
+        log_durations(checkpoint.duration_by_completed_step_name, logger=logger)
+        checkpoint.remove()
         logger.info("done")
         return True
     except Exception as e:
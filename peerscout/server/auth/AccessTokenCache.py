@@ -0,0 +1,102 @@
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from peerscout.utils.threading import SingleFlight
+
+
+DEFAULT_TTL = 300
+DEFAULT_NEGATIVE_TTL = 30
+DEFAULT_MAX_SIZE = 10000
+
+
+def get_logger():
+    return logging.getLogger(__name__)
+
+
+def get_access_token_digest(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+
+
+def get_jwt_expiry(access_token: str) -> Optional[float]:
+    """Returns the (unverified) expiry timestamp of a JWT access token, if available.
+    Only used to limit how long we keep a verified token.
+    """
+    try:
+        payload = access_token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+
+class AccessTokenCache:
+    """Bounded cache of access token digest to the verified email (None if invalid).
+
+    Valid tokens are kept for up to ttl seconds (but not beyond the token expiry),
+    invalid tokens for negative_ttl seconds.
+    Concurrent verifications of the same token will only call verify_fn once.
+    """
+
+    def __init__(
+            self, ttl: float = DEFAULT_TTL, negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+            max_size: int = DEFAULT_MAX_SIZE, get_time: Callable[[], float] = time.time):
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._max_size = max_size
+        self._get_time = get_time
+        self._lock = threading.Lock()
+        self._entry_by_digest = OrderedDict()
+        self._single_flight = SingleFlight()
+
+    def __len__(self):
+        return len(self._entry_by_digest)
+
+    def _get_entry(self, digest):
+        with self._lock:
+            entry = self._entry_by_digest.get(digest)
+            if entry is None:
+                return None
+            _, expires_at = entry
+            if expires_at <= self._get_time():
+                del self._entry_by_digest[digest]
+                return None
+            self._entry_by_digest.move_to_end(digest)
+            return entry
+
+    def _put(self, digest, email, expires_at):
+        with self._lock:
+            self._entry_by_digest[digest] = (email, expires_at)
+            self._entry_by_digest.move_to_end(digest)
+            while len(self._entry_by_digest) > self._max_size:
+                self._entry_by_digest.popitem(last=False)
+
+    def _verify_and_put(self, digest, access_token, verify_fn):
+        email = verify_fn(access_token)
+        now = self._get_time()
+        if email:
+            expires_at = now + self._ttl
+            token_expiry = get_jwt_expiry(access_token)
+            if token_expiry is not None:
+                expires_at = min(expires_at, token_expiry)
+        else:
+            expires_at = now + self._negative_ttl
+        self._put(digest, email, expires_at)
+        return email
+
+    def get_or_verify(
+            self, access_token: str,
+            verify_fn: Callable[[str], Optional[str]]) -> Optional[str]:
+        digest = get_access_token_digest(access_token)
+        entry = self._get_entry(digest)
+        if entry is not None:
+            get_logger().debug('using cached access token verification')
+            return entry[0]
+        return self._single_flight(
+            digest, lambda: self._verify_and_put(digest, access_token, verify_fn)
+        )
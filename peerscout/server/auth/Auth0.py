@@ -9,23 +9,51 @@ def get_logger():
     return logging.getLogger(__name__)
 
 
+# the status codes of a rejected access token, other errors (e.g. rate limiting)
+# don't say anything about the validity of the access token (and shouldn't be cached)
+REJECTED_ACCESS_TOKEN_STATUS_CODES = {400, 401, 403}
+
+
+def is_rejected_access_token_error(e: requests.exceptions.HTTPError) -> bool:
+    return (
+        e.response is not None and
+        e.response.status_code in REJECTED_ACCESS_TOKEN_STATUS_CODES
+    )
+
+
 class Auth0:
-    def __init__(self, domain, is_valid_email=None):
+    def __init__(self, domain, is_valid_email=None, access_token_cache=None, base_url=None):
         self.domain = domain
         self.is_valid_email = is_valid_email or (lambda _: True)
+        self.access_token_cache = access_token_cache
+        self.base_url = base_url or 'https://{}'.format(domain)
 
     def get_user_info(self, access_code):
         response = requests.get(
-            'https://{}/userinfo/?access_token={}'.format(self.domain, access_code))
+            '{}/userinfo/?access_token={}'.format(self.base_url, access_code))
         response.raise_for_status()
         return json.loads(response.text)
 
-    def verify_access_token_and_get_email(self, access_token):
+    def _get_email_for_access_token(self, access_token):
         try:
             user_info = self.get_user_info(access_token)
-            email = user_info.get('email')
-            get_logger().info('email: %s', email)
-            return email
+        except requests.exceptions.HTTPError as e:
+            if not is_rejected_access_token_error(e):
+                raise
+            # the access token was rejected (rather than Auth0 being unavailable or rate limiting)
+            get_logger().debug('access token rejected: %s', e)
+            return None
+        email = user_info.get('email')
+        get_logger().info('email: %s', email)
+        return email
+
+    def verify_access_token_and_get_email(self, access_token):
+        try:
+            if self.access_token_cache is not None:
+                return self.access_token_cache.get_or_verify(
+                    access_token, self._get_email_for_access_token
+                )
+            return self._get_email_for_access_token(access_token)
         except Exception as e:  # pylint: disable=broad-except
             get_logger().debug('access token not valid: %s', e)
             return None
@@ -1,12 +1,17 @@
 import os
+import json
 import logging
-from functools import partial
+import time
+from functools import partial, wraps
 
-from flask import Blueprint, request, jsonify, url_for, Response
+from flask import Blueprint, g, request, jsonify, url_for, Response
 from joblib import Memory
 from werkzeug.exceptions import BadRequest, Forbidden, NotFound
 
 from peerscout.utils.collection import parse_list
+from peerscout.utils.metrics import MetricsRegistry
+from peerscout.utils.threading import SingleFlight
+from peerscout.utils.timing import collecting_timings, get_current_timing_collector, timing_span
 
 from ..config.search_config import parse_search_config, DEFAULT_SEARCH_TYPE
 
@@ -16,11 +21,20 @@ from ..services import (
     RecommendReviewers
 )
 
+from ..services.keyword_search import MAX_SEARCH_LIMIT as MAX_KEYWORD_SEARCH_LIMIT
+
 from ..auth.FlaskAuth0 import (
     FlaskAuth0,
     parse_allowed_ips
 )
 
+from ..auth.AccessTokenCache import (
+    AccessTokenCache,
+    DEFAULT_TTL as DEFAULT_ACCESS_TOKEN_CACHE_TTL,
+    DEFAULT_NEGATIVE_TTL as DEFAULT_ACCESS_TOKEN_CACHE_NEGATIVE_TTL,
+    DEFAULT_MAX_SIZE as DEFAULT_ACCESS_TOKEN_CACHE_MAX_SIZE
+)
+
 from ..auth.EmailValidator import (
     EmailValidator,
     parse_valid_domains,
@@ -28,22 +42,30 @@ from ..auth.EmailValidator import (
 )
 
 from ...shared.database import connect_configured_database, Database
+from ...shared.query_instrumentation import (
+    QueryStatsCollector,
+    set_current_query_stats_collector
+)
 
 LOGGER = logging.getLogger(__name__)
 
 DEFAULT_LIMIT = 50
 
+DEFAULT_KEYWORD_SEARCH_LIMIT = 10
+
 
 class ReloadableRecommendReviewers:
     def __init__(self, create_recommend_reviewer):
         self._create_recommend_reviewer = create_recommend_reviewer
         self._recommend_reviewer = create_recommend_reviewer()
+        self.generation = 0
 
     def __getattr__(self, name):
         return getattr(self._recommend_reviewer, name)
 
     def reload(self):
         self._recommend_reviewer = self._create_recommend_reviewer()
+        self.generation += 1
 
 
 class _ReloadableRecommendReviewers(ReloadableRecommendReviewers, RecommendReviewers):
@@ -82,6 +104,26 @@ def get_recommend_reviewer_factory(db, config):
     return load_recommender
 
 
+def create_access_token_cache(config):
+    ttl = config.getfloat(
+        'auth', 'access_token_cache_ttl_secs', fallback=DEFAULT_ACCESS_TOKEN_CACHE_TTL
+    )
+    if ttl <= 0:
+        LOGGER.info('access token cache disabled')
+        return None
+    return AccessTokenCache(
+        ttl=ttl,
+        negative_ttl=config.getfloat(
+            'auth', 'access_token_cache_negative_ttl_secs',
+            fallback=DEFAULT_ACCESS_TOKEN_CACHE_NEGATIVE_TTL
+        ),
+        max_size=config.getint(
+            'auth', 'access_token_cache_max_size',
+            fallback=DEFAULT_ACCESS_TOKEN_CACHE_MAX_SIZE
+        )
+    )
+
+
 class ApiAuth:
     def __init__(
             self, config, client_config, search_config=None, user_has_role_by_email=None,
@@ -103,7 +145,10 @@ class ApiAuth:
         if auth0_domain:
             LOGGER.info('using Auth0 domain %s', auth0_domain)
             LOGGER.info('allowed_ips: %s', allowed_ips)
-            self._flask_auth0 = FlaskAuth0(domain=auth0_domain, allowed_ips=allowed_ips)
+            self._flask_auth0 = FlaskAuth0(
+                domain=auth0_domain, allowed_ips=allowed_ips,
+                access_token_cache=create_access_token_cache(config)
+            )
         else:
             LOGGER.info('not enabling authentication, no Auth0 domain configured')
             self._flask_auth0 = None
@@ -167,7 +212,78 @@ class ApiAuth:
                 )
 
 
-def create_api_blueprint(config):
+def get_recommend_reviewers_request_key(generation: int, **kwargs) -> tuple:
+    return (generation, json.dumps(kwargs, sort_keys=True))
+
+
+def copy_response(response: Response) -> Response:
+    return Response(
+        response.get_data(), status=response.status_code, headers=response.headers
+    )
+
+
+def get_limit_arg(default_limit: int) -> int:
+    limit = request.args.get('limit')
+    if not limit:
+        return default_limit
+    try:
+        value = int(limit)
+    except ValueError as e:
+        raise BadRequest('invalid limit - %s' % limit) from e
+    if value < 1:
+        raise BadRequest('limit needs to be positive - %s' % limit)
+    return value
+
+
+def is_debug_timing_request() -> bool:
+    return request.args.get('debug_timing') == '1'
+
+
+def is_debug_timing_enabled(config) -> bool:
+    return config.getboolean('server', 'debug_timing_enabled', fallback=False)
+
+
+def create_timed_handler_decorator(config, metrics_registry: MetricsRegistry):
+    """Returns a decorator, collecting the stage timings of request handlers.
+
+    Timings are only collected if timing is enabled in the config (server.timing_enabled),
+    or for requests with "debug_timing=1" (if server.debug_timing_enabled).
+    Only the former are recorded in the metrics.
+    """
+    timing_enabled = config.getboolean('server', 'timing_enabled', fallback=False)
+    debug_timing_enabled = is_debug_timing_enabled(config)
+    request_duration_histogram = metrics_registry.histogram(
+        'peerscout_api_request_duration_seconds',
+        'Duration of API requests by endpoint',
+        label_name='endpoint'
+    )
+    stage_duration_histogram = metrics_registry.histogram(
+        'peerscout_api_stage_duration_seconds',
+        'Duration of processing stages within API requests (nested stages overlap)',
+        label_name='stage'
+    )
+
+    def timed_handler(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not timing_enabled and not (debug_timing_enabled and is_debug_timing_request()):
+                return f(*args, **kwargs)
+            start = time.perf_counter()
+            with collecting_timings() as timings:
+                response = f(*args, **kwargs)
+            if timing_enabled:
+                request_duration_histogram.observe(
+                    time.perf_counter() - start, request.endpoint
+                )
+                for stage, duration in timings.duration_by_stage.items():
+                    stage_duration_histogram.observe(duration, stage)
+            return response
+        return wrapper
+
+    return timed_handler
+
+
+def create_api_blueprint(config, metrics_registry: MetricsRegistry = None):
     blueprint = Blueprint('api', __name__)
 
     data_dir = os.path.abspath(config.get('data', 'data_root', fallback='.data'))
@@ -180,7 +296,11 @@ def create_api_blueprint(config):
     LOGGER.debug("cache directory: %s", cache_dir)
     memory.clear(warn=False)
 
-    db: Database = connect_configured_database(autocommit=True)
+    # the API only reads, using the read-only replica if configured
+    db: Database = connect_configured_database(autocommit=True, read_only=True)
+    query_instrumentation_enabled = config.getboolean(
+        'database', 'query_instrumentation_enabled', fallback=False
+    )
 
     load_recommender = get_recommend_reviewer_factory(db, config)
 
@@ -208,23 +328,67 @@ def create_api_blueprint(config):
                 'recommend-reviewers': url_for('api._recommend_reviewers_api'),
                 'subject-areas': url_for('api._subject_areas_api'),
                 'keywords': url_for('api._keywords_api'),
+                'keywords-search': url_for('api._keywords_search_api'),
                 'config': url_for('api._config_api')
             }
         })
 
+    def recommend_reviewers_result(**kwargs) -> dict:
+        with db.begin():
+            return recommend_reviewers.recommend(**kwargs)
+
     @memory.cache
     def recommend_reviewers_as_json(**kwargs) -> Response:
-        with db.begin():
-            return jsonify(recommend_reviewers.recommend(**kwargs))
+        result = recommend_reviewers_result(**kwargs)
+        with timing_span('json_encode'):
+            return jsonify(result)
+
+    if metrics_registry is None:
+        metrics_registry = MetricsRegistry()
+    coalesced_requests_counter = metrics_registry.counter(
+        'peerscout_recommend_reviewers_coalesced_requests_total',
+        'Number of recommend reviewers requests that waited for an identical in-flight request'
+    )
+    recommend_reviewers_single_flight = SingleFlight(
+        on_coalesced=coalesced_requests_counter.inc
+    )
+    timed_handler = create_timed_handler_decorator(config, metrics_registry)
+
+    def coalesced_recommend_reviewers_as_json(**kwargs) -> Response:
+        # concurrent identical requests (before the result is cached) share one computation
+        key = get_recommend_reviewers_request_key(recommend_reviewers.generation, **kwargs)
+        response = recommend_reviewers_single_flight(
+            key, partial(recommend_reviewers_as_json, **kwargs)
+        )
+        # the response may be shared with other requests, each request gets its own copy
+        return copy_response(response)
+
+    debug_timing_enabled = is_debug_timing_enabled(config)
+
+    def is_allowed_debug_timing_request(email: str = None) -> bool:
+        # the debug timing bypasses the cache, it is only available to staff (if authenticated)
+        return (
+            debug_timing_enabled and
+            is_debug_timing_request() and
+            (email is None or api_auth.is_staff_email(email))
+        )
+
+    def debug_timing_recommend_reviewers_as_json(**kwargs) -> Response:
+        # bypassing the cache, in order to time the actual computation
+        result = recommend_reviewers_result(**kwargs)
+        return jsonify({
+            **result,
+            'debug_timing': get_current_timing_collector().duration_by_stage
+        })
 
     @blueprint.route("/recommend-reviewers")
+    @timed_handler
     @api_auth.wrap_search
-    def _recommend_reviewers_api(**_) -> Response:
+    def _recommend_reviewers_api(email=None, **_) -> Response:
         manuscript_no = request.args.get('manuscript_no')
         subject_area = request.args.get('subject_area')
         keywords = request.args.get('keywords')
         abstract = request.args.get('abstract')
-        limit = request.args.get('limit')
 
         search_type = get_search_type()
         search_params = search_config.get(search_type)
@@ -234,13 +398,14 @@ def create_api_blueprint(config):
         recommend_relationship_types = search_params.get('recommend_relationship_types')
         recommend_stage_names = search_params.get('recommend_stage_names')
 
-        if limit is None:
-            limit = search_params.get('default_limit', DEFAULT_LIMIT)
-        else:
-            limit = int(limit)
+        limit = get_limit_arg(search_params.get('default_limit', DEFAULT_LIMIT))
         if not manuscript_no and keywords is None:
             raise BadRequest('keywords parameter required')
-        return recommend_reviewers_as_json(
+        return (
+            debug_timing_recommend_reviewers_as_json
+            if is_allowed_debug_timing_request(email)
+            else coalesced_recommend_reviewers_as_json
+        )(
             manuscript_no=manuscript_no,
             subject_area=subject_area,
             keywords=keywords,
@@ -252,6 +417,7 @@ def create_api_blueprint(config):
         )
 
     @blueprint.route("/manuscript/version/<path:version_id>")
+    @timed_handler
     @api_auth
     def _get_manuscript_details(version_id, **_) -> Response:
         manuscript_details = recommend_reviewers.get_manuscript_details(version_id)
@@ -260,20 +426,31 @@ def create_api_blueprint(config):
         return jsonify(manuscript_details)
 
     @blueprint.route("/subject-areas")
+    @timed_handler
     def _subject_areas_api() -> Response:
         with db.begin():
             return jsonify(list(recommend_reviewers.get_all_subject_areas()))
 
     @blueprint.route("/keywords")
+    @timed_handler
     def _keywords_api() -> Response:
         with db.begin():
             return jsonify(list(recommend_reviewers.get_all_keywords()))
 
+    @blueprint.route("/keywords/search")
+    @timed_handler
+    def _keywords_search_api() -> Response:
+        prefix = request.args.get('prefix', '')
+        # limits up to the maximum are served from the precomputed suggestions
+        limit = min(get_limit_arg(DEFAULT_KEYWORD_SEARCH_LIMIT), MAX_KEYWORD_SEARCH_LIMIT)
+        return jsonify(list(recommend_reviewers.search_keywords(prefix, limit=limit)))
+
     @blueprint.route("/config")
     def _config_api() -> Response:
         return jsonify(client_config)
 
     @blueprint.route("/search-types")
+    @timed_handler
     @api_auth
     def _search_types_api(email=None) -> Response:
         with db.begin():
@@ -300,6 +477,21 @@ def create_api_blueprint(config):
             ]
             return jsonify(search_types_response)
 
+    if query_instrumentation_enabled:
+        @blueprint.before_request
+        def _start_collecting_query_stats():
+            g.query_stats = QueryStatsCollector()
+            g.previous_query_stats_collector = set_current_query_stats_collector(g.query_stats)
+
+        @blueprint.teardown_request
+        def _stop_collecting_query_stats(exc=None):  # pylint: disable=unused-argument
+            query_stats = g.pop('query_stats', None)
+            if query_stats is None:
+                return
+            set_current_query_stats_collector(g.pop('previous_query_stats_collector', None))
+            if query_stats.query_count:
+                query_stats.log_summary('%s %s' % (request.method, request.path))
+
     @blueprint.teardown_request
     def _remove_session(exc=None):
         try:
@@ -2,14 +2,22 @@ import logging
 
 from flask import Blueprint, jsonify, Response
 
+from peerscout.utils.metrics import MetricsRegistry
+
 from ..auth.FlaskAuth0 import get_remote_ip
 
 LOGGER = logging.getLogger(__name__)
 
 
-def create_control_blueprint(reload_fn):
+PROMETHEUS_TEXT_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def create_control_blueprint(reload_fn, metrics_registry: MetricsRegistry = None):
     blueprint = Blueprint('control', __name__)
 
+    if metrics_registry is None:
+        metrics_registry = MetricsRegistry()
+
     @blueprint.route("/reload", methods=['POST'])
     def _control_reload() -> Response:
         remote_ip = get_remote_ip()
@@ -19,4 +27,11 @@ def create_control_blueprint(reload_fn):
         reload_fn()
         return jsonify({'status': 'OK'})
 
+    @blueprint.route("/metrics")
+    def _control_metrics() -> Response:
+        return Response(
+            metrics_registry.to_prometheus_text(),
+            content_type=PROMETHEUS_TEXT_CONTENT_TYPE
+        )
+
     return blueprint
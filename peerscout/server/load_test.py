@@ -0,0 +1,141 @@
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+import requests
+
+from peerscout.utils.collection import parse_list
+from peerscout.utils.threading import lazy_thread_local
+
+LOGGER = logging.getLogger(__name__)
+
+# "{i}" is replaced by a request counter, to avoid hitting the result cache
+DEFAULT_PATH = '/api/recommend-reviewers?keywords=neuroscience&limit={i}'
+
+
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description=(
+            "PeerScout, local server load test"
+            " (starts the server with the configured database for each number of workers)"
+        )
+    )
+    parser.add_argument(
+        "--workers", default=','.join(str(2 ** i) for i in range(4)),
+        help="Comma separated list of worker counts to test"
+    )
+    parser.add_argument(
+        "--port", type=int, default=8090,
+        help="Port to start the server on"
+    )
+    parser.add_argument(
+        "--path", default=DEFAULT_PATH,
+        help="Path (including query string) to request, {i} is replaced by a request counter"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=200,
+        help="Number of requests per run"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=os.cpu_count() * 2,
+        help="Number of concurrent client connections"
+    )
+    parser.add_argument(
+        "--startup-timeout", type=float, default=600,
+        help="Seconds to wait for the server (and model) to start"
+    )
+    return parser.parse_args(argv)
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    return subprocess.Popen([
+        sys.executable, '-m', 'peerscout.server',
+        '--workers', str(workers),
+        '--port', str(port)
+    ])
+
+
+def stop_server(process: subprocess.Popen):
+    process.send_signal(signal.SIGTERM)
+    process.wait()
+
+
+def wait_for_server(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited with %s' % process.returncode)
+        try:
+            requests.get(url, timeout=timeout).raise_for_status()
+            return
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.5)
+    raise RuntimeError('server did not start within %s seconds' % timeout)
+
+
+def run_requests(
+        url: str, request_count: int, concurrency: int, counter_offset: int = 0) -> dict:
+
+    get_session = lazy_thread_local(requests.Session)
+
+    def timed_request(i):
+        start = time.time()
+        get_session().get(url.replace('{i}', str(counter_offset + i + 1))).raise_for_status()
+        return time.time() - start
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        durations = list(executor.map(timed_request, range(request_count)))
+    total_duration = time.time() - start
+    return {
+        'requests_per_second': request_count / total_duration,
+        'latency_p50': float(np.percentile(durations, 50)),
+        'latency_p95': float(np.percentile(durations, 95))
+    }
+
+
+def main(argv: List[str] = None):
+    args = parse_args(argv)
+    base_url = 'http://127.0.0.1:%d' % args.port
+    url = base_url + args.path
+    results = []
+    counter_offset = 0
+    for workers in [int(s) for s in parse_list(args.workers)]:
+        LOGGER.info('starting server with %d workers', workers)
+        process = start_server(workers, args.port)
+        try:
+            wait_for_server(base_url + '/api/', process, timeout=args.startup_timeout)
+            run_requests(url, workers, concurrency=workers, counter_offset=counter_offset)
+            counter_offset += workers
+            result = run_requests(
+                url, args.requests, concurrency=args.concurrency, counter_offset=counter_offset
+            )
+            counter_offset += args.requests
+            LOGGER.info('workers=%d: %s', workers, result)
+            results.append((workers, result))
+        finally:
+            stop_server(process)
+
+    print('cpu count: %d, requests: %d, concurrency: %d' % (
+        os.cpu_count(), args.requests, args.concurrency
+    ))
+    print('%8s %10s %10s %10s' % ('workers', 'req/s', 'p50 (s)', 'p95 (s)'))
+    for workers, result in results:
+        print('%8d %10.1f %10.3f %10.3f' % (
+            workers, result['requests_per_second'],
+            result['latency_p50'], result['latency_p95']
+        ))
+
+
+if __name__ == "__main__":
+    from ..shared.logging_config import configure_logging
+    configure_logging('load-test')
+
+    main()
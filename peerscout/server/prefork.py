@@ -0,0 +1,175 @@
+import gc
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Callable, Set
+
+from werkzeug.serving import make_server
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 0.5
+DEFAULT_STOP_TIMEOUT = 30
+
+
+def freeze_gc():
+    """Collects garbage and moves remaining objects to the permanent generation.
+
+    Objects in the permanent generation are ignored by the garbage collector,
+    which would otherwise write to (and therefore copy) the shared pages in forked workers.
+    gc.freeze is only available from Python 3.7 onwards.
+    """
+    gc.collect()
+    freeze = getattr(gc, 'freeze', None)
+    if freeze is not None:
+        freeze()
+        LOGGER.debug('frozen objects: %d', gc.get_freeze_count())
+
+
+def request_master_reload():
+    os.kill(os.getppid(), signal.SIGHUP)
+
+
+class PreforkServer:  # pylint: disable=too-many-instance-attributes
+    """Serves a WSGI app using workers forked from the master process.
+
+    The app (including the loaded model) is created once in the master and shared with
+    the workers copy-on-write. All workers accept connections from the same listening socket.
+
+    Signals sent to the master:
+      SIGHUP: reload via reload_fn in the master, then replace the workers
+      SIGTERM / SIGINT: stop the workers and exit
+
+    Workers finish the request they are currently handling before exiting.
+    """
+
+    def __init__(
+            self, app, host: str, port: int, workers: int,
+            reload_fn: Callable[[], None] = None,
+            poll_interval: float = DEFAULT_POLL_INTERVAL,
+            stop_timeout: float = DEFAULT_STOP_TIMEOUT):
+        self._server = make_server(host, port, app)
+        # non-blocking accept, workers that lost the race for a connection won't block
+        self._server.socket.setblocking(False)
+        self._workers = workers
+        self._reload_fn = reload_fn
+        self._poll_interval = poll_interval
+        self._stop_timeout = stop_timeout
+        self._worker_pids: Set[int] = set()
+        self._stopping_worker_pids: Set[int] = set()
+        self._pending_signals = []
+        self._running = False
+
+    @property
+    def server_address(self):
+        return self._server.server_address
+
+    def _on_master_signal(self, signum, _):
+        self._pending_signals.append(signum)
+
+    def _run_worker(self):
+        def shutdown(*_):
+            threading.Thread(target=self._server.shutdown).start()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        LOGGER.info('worker started: %d', os.getpid())
+        self._server.serve_forever()
+        LOGGER.info('worker stopped: %d', os.getpid())
+
+    def _spawn_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                self._run_worker()
+            except Exception as e:  # pylint: disable=W0703
+                LOGGER.exception('worker failed: %s', e)
+                exit_code = 1
+            finally:
+                os._exit(exit_code)  # pylint: disable=W0212
+        self._worker_pids.add(pid)
+
+    def _spawn_workers(self):
+        freeze_gc()
+        for _ in range(self._workers):
+            self._spawn_worker()
+        LOGGER.info('workers: %s', sorted(self._worker_pids))
+
+    def _stop_workers(self, pids):
+        for pid in pids:
+            self._worker_pids.discard(pid)
+            self._stopping_worker_pids.add(pid)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _reap_workers(self):
+        while self._worker_pids or self._stopping_worker_pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self._worker_pids.clear()
+                self._stopping_worker_pids.clear()
+                return
+            if not pid:
+                return
+            if pid in self._stopping_worker_pids:
+                self._stopping_worker_pids.discard(pid)
+            elif pid in self._worker_pids:
+                self._worker_pids.discard(pid)
+                LOGGER.warning('worker %d exited unexpectedly (status=%d)', pid, status)
+                if self._running:
+                    self._spawn_worker()
+
+    def _wait_for_stopping_workers(self):
+        deadline = time.time() + self._stop_timeout
+        while self._stopping_worker_pids and time.time() < deadline:
+            self._reap_workers()
+            time.sleep(self._poll_interval)
+        for pid in self._stopping_worker_pids:
+            LOGGER.warning('worker %d did not stop in time, killing it', pid)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self._stopping_worker_pids.clear()
+
+    def reload(self):
+        LOGGER.info('reloading')
+        previous_worker_pids = set(self._worker_pids)
+        if self._reload_fn is not None:
+            self._reload_fn()
+        self._spawn_workers()
+        self._stop_workers(previous_worker_pids)
+        LOGGER.info('reloaded, stopping previous workers: %s', sorted(previous_worker_pids))
+
+    def _handle_pending_signals(self):
+        while self._pending_signals:
+            signum = self._pending_signals.pop(0)
+            if signum == signal.SIGHUP:
+                self.reload()
+            else:
+                LOGGER.info('received signal %d, stopping', signum)
+                self._running = False
+
+    def serve_forever(self):
+        signal.signal(signal.SIGHUP, self._on_master_signal)
+        signal.signal(signal.SIGTERM, self._on_master_signal)
+        signal.signal(signal.SIGINT, self._on_master_signal)
+        self._running = True
+        LOGGER.info('serving on %s with %d workers', self.server_address, self._workers)
+        try:
+            self._spawn_workers()
+            while self._running:
+                self._handle_pending_signals()
+                self._reap_workers()
+                time.sleep(self._poll_interval)
+        finally:
+            self._running = False
+            self._stop_workers(set(self._worker_pids))
+            self._wait_for_stopping_workers()
+            self._server.server_close()
+        LOGGER.info('stopped')
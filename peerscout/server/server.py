@@ -1,9 +1,12 @@
+import argparse
 import logging
+from typing import List
 
 from flask import Flask
 from flask_cors import CORS
 
 from peerscout.utils.json import CustomJSONEncoder
+from peerscout.utils.metrics import MetricsRegistry
 
 from ..shared.app_config import get_app_config
 from ..shared.logging_config import configure_logging
@@ -11,25 +14,34 @@ from ..shared.logging_config import configure_logging
 from .blueprints.api import create_api_blueprint
 from .blueprints.control import create_control_blueprint
 from .blueprints.client import create_client_blueprint
+from .prefork import PreforkServer, request_master_reload
 
 LOGGER = logging.getLogger(__name__)
 
 
-def create_app(config):
+def create_app_and_reload_fn(config, control_reload_fn=None):
     app = Flask(__name__)
     app.json_encoder = CustomJSONEncoder
     CORS(app)
 
-    api, reload_api = create_api_blueprint(config)
+    metrics_registry = MetricsRegistry()
+
+    api, reload_api = create_api_blueprint(config, metrics_registry=metrics_registry)
     app.register_blueprint(api, url_prefix='/api')
 
     control = create_control_blueprint(
-        reload_fn=reload_api
+        reload_fn=control_reload_fn or reload_api,
+        metrics_registry=metrics_registry
     )
     app.register_blueprint(control, url_prefix='/control')
 
     app.register_blueprint(create_client_blueprint())
 
+    return app, reload_api
+
+
+def create_app(config):
+    app, _ = create_app_and_reload_fn(config)
     return app
 
 
@@ -38,12 +50,46 @@ def initialize_logging():
     logging.getLogger('summa.preprocessing.cleaner').setLevel(logging.WARNING)
 
 
-def main():
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description="PeerScout, server"
+    )
+    parser.add_argument(
+        "--port", type=int,
+        help="Port to listen on (overrides server.port)"
+    )
+    parser.add_argument(
+        "--workers", type=int,
+        help=(
+            "Number of pre-forked worker processes (overrides server.workers)"
+            ", 0 to use a single threaded process"
+        )
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None):
+    args = parse_args(argv)
     config = get_app_config()
-    port = config.get('server', 'port', fallback=8080)
+    port = args.port or config.getint('server', 'port', fallback=8080)
     host = config.get('server', 'host', fallback=None)
-    app = create_app(config)
-    app.run(port=port, host=host, threaded=True)
+    workers = (
+        args.workers
+        if args.workers is not None
+        else config.getint('server', 'workers', fallback=0)
+    )
+    if workers > 0:
+        # the model is loaded once in the master process and shared with the workers,
+        # a reload request received by a worker is forwarded to the master
+        app, reload_fn = create_app_and_reload_fn(
+            config, control_reload_fn=request_master_reload
+        )
+        PreforkServer(
+            app, host=host or '127.0.0.1', port=port, workers=workers, reload_fn=reload_fn
+        ).serve_forever()
+    else:
+        app = create_app(config)
+        app.run(port=port, host=host, threaded=True)
 
 
 if __name__ == "__main__":
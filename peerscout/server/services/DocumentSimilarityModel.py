@@ -6,6 +6,8 @@ import numpy as np
 import pandas as pd
 from sklearn.metrics.pairwise import cosine_similarity
 
+from peerscout.utils.timing import timing_span
+
 from .utils import filter_by
 
 NAME = 'DocumentSimilarityModel'
@@ -38,7 +40,17 @@ def load_docvecs(db, manuscript_model, column_name):
     return abstract_docvecs_all_df, abstract_docvecs_df
 
 
-class DocumentSimilarityModel:
+def to_docvec_matrix(docvecs_df, version_ids):
+    if len(version_ids) == 0:
+        return np.zeros((0, 0))
+    return np.ascontiguousarray(np.array(
+        docvecs_df.set_index(VERSION_ID)[ABSTRACT_DOCVEC_COLUMN]
+        .loc[version_ids].values.tolist(),
+        dtype=np.float64
+    ))
+
+
+class DocumentSimilarityModel:  # pylint: disable=too-many-instance-attributes
     def __init__(
             self, db, manuscript_model,
             lda_docvec_predict_model=None, doc2vec_docvec_predict_model=None):
@@ -53,6 +65,23 @@ class DocumentSimilarityModel:
             load_docvecs(db, manuscript_model, 'doc2vec_docvec')
         )
 
+        # the docvecs of manuscripts we compare against are kept in contiguous float arrays,
+        # rather than python objects, which requests would otherwise touch (e.g. ref counts),
+        # causing copy-on-write in forked server workers
+        self._similarity_version_ids = np.array(sorted(
+            set(self.abstract_lda_docvecs_df[VERSION_ID].values) &
+            set(self.abstract_doc2vec_df[VERSION_ID].values)
+        ), dtype=object)
+        self._row_index_by_version_id = {
+            version_id: i for i, version_id in enumerate(self._similarity_version_ids)
+        }
+        self._lda_docvec_matrix = to_docvec_matrix(
+            self.abstract_lda_docvecs_df, self._similarity_version_ids
+        )
+        self._doc2vec_docvec_matrix = to_docvec_matrix(
+            self.abstract_doc2vec_df, self._similarity_version_ids
+        )
+
     def __empty_similarity_result(self):
         return pd.DataFrame({
             VERSION_ID: [],
@@ -65,46 +94,34 @@ class DocumentSimilarityModel:
         logger = logging.getLogger(NAME)
         if len(to_lda_docvecs) == 0 or len(to_doc2vec) != len(to_lda_docvecs):
             return self.__empty_similarity_result()
-        version_ids = (
-            set(self.abstract_lda_docvecs_df[VERSION_ID].values) &
-            set(self.abstract_doc2vec_df[VERSION_ID].values)
-        )
+        mask = np.ones(len(self._similarity_version_ids), dtype=bool)
         if exclude_version_ids is not None:
-            version_ids = version_ids - set(exclude_version_ids)
-        version_ids = list(version_ids)
-        other_lda_docvecs = np.array(
-            self.abstract_lda_docvecs_df.set_index(VERSION_ID)[ABSTRACT_DOCVEC_COLUMN]
-            .loc[version_ids].values.tolist()
-        )
-        other_doc2vec_docvecs = np.array(
-            self.abstract_doc2vec_df.set_index(VERSION_ID)[ABSTRACT_DOCVEC_COLUMN]
-            .loc[version_ids].values.tolist()
-        )
+            mask[[
+                self._row_index_by_version_id[version_id]
+                for version_id in exclude_version_ids
+                if version_id in self._row_index_by_version_id
+            ]] = False
+        if not mask.any():
+            return self.__empty_similarity_result()
         to_lda_docvecs = np.array(to_lda_docvecs)
         to_doc2vec = np.array(to_doc2vec)
-        lda_similarity = cosine_similarity(
-            other_lda_docvecs,
-            to_lda_docvecs
-        )[:, 0].reshape(-1)
-        doc2vec_similarity = cosine_similarity(
-            other_doc2vec_docvecs,
-            to_doc2vec
-        )[:, 0].reshape(-1)
+        with timing_span('cosine_similarity'):
+            lda_similarity = cosine_similarity(
+                self._lda_docvec_matrix[mask],
+                to_lda_docvecs
+            )[:, 0].reshape(-1)
+            doc2vec_similarity = cosine_similarity(
+                self._doc2vec_docvec_matrix[mask],
+                to_doc2vec
+            )[:, 0].reshape(-1)
         logger.debug("lda_similarity: %s", lda_similarity.shape)
         logger.debug("doc2vec_similarity: %s", doc2vec_similarity.shape)
         combined_similarity = (lda_similarity + doc2vec_similarity) / 2
         logger.debug("combined_similarity: %s", combined_similarity.shape)
-        similarity = pd.DataFrame({
-            VERSION_ID: version_ids,
+        return pd.DataFrame({
+            VERSION_ID: self._similarity_version_ids[mask],
             SIMILARITY_COLUMN: combined_similarity
         })
-        if exclude_version_ids is not None:
-            similarity = similarity[
-                ~similarity[VERSION_ID].isin(
-                    exclude_version_ids
-                )
-            ]
-        return similarity
 
     def is_incomplete_model(self):
         return (
@@ -115,16 +132,19 @@ class DocumentSimilarityModel:
     def find_similar_manuscripts_to_abstract(self, abstract):
         if self.is_incomplete_model():
             return self.__empty_similarity_result()
-        to_lda_docvecs = (
-            self.lda_docvec_predict_model.transform([abstract])
-            if self.lda_docvec_predict_model is not None
-            else []
-        )
-        to_doc2vec_docvecs = (
-            self.doc2vec_docvec_predict_model.transform([abstract])
-            if self.doc2vec_docvec_predict_model is not None
-            else []
-        )
+        # includes the text preprocessing (e.g. spaCy)
+        with timing_span('abstract_lda_inference'):
+            to_lda_docvecs = (
+                self.lda_docvec_predict_model.transform([abstract])
+                if self.lda_docvec_predict_model is not None
+                else []
+            )
+        with timing_span('abstract_doc2vec_inference'):
+            to_doc2vec_docvecs = (
+                self.doc2vec_docvec_predict_model.transform([abstract])
+                if self.doc2vec_docvec_predict_model is not None
+                else []
+            )
         logging.getLogger(NAME).debug("abstract docvec: %s, %s", to_lda_docvecs, abstract)
         return self.__find_similar_manuscripts_to_docvecs(to_lda_docvecs, to_doc2vec_docvecs)
 
@@ -1,3 +1,4 @@
+from datetime import datetime
 from itertools import groupby
 import itertools
 import logging
@@ -21,9 +22,11 @@ from peerscout.utils.collection import (
 
 from peerscout.shared.database_types import PersonId, VersionId
 from peerscout.utils.html import unescape_and_strip_tags
+from peerscout.utils.timing import timed, timing_span
 
 from .utils import filter_by
 
+from .keyword_search import KeywordSearchIndex, merge_keyword_counts
 from .manuscript_keywords import ManuscriptKeywordService
 from .manuscript_subject_areas import ManuscriptSubjectAreaService
 
@@ -158,6 +161,16 @@ PERSON_COLUMNS = [
     'is_early_career_researcher'
 ]
 
+MANUSCRIPT_VERSION_COLUMNS = MANUSCRIPT_ID_COLUMNS + [MANUSCRIPT_ID] + [
+    'title', 'decision', 'manuscript_type', 'abstract',
+    'decision_timestamp', 'created_timestamp', 'is_published'
+]
+
+PERSON_STATS_COLUMNS = [
+    'reviewed_count', 'reviewed_duration_min', 'reviewed_duration_max', 'reviewed_duration_avg',
+    'awaiting_review_count', 'awaiting_accept_count', 'declined_count'
+]
+
 RELATED_MANUSCRIPT_FIELDS = {
     'manuscript_id', 'version_id', 'doi', 'is_published', 'title', 'abstract', 'subject_areas'
 }
@@ -170,7 +183,7 @@ def unescape_if_string(s):
 
 
 def stats_by_person_for_period(table):
-    df = table.read_frame()
+    df = table.read_frame(columns=PERSON_STATS_COLUMNS)
     debugv("person stats frame (%s):\n%s", table.table.__tablename__, df)
     if len(df) == 0:
         return {}
@@ -301,7 +314,9 @@ class RecommendReviewers:  # pylint: disable=too-many-instance-attributes
 
         logger.debug('filter_by_subject_area_enabled: %s', filter_by_subject_area_enabled)
 
-        self.manuscript_versions_all_df = db.manuscript_version.read_frame().reset_index()
+        self.manuscript_versions_all_df = db.manuscript_version.read_frame(
+            columns=MANUSCRIPT_VERSION_COLUMNS
+        ).reset_index()
 
         valid_version_ids = manuscript_model.get_valid_manuscript_version_ids()
 
@@ -333,46 +348,52 @@ class RecommendReviewers:  # pylint: disable=too-many-instance-attributes
         logger.debug('loading other manuscript related data')
 
         self.authors_all_df = (
-            db.manuscript_author.read_frame().reset_index()
+            db.manuscript_author.read_frame(
+                columns=[VERSION_ID, PERSON_ID, 'seq', 'is_corresponding_author']
+            ).reset_index()
         )
 
         self.editors_all_df = (
-            db.manuscript_editor.read_frame().reset_index()
+            db.manuscript_editor.read_frame(
+                columns=[VERSION_ID, PERSON_ID], preserve_dtypes=True
+            ).reset_index()
         )
 
         self.senior_editors_all_df = (
-            db.manuscript_senior_editor.read_frame().reset_index()
+            db.manuscript_senior_editor.read_frame(
+                columns=[VERSION_ID, PERSON_ID], preserve_dtypes=True
+            ).reset_index()
         )
 
-        self.manuscript_history_all_df = (
-            db.manuscript_stage.read_frame().reset_index()
-        )
-
-        self.manuscript_history_df = filter_by(
-            self.manuscript_history_all_df,
+        self.manuscript_history_review_received_df = filter_by(
+            db.manuscript_stage.read_frame(
+                columns=[VERSION_ID, PERSON_ID],
+                where=db.manuscript_stage.table.stage_name == 'Review Received',
+                preserve_dtypes=True
+            ).reset_index(),
             VERSION_ID,
             valid_version_ids
         )
 
-        manuscripts_df = db.manuscript.read_frame().reset_index()
-
-        self.persons_df = db.person.read_frame().reset_index()
-
-        memberships_df = db.person_membership.read_frame()
+        manuscripts_df = db.manuscript.read_frame(columns=[MANUSCRIPT_ID, 'doi']).reset_index()
 
-        dates_not_available_df = db.person_dates_not_available.read_frame().reset_index()
+        self.persons_df = db.person.read_frame(
+            columns=PERSON_COLUMNS, preserve_dtypes=True
+        ).reset_index()
 
-        dates_not_available_df = dates_not_available_df[
-            dates_not_available_df['end_date'] >= pd.to_datetime('today')
-        ]
-
-        self.manuscript_history_review_received_df = filter_by(
-            self.manuscript_history_df,
-            'stage_name',
-            ['Review Received']
+        memberships_df = db.person_membership.read_frame(
+            columns=[PERSON_ID, 'member_type', 'member_id'], preserve_dtypes=True
         )
 
-        self.assigned_reviewers_df = db.manuscript_potential_reviewer.read_frame().reset_index()
+        dates_not_available_df = db.person_dates_not_available.read_frame(
+            columns=[PERSON_ID, 'start_date', 'end_date'],
+            where=db.person_dates_not_available.table.end_date >= datetime.now()
+        ).reset_index()
+
+        self.assigned_reviewers_df = db.manuscript_potential_reviewer.read_frame(
+            columns=[VERSION_ID, PERSON_ID, 'status', 'suggested_to_exclude'],
+            preserve_dtypes=True
+        ).reset_index()
 
         temp_memberships_map = groupby_column_to_dict(memberships_df, PERSON_ID)
         dates_not_available_map = groupby_column_to_dict(dates_not_available_df, PERSON_ID)
@@ -436,7 +457,7 @@ class RecommendReviewers:  # pylint: disable=too-many-instance-attributes
             VERSION_ID,
             lambda row: {
                 PERSON_ID: row[PERSON_ID],
-                'status': row['status'],
+                'status': null_to_none(row['status']),
                 'excluded': row['suggested_to_exclude'] == 'yes'
             }
         )
@@ -464,16 +485,15 @@ class RecommendReviewers:  # pylint: disable=too-many-instance-attributes
             self.person_keyword_service.get_all_keywords()
         )
 
+        logger.debug("building keyword search index")
+        self.keyword_search_index = KeywordSearchIndex(merge_keyword_counts([
+            self.manuscript_keyword_service.get_keyword_counts(),
+            self.person_keyword_service.get_keyword_counts()
+        ]))
+
         logger.debug("building manuscript list")
         manuscripts_all_list = clean_result(
-            self.manuscript_versions_all_df[
-                MANUSCRIPT_ID_COLUMNS +
-                [MANUSCRIPT_ID] +
-                [
-                    'title', 'decision', 'manuscript_type', 'abstract',
-                    'decision_timestamp', 'created_timestamp', 'is_published'
-                ]
-            ]
+            self.manuscript_versions_all_df[MANUSCRIPT_VERSION_COLUMNS]
             .to_dict(orient='records')
         )
         manuscripts_all_list = [
@@ -564,12 +584,16 @@ class RecommendReviewers:  # pylint: disable=too-many-instance-attributes
     def get_all_keywords(self):
         return self.all_keywords
 
+    def search_keywords(self, prefix, limit=None):
+        return self.keyword_search_index.search(prefix, limit=limit)
+
     def user_has_role_by_email(self, email, role):
         return self.person_role_service.user_has_role_by_email(email=email, role=role)
 
     def get_user_roles_by_email(self, email):
         return self.person_role_service.get_user_roles_by_email(email=email)
 
+    @timed('recommend')
     def recommend(
             self, manuscript_no=None, subject_area=None, keywords=None, abstract=None,
             **kwargs):
@@ -702,6 +726,7 @@ class RecommendReviewers:  # pylint: disable=too-many-instance-attributes
             }
         return d
 
+    @timed('populate_related_manuscripts')
     def _populate_related_manuscript_by_version_id(
             self,
             version_ids: Iterable[VersionId],
@@ -787,6 +812,7 @@ class RecommendReviewers:  # pylint: disable=too-many-instance-attributes
             for person_id in person_ids
         )
 
+    @timed('find_manuscripts_by_keywords')
     def _find_manuscript_ids_by_subject_areas_and_keywords_with_keyword_scores(
             self, subject_areas, keyword_list):
 
@@ -812,6 +838,7 @@ class RecommendReviewers:  # pylint: disable=too-many-instance-attributes
         else:
             return set(), {}
 
+    @timed('find_similar_manuscripts')
     def _find_most_similar_manuscript_ids_with_scores(
             self, subject_areas=None, abstract=None, manuscript_version_ids=None,
             similarity_threshold=0.5, max_similarity_count=50):
@@ -898,6 +925,7 @@ class RecommendReviewers:  # pylint: disable=too-many-instance-attributes
             if self.manuscripts_by_version_id_map.get(version_id, {}).get('is_published')
         }
 
+    @timed('find_reviewer_ids_by_manuscripts')
     def _potential_reviewer_ids_by_matching_manuscript_ids(
             self, version_ids,
             recommend_relationship_types, recommend_stage_names):
@@ -939,6 +967,7 @@ class RecommendReviewers:  # pylint: disable=too-many-instance-attributes
         )
         return result
 
+    @timed('filter_reviewer_ids_by_role')
     def _find_potential_reviewer_ids(
             self, person_ids_by_version_id,
             include_person_ids, exclude_person_ids, ecr_subject_areas,
@@ -1009,7 +1038,8 @@ class RecommendReviewers:  # pylint: disable=too-many-instance-attributes
             recommend_stage_names=recommend_stage_names
         )
 
-        person_keyword_scores = self.person_keyword_service.get_keyword_scores(keyword_list)
+        with timing_span('find_reviewers_by_keywords'):
+            person_keyword_scores = self.person_keyword_service.get_keyword_scores(keyword_list)
 
         potential_reviewers_ids = self._find_potential_reviewer_ids(
             person_ids_by_version_id=person_ids_by_version_id,
@@ -1020,15 +1050,17 @@ class RecommendReviewers:  # pylint: disable=too-many-instance-attributes
             role=role
         )
 
-        potential_reviewers = sorted_potential_reviewers(
-            self._populate_potential_reviewers(
-                potential_reviewers_ids,
-                person_ids_by_version_id=person_ids_by_version_id,
-                keyword_score_by_person_id=person_keyword_scores,
-                manuscript_score_by_id=manuscript_score_by_id,
-                return_relationship_types=return_relationship_types
+        # the potential reviewers are populated lazily, while sorting them
+        with timing_span('populate_potential_reviewers'):
+            potential_reviewers = sorted_potential_reviewers(
+                self._populate_potential_reviewers(
+                    potential_reviewers_ids,
+                    person_ids_by_version_id=person_ids_by_version_id,
+                    keyword_score_by_person_id=person_keyword_scores,
+                    manuscript_score_by_id=manuscript_score_by_id,
+                    return_relationship_types=return_relationship_types
+                )
             )
-        )
 
         if limit is not None and limit > 0:
             potential_reviewers = potential_reviewers[:limit]
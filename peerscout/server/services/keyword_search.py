@@ -0,0 +1,104 @@
+import heapq
+import logging
+from bisect import bisect_left
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, List
+
+LOGGER = logging.getLogger(__name__)
+
+# the top keywords of prefixes up to this length are precomputed (those match the most keywords)
+PRECOMPUTED_PREFIX_LENGTH = 3
+
+# the maximum number of precomputed keywords per prefix (larger limits aren't precomputed)
+MAX_SEARCH_LIMIT = 50
+
+
+def merge_keyword_counts(keyword_counts_list: Iterable[Dict[str, int]]) -> Dict[str, int]:
+    result = Counter()
+    for keyword_counts in keyword_counts_list:
+        result.update(keyword_counts)
+    return dict(result)
+
+
+class KeywordSearchIndex:
+    """Sorted array of lower case keywords, supporting case-insensitive prefix search.
+
+    Keywords only differing in case are combined, using the most frequent spelling.
+    The top max_limit keywords of short prefixes (up to precomputed_prefix_length)
+    are precomputed, the search doesn't need to rank the many keywords matching those.
+    """
+
+    def __init__(
+            self, keyword_counts: Dict[str, int],
+            precomputed_prefix_length: int = PRECOMPUTED_PREFIX_LENGTH,
+            max_limit: int = MAX_SEARCH_LIMIT):
+        count_by_key = Counter()
+        best_keyword_count_by_key = {}
+        for keyword, count in keyword_counts.items():
+            if not keyword:
+                continue
+            key = keyword.lower()
+            count_by_key[key] += count
+            best_keyword, best_count = best_keyword_count_by_key.get(key, (None, 0))
+            if best_keyword is None or (-count, keyword) < (-best_count, best_keyword):
+                best_keyword_count_by_key[key] = (keyword, count)
+        self._keys = sorted(count_by_key.keys())
+        self._keywords = [best_keyword_count_by_key[key][0] for key in self._keys]
+        self._counts = [count_by_key[key] for key in self._keys]
+        self._precomputed_prefix_length = precomputed_prefix_length
+        self._max_limit = max_limit
+        self._top_indices_by_prefix = self._get_top_indices_by_prefix()
+        LOGGER.debug(
+            'keyword search index size: %d (precomputed prefixes: %d)',
+            len(self._keys), len(self._top_indices_by_prefix)
+        )
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def max_limit(self) -> int:
+        return self._max_limit
+
+    def _sort_key(self, i: int):
+        return (-self._counts[i], self._keys[i])
+
+    def _get_top_indices_by_prefix(self) -> Dict[str, List[int]]:
+        # the keys sharing a prefix are adjacent in the sorted keys
+        result = {}
+        for prefix_length in range(1, self._precomputed_prefix_length + 1):
+            indices_with_prefix = (
+                (key[:prefix_length], i)
+                for i, key in enumerate(self._keys)
+                if len(key) >= prefix_length
+            )
+            for prefix, group in groupby(indices_with_prefix, key=itemgetter(0)):
+                result[prefix] = heapq.nsmallest(
+                    self._max_limit, (i for _, i in group), key=self._sort_key
+                )
+        return result
+
+    def _iter_prefix_range(self, prefix: str) -> Iterable[int]:
+        keys = self._keys
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and keys[i].startswith(prefix):
+            yield i
+            i += 1
+
+    def search(self, prefix: str, limit: int = None) -> List[str]:
+        prefix = (prefix or '').strip().lower()
+        if not prefix:
+            return []
+
+        has_limit = limit is not None and limit > 0
+        if (
+                has_limit and limit <= self._max_limit and
+                len(prefix) <= self._precomputed_prefix_length):
+            indices = self._top_indices_by_prefix.get(prefix, [])[:limit]
+        elif has_limit:
+            indices = heapq.nsmallest(limit, self._iter_prefix_range(prefix), key=self._sort_key)
+        else:
+            indices = sorted(self._iter_prefix_range(prefix), key=self._sort_key)
+        return [self._keywords[i] for i in indices]
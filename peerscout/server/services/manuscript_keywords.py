@@ -1,4 +1,5 @@
 import logging
+from contextlib import contextmanager
 
 import sqlalchemy
 
@@ -19,34 +20,43 @@ class ManuscriptKeywordService:
     def from_database(db, valid_version_ids=None):
         return ManuscriptKeywordService(db, valid_version_ids=valid_version_ids)
 
+    @contextmanager
     def _query(self, columns):
         db = self._db
         query = db.session.query(*columns)
-        if self._valid_version_ids is not None:
-            query = query.filter(
-                db.manuscript_keyword.table.version_id.in_(self._valid_version_ids)
-            )
-        return query
+        if self._valid_version_ids is None:
+            yield query
+            return
+        with db.in_ids_condition(
+                db.manuscript_keyword.table.version_id, self._valid_version_ids) as condition:
+            yield query.filter(condition)
 
     def get_all_keywords(self):
-        return set(
-            r[0] for r in
-            self._query([self._db.manuscript_keyword.table.keyword]).distinct()
-        )
+        with self._query([self._db.manuscript_keyword.table.keyword]) as query:
+            return set(r[0] for r in query.distinct())
+
+    def get_keyword_counts(self):
+        db = self._db
+        with self._query([
+            db.manuscript_keyword.table.keyword,
+            sqlalchemy.func.count(db.manuscript_keyword.table.version_id)
+        ]) as query:
+            return dict(query.group_by(db.manuscript_keyword.table.keyword).all())
 
     def get_keyword_scores(self, keyword_list):
         if not keyword_list:
             return {}
         num_keywords = len(keyword_list)
         db = self._db
-        return dict((keyword, count / num_keywords) for keyword, count in self._query([
+        with self._query([
             db.manuscript_keyword.table.version_id,
             sqlalchemy.func.count(db.manuscript_keyword.table.version_id)
-        ]).filter(
-            sqlalchemy.func.lower(db.manuscript_keyword.table.keyword).in_(
-                [s.lower() for s in keyword_list]
-            )
-        ).group_by(db.manuscript_keyword.table.version_id).all())
+        ]) as query:
+            return dict((keyword, count / num_keywords) for keyword, count in query.filter(
+                sqlalchemy.func.lower(db.manuscript_keyword.table.keyword).in_(
+                    [s.lower() for s in keyword_list]
+                )
+            ).group_by(db.manuscript_keyword.table.version_id).all())
 
     def get_keywords_by_ids(self, manuscript_version_ids):
         db = self._db
@@ -18,16 +18,18 @@ class ManuscriptPersonStageService:
     def get_person_ids_by_version_id_for_stage_names(self, version_ids, stage_names):
         db = self._db
         stage_table = db.manuscript_stage.table
-        return applymap_dict(groupby_to_dict(
-            db.session.query(
+        with db.in_ids_condition(stage_table.version_id, version_ids) as condition:
+            rows = db.session.query(
                 stage_table.version_id,
                 stage_table.person_id
             ).filter(
                 sqlalchemy.and_(
-                    stage_table.version_id.in_(version_ids),
+                    condition,
                     stage_table.stage_name.in_(stage_names)
                 )
-            ).all(),
+            ).all()
+        return applymap_dict(groupby_to_dict(
+            rows,
             lambda row: row[0],
             lambda row: row[1]
         ), set)
@@ -6,7 +6,9 @@ class ManuscriptSubjectAreaService:
 
     @staticmethod
     def from_database(db, valid_version_ids=None):
-        df = db.manuscript_subject_area.read_frame()
+        df = db.manuscript_subject_area.read_frame(
+            columns=['version_id', 'subject_area'], preserve_dtypes=True
+        )
         if valid_version_ids is not None:
             df = df[df['version_id'].isin(valid_version_ids)]
         return ManuscriptSubjectAreaService(df)
@@ -35,6 +35,13 @@ class PersonKeywordService:
             self._query([self._db.person_keyword.table.keyword]).distinct().all()
         )
 
+    def get_keyword_counts(self):
+        db = self._db
+        return dict(self._query([
+            db.person_keyword.table.keyword,
+            sqlalchemy.func.count(db.person_keyword.table.person_id)
+        ]).group_by(db.person_keyword.table.keyword).all())
+
     def get_keyword_scores(self, keyword_list):
         if not keyword_list:
             return {}
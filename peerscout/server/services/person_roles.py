@@ -19,20 +19,21 @@ class PersonRoleService:
         if not role:
             return person_ids
         db = self._db
-        raw_result = db.session.query(
-            db.person_role.table.person_id
-        ).join(
-            db.person.table,
-            sqlalchemy.and_(
-                db.person.table.person_id == db.person_role.table.person_id,
-                db.person.table.status == Person.Status.ACTIVE
-            )
-        ).filter(
-            sqlalchemy.and_(
-                db.person_role.table.person_id.in_(person_ids),
-                db.person_role.table.role == role
-            )
-        ).all()
+        with db.in_ids_condition(db.person_role.table.person_id, person_ids) as condition:
+            raw_result = db.session.query(
+                db.person_role.table.person_id
+            ).join(
+                db.person.table,
+                sqlalchemy.and_(
+                    db.person.table.person_id == db.person_role.table.person_id,
+                    db.person.table.status == Person.Status.ACTIVE
+                )
+            ).filter(
+                sqlalchemy.and_(
+                    condition,
+                    db.person_role.table.role == role
+                )
+            ).all()
         result = set(r[0] for r in raw_result)
         LOGGER.debug('filtered person ids by role: %d -> %d (role=%s)',
                      len(person_ids), len(result), role)
@@ -1,13 +1,20 @@
+import itertools
 import json
 import logging
+import os
+from collections import OrderedDict
 from contextlib import contextmanager
-from typing import Dict, ContextManager
+from typing import Dict, ContextManager, List
 
 import pandas as pd
 import sqlalchemy
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import sessionmaker, scoped_session, Session
 from sqlalchemy.orm import load_only
+from sqlalchemy.sql.expression import Insert
 
+from peerscout.utils.collection import iter_chunks
 from peerscout.utils.json import CustomJSONEncoder
 from peerscout.utils.pandas import replace_null_with_none
 
@@ -17,7 +24,39 @@ from .database_schema import (
     TABLES
 )
 
-from .database_views import create_views
+from .database_views import (
+    create_views,
+    get_create_view_statements,
+    get_drop_relation_statement,
+    get_refresh_view_statements,
+    get_relation_kind_query,
+    is_materialized_view
+)
+
+from .database_bulk_load import (
+    BulkLoadMethods,
+    DEFAULT_COPY_CHUNK_SIZE,
+    get_to_sql_insert_method,
+    get_default_staged_load_table_names,
+    parse_bulk_load_method,
+    parse_bulk_load_method_by_table_name,
+    parse_staged_load_table_names
+)
+
+from .database_engine import (
+    begin_sqlite_transaction_if_not_in_transaction,
+    enable_sqlite_statement_timeout,
+    get_engine_pool_kwargs,
+    set_local_statement_timeout
+)
+
+from .database_row_changes import (
+    RowChanges,
+    get_row_hash,
+    get_value_normalizer
+)
+
+from .query_instrumentation import instrument_engine
 
 from .app_config import get_app_config
 
@@ -33,7 +72,7 @@ def json_serializer(d):
     return json.dumps(d, cls=CustomJSONEncoder)
 
 
-def db_connect(user, password, db, host='localhost', port=5432):
+def db_connect(user, password, db, host='localhost', port=5432, **engine_kwargs):
     '''Returns a connection and a metadata object'''
     # We connect with the help of the PostgreSQL URL
     # postgresql://federer:[email protected]:5432/tennis
@@ -43,18 +82,92 @@ def db_connect(user, password, db, host='localhost', port=5432):
     # The return value of create_engine() is our connection object
     return sqlalchemy.create_engine(
         url, client_encoding='utf8', json_serializer=json_serializer,
-        echo=False
+        echo=False, **engine_kwargs
     )
 
 
+def guard_engine_against_fork(engine):
+    """Prevents a forked process from using pooled connections of its parent process.
+
+    Connections checked out in a different process are invalidated (without closing the
+    parent's connection) and the pool will create a new connection instead.
+    """
+    @sqlalchemy.event.listens_for(engine, 'connect')
+    def _on_connect(_, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    @sqlalchemy.event.listens_for(engine, 'checkout')
+    def _on_checkout(_, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info['pid'] != pid:
+            connection_record.connection = connection_proxy.connection = None
+            raise sqlalchemy.exc.DisconnectionError(
+                'connection record belongs to pid %s, attempting to check out in pid %s' % (
+                    connection_record.info['pid'], pid
+                )
+            )
+
+
 DEFAULT_SCHEMA_VERSION_ID = 'default'
 
+UPSERT_DIALECT_NAMES = {'postgresql', 'sqlite'}
+
+DEFAULT_MAX_ROWS_PER_STATEMENT = 1000
+
+# limit of bound parameters per statement (SQLite used to default to 999)
+DEFAULT_MAX_PARAMETERS_PER_STATEMENT = 32767
+MAX_PARAMETERS_PER_STATEMENT_BY_DIALECT_NAME = {
+    'sqlite': 999
+}
+
+# above this number of ids, in_ids_condition loads the ids into a temporary table
+DEFAULT_TEMPORARY_ID_TABLE_THRESHOLD = 500
+
+_temporary_table_counter = itertools.count()
+
+
+def get_max_rows_per_statement(dialect_name: str, column_count: int) -> int:
+    max_parameters = MAX_PARAMETERS_PER_STATEMENT_BY_DIALECT_NAME.get(
+        dialect_name, DEFAULT_MAX_PARAMETERS_PER_STATEMENT
+    )
+    return max(1, min(DEFAULT_MAX_ROWS_PER_STATEMENT, max_parameters // column_count))
+
+
+class UpsertInsert(Insert):  # pylint: disable=abstract-method, too-many-ancestors
+    """INSERT ... ON CONFLICT (conflict columns) DO UPDATE (or DO NOTHING).
+
+    The syntax is shared by PostgreSQL and SQLite (3.24+).
+    """
+    inherit_cache = False
+
+    def __init__(
+            self, table, conflict_column_names: List[str], update_column_names: List[str]):
+        super().__init__(table)
+        self.conflict_column_names = conflict_column_names
+        self.update_column_names = update_column_names
+
+
+@compiles(UpsertInsert)
+def _compile_upsert_insert(insert, compiler, **kwargs):
+    quote = compiler.preparer.quote
+    insert_sql = compiler.visit_insert(insert, **kwargs)
+    conflict_sql = ', '.join(quote(name) for name in insert.conflict_column_names)
+    if not insert.update_column_names:
+        return '%s ON CONFLICT (%s) DO NOTHING' % (insert_sql, conflict_sql)
+    return '%s ON CONFLICT (%s) DO UPDATE SET %s' % (
+        insert_sql, conflict_sql, ', '.join(
+            '%s = excluded.%s' % (quote(name), quote(name))
+            for name in insert.update_column_names
+        )
+    )
+
 
 class Entity:
     def __init__(self, session, table):
         self.session = session
         self.table = table
         self.auto_commit = False
+        self.bulk_load_method = BulkLoadMethods.AUTO
         inspected = sqlalchemy.inspection.inspect(self.table)
         self.primary_key = inspected.primary_key
         self.relashionships = {
@@ -125,7 +238,208 @@ class Entity:
     def update_list(self, objs):
         self.session.bulk_update_mappings(self.table, objs)
 
+    def _get_dialect_name(self):
+        return self.session.get_bind().dialect.name
+
+    def _get_max_rows_per_statement(self, column_count):
+        return get_max_rows_per_statement(self._get_dialect_name(), column_count)
+
+    def _get_primary_key_names(self):
+        return [c.name for c in self.primary_key]
+
+    def upsert_list(self, objs):
+        """Inserts or updates the objects using multi-row INSERT ... ON CONFLICT statements.
+
+        Supports composite primary keys. If the list contains the same primary key more than once,
+        the last object wins. Only the passed in columns of existing rows will be updated.
+        """
+        primary_key_names = self._get_primary_key_names()
+        obj_by_key = OrderedDict(
+            (tuple(o.get(name) for name in primary_key_names), o)
+            for o in objs
+        )
+        objs_by_column_names = OrderedDict()
+        for o in obj_by_key.values():
+            objs_by_column_names.setdefault(tuple(o.keys()), []).append(o)
+        # columns with defaults will also be included, use the total number of columns
+        max_rows = self._get_max_rows_per_statement(len(self.table.__table__.columns))
+        for column_names, column_objs in objs_by_column_names.items():
+            update_column_names = [
+                name for name in column_names if name not in primary_key_names
+            ]
+            for chunk in iter_chunks(column_objs, max_rows):
+                self.session.execute(UpsertInsert(
+                    self.table.__table__,
+                    conflict_column_names=primary_key_names,
+                    update_column_names=update_column_names
+                ).values(chunk))
+
+    def delete_stale(self, objs, replace_key: str):
+        """Deletes rows matching the replace_key values of the objects,
+        that are not part of the objects (by primary key)."""
+        primary_key_names = self._get_primary_key_names()
+        primary_key_fields = [getattr(self.table, name) for name in primary_key_names]
+        replace_key_field = getattr(self.table, replace_key)
+        keep_keys = {tuple(o.get(name) for name in primary_key_names) for o in objs}
+        replace_key_values = list({o[replace_key] for o in objs})
+        stale_keys = []
+        for chunk in iter_chunks(replace_key_values, self._get_max_rows_per_statement(1)):
+            stale_keys.extend(
+                tuple(row)
+                for row in self.session.query(*primary_key_fields).filter(
+                    replace_key_field.in_(chunk)
+                ).all()
+                if tuple(row) not in keep_keys
+            )
+        self.delete_keys(stale_keys)
+        return len(stale_keys)
+
+    def delete_keys(self, keys: List[tuple]):
+        """Deletes the rows by their primary key values (tuples, also for a single key)."""
+        primary_key_fields = [getattr(self.table, name) for name in self._get_primary_key_names()]
+        for chunk in iter_chunks(
+                keys, self._get_max_rows_per_statement(len(primary_key_fields))):
+            self.session.query(self.table).filter(sqlalchemy.or_(*[
+                sqlalchemy.and_(*[
+                    field == value for field, value in zip(primary_key_fields, key)
+                ])
+                for key in chunk
+            ])).delete(synchronize_session=False)
+
+    def get_row_changes(self, objs, replace_key: str = None) -> RowChanges:
+        """Compares the objects with the existing rows, using a hash of the passed in columns.
+
+        Existing rows matching the replace_key values of the objects, that are not part of the
+        objects (by primary key), are to be deleted (see delete_stale).
+        If the list contains the same primary key more than once, the last object wins.
+        """
+        primary_key_names = self._get_primary_key_names()
+        table_columns = self.table.__table__.columns
+        key_normalizers = [
+            get_value_normalizer(table_columns[name].type) for name in primary_key_names
+        ]
+
+        def get_key(values):
+            return tuple(normalize(value) for normalize, value in zip(key_normalizers, values))
+
+        obj_by_key = OrderedDict(
+            (get_key(o.get(name) for name in primary_key_names), o)
+            for o in objs
+        )
+        if not obj_by_key:
+            return RowChanges()
+        column_names = list(OrderedDict.fromkeys(
+            name for o in obj_by_key.values() for name in o.keys()
+        ))
+        normalizers = [get_value_normalizer(table_columns[name].type) for name in column_names]
+
+        def get_hash(values):
+            return get_row_hash(normalize(value) for normalize, value in zip(normalizers, values))
+
+        filter_name = replace_key or primary_key_names[0]
+        filter_field = getattr(self.table, filter_name)
+        query = self.session.query(*[
+            getattr(self.table, name) for name in primary_key_names + column_names
+        ])
+        # the (normalized) key mapped to the key as stored and the hash of the row
+        existing_key_and_hash_by_key = {}
+        for chunk in iter_chunks(
+                list({o.get(filter_name) for o in obj_by_key.values()}),
+                self._get_max_rows_per_statement(1)):
+            for row in query.filter(filter_field.in_(chunk)):
+                key = tuple(row[:len(primary_key_names)])
+                existing_key_and_hash_by_key[get_key(key)] = (
+                    key, get_hash(row[len(primary_key_names):])
+                )
+
+        changes = RowChanges()
+        for key, o in obj_by_key.items():
+            existing_key_and_hash = existing_key_and_hash_by_key.pop(key, None)
+            if existing_key_and_hash is None:
+                changes.inserted.append(o)
+            elif existing_key_and_hash[1] != get_hash(o.get(name) for name in column_names):
+                changes.updated.append(o)
+            else:
+                changes.unchanged_count += 1
+        if replace_key is not None:
+            changes.deleted_keys = [key for key, _ in existing_key_and_hash_by_key.values()]
+        return changes
+
+    def apply_row_changes(self, changes: RowChanges, delete: bool = True, upsert: bool = True):
+        """Writes the changed rows only (see get_row_changes).
+
+        The deletes and inserts / updates may be applied separately (e.g. in table order).
+        """
+        if delete and changes.deleted_keys:
+            self.delete_keys(changes.deleted_keys)
+        if upsert and (changes.inserted or changes.updated):
+            self.update_or_create_list(changes.inserted + changes.updated)
+
+    def stage_records(self, objs) -> sqlalchemy.Table:
+        """Bulk loads the objects into a new temporary staging table (with the passed in columns),
+        only visible to the connection of the current transaction.
+
+        If the list contains the same primary key more than once, the last object wins.
+        """
+        primary_key_names = self._get_primary_key_names()
+        objs = list(OrderedDict(
+            (tuple(o.get(name) for name in primary_key_names), o)
+            for o in objs
+        ).values())
+        column_names = list(objs[0].keys()) if objs else primary_key_names
+        table_columns = self.table.__table__.columns
+        staging_table = sqlalchemy.Table(
+            'staging_%s_%d' % (self.table.__tablename__, next(_temporary_table_counter)),
+            sqlalchemy.MetaData(),
+            *[sqlalchemy.Column(name, table_columns[name].type) for name in column_names],
+            prefixes=['TEMPORARY']
+        )
+        connection = self.session.connection()
+        staging_table.create(connection)
+        rows = [tuple(o.get(name) for name in column_names) for o in objs]
+        method = get_to_sql_insert_method(
+            self.bulk_load_method, self._get_dialect_name(), self.table.__table__
+        )
+        if method is not None:
+            method(staging_table, connection, column_names, rows)
+        elif rows:
+            connection.execute(staging_table.insert(), [
+                dict(zip(column_names, row)) for row in rows
+            ])
+        return staging_table
+
+    def delete_stale_staged(self, staging_table: sqlalchemy.Table, replace_key: str) -> int:
+        """Deletes rows matching the replace_key values of the staged rows,
+        that are not staged (by primary key). Returns the number of deleted rows."""
+        table = self.table.__table__
+        return self.session.execute(table.delete().where(sqlalchemy.and_(
+            table.c[replace_key].in_(sqlalchemy.select([staging_table.c[replace_key]])),
+            ~sqlalchemy.exists().where(sqlalchemy.and_(*[
+                staging_table.c[name] == table.c[name]
+                for name in self._get_primary_key_names()
+            ]))
+        ))).rowcount
+
+    def upsert_staged(self, staging_table: sqlalchemy.Table) -> int:
+        """Inserts or updates the staged rows (see upsert_list), returns the number of rows."""
+        if self._get_dialect_name() not in UPSERT_DIALECT_NAMES:
+            raise Exception('unsupported dialect: %s' % self._get_dialect_name())
+        primary_key_names = self._get_primary_key_names()
+        column_names = [c.name for c in staging_table.columns]
+        return self.session.execute(UpsertInsert(
+            self.table.__table__,
+            conflict_column_names=primary_key_names,
+            update_column_names=[name for name in column_names if name not in primary_key_names]
+        ).from_select(
+            column_names,
+            # the where clause avoids SQLite's parsing ambiguity of ON CONFLICT after a SELECT
+            sqlalchemy.select(list(staging_table.columns)).where(sqlalchemy.true())
+        )).rowcount
+
     def update_or_create_list(self, objs):
+        if self._get_dialect_name() in UPSERT_DIALECT_NAMES:
+            self.upsert_list(objs)
+            return
         if len(self.primary_key) != 1:
             raise Exception("operation only supported for simple primary key, but found: {}".format(
                 self.primary_key
@@ -163,16 +477,89 @@ class Entity:
             id_field.in_(ids)
         ).all()}
 
-    def read_frame(self):
+    def get_distinct_values_where_in(
+            self, column_name: str, filter_column_name: str, filter_values) -> set:
+        field = getattr(self.table, column_name)
+        filter_field = getattr(self.table, filter_column_name)
+        result = set()
+        for chunk in iter_chunks(list(filter_values), self._get_max_rows_per_statement(1)):
+            result.update(
+                row[0]
+                for row in self.session.query(field).filter(filter_field.in_(chunk)).distinct()
+            )
+        return result
+
+    def _get_read_frame_columns(self, columns: List[str] = None) -> list:
+        table_columns = self.table.__table__.columns
+        if columns is None:
+            return list(table_columns)
         primary_key = self.primary_key
-        df = pd.read_sql_table(
-            self.table.__tablename__,
+        if len(primary_key) == 1 and primary_key[0].name not in columns:
+            # a single primary key column is always selected, it will become the index
+            columns = [primary_key[0].name] + list(columns)
+        return [table_columns[name] for name in columns]
+
+    def _convert_read_frame(self, df: pd.DataFrame, preserve_dtypes: bool) -> pd.DataFrame:
+        if not preserve_dtypes:
+            return replace_null_with_none(df)
+        for column in self.table.__table__.columns:
+            if column.name not in df.columns:
+                continue
+            if column.info.get('categorical'):
+                df[column.name] = df[column.name].astype('category')
+            elif (
+                    isinstance(column.type, sqlalchemy.Integer) and
+                    df[column.name].dtype.kind == 'f'):
+                # integers with nulls are read as floats, use the nullable integer type instead
+                df[column.name] = df[column.name].astype('Int64')
+        return df
+
+    def read_frame(
+            self, columns: List[str] = None, where=None, chunksize: int = None,
+            preserve_dtypes: bool = False):
+        """Reads the table (or view) as a data frame, indexed by a single primary key.
+
+        Args:
+          columns: the columns to select (defaults to all)
+          where: optional SQLAlchemy filter condition
+          chunksize: if set, an iterator of data frames with up to chunksize rows is returned
+          preserve_dtypes: keep numeric, bool and datetime columns native (with NaN / NaT),
+            use the nullable Int64 type for integer columns with nulls
+            and categoricals for columns marked as categorical in the schema,
+            rather than replacing nulls with None (which converts all columns to object)
+        """
+        primary_key = self.primary_key
+        selected_columns = self._get_read_frame_columns(columns)
+        query = sqlalchemy.select([
+            # intervals are numbers in SQLite (views), don't let SQLAlchemy parse those
+            sqlalchemy.type_coerce(c, sqlalchemy.types.NullType()).label(c.name)
+            if isinstance(c.type, sqlalchemy.Interval)
+            else c
+            for c in selected_columns
+        ])
+        if where is not None:
+            query = query.where(where)
+        result = pd.read_sql(
+            query,
             self.session.get_bind(),
-            index_col=primary_key[0].name if len(primary_key) == 1 else None
+            index_col=primary_key[0].name if len(primary_key) == 1 else None,
+            parse_dates=[
+                c.name for c in selected_columns if isinstance(c.type, sqlalchemy.DateTime)
+            ],
+            chunksize=chunksize
         )
-        return replace_null_with_none(df)
-
-    def write_frame(self, df: pd.DataFrame, **kwargs):
+        if chunksize is None:
+            return self._convert_read_frame(result, preserve_dtypes)
+        return (self._convert_read_frame(df, preserve_dtypes) for df in result)
+
+    def write_frame(self, df: pd.DataFrame, bulk_load_method: str = None, **kwargs):
+        method = get_to_sql_insert_method(
+            bulk_load_method or self.bulk_load_method,
+            self._get_dialect_name(),
+            self.table.__table__
+        )
+        if method is not None:
+            kwargs = {'method': method, 'chunksize': DEFAULT_COPY_CHUNK_SIZE, **kwargs}
         df.to_sql(
             self.table.__tablename__,
             self.session.get_bind(),
@@ -184,16 +571,37 @@ class Entity:
         return self.session.query(self.table).count()
 
 
-class Database:
-    def __init__(self, engine, autocommit=False):
+class Database:  # pylint: disable=too-many-instance-attributes
+    def __init__(
+            self, engine, autocommit=False, read_only: bool = False,
+            statement_timeout: float = None):
         self.engine = engine
+        self.read_only = read_only
+        self.statement_timeout = statement_timeout
+        guard_engine_against_fork(engine)
+        if statement_timeout is not None and engine.dialect.name == 'sqlite':
+            enable_sqlite_statement_timeout(engine)
         self.session: Session = scoped_session(sessionmaker(engine, autocommit=autocommit))
+        self.temporary_id_table_threshold = DEFAULT_TEMPORARY_ID_TABLE_THRESHOLD
         self.views = create_views(engine.dialect.name)
+        # tables imported via staging tables (see load_frames_staged of the import)
+        self.staged_load_table_names = get_default_staged_load_table_names(engine.dialect.name)
         self.tables = {
             t.__tablename__: Entity(self.session, t)
             for t in TABLES + self.views
         }
 
+    def configure_bulk_load(
+            self, bulk_load_method: str = BulkLoadMethods.AUTO,
+            bulk_load_method_by_table_name: Dict[str, str] = None,
+            staged_load_table_names: List[str] = None):
+        for table_name, table in self.tables.items():
+            table.bulk_load_method = (bulk_load_method_by_table_name or {}).get(
+                table_name, bulk_load_method
+            )
+        if staged_load_table_names is not None:
+            self.staged_load_table_names = staged_load_table_names
+
     def get_current_schema_version(self):
         try:
             version = self.tables['schema_version'].get(DEFAULT_SCHEMA_VERSION_ID)
@@ -203,25 +611,81 @@ class Database:
         except sqlalchemy.exc.OperationalError:
             return None
 
+    def _get_relation_kind(self, name):
+        return self.engine.execute(
+            sqlalchemy.text(get_relation_kind_query(self.engine.dialect.name)),
+            name=name
+        ).scalar()
+
     def drop_views(self):
         for view in reversed(self.views):
-            self.engine.execute('DROP VIEW IF EXISTS {}'.format(
-                view.__tablename__
-            ))
+            # the view may have been created as a different kind (e.g. not materialized)
+            relation_kind = self._get_relation_kind(view.__tablename__)
+            if relation_kind is not None:
+                self.engine.execute(get_drop_relation_statement(
+                    relation_kind, view.__tablename__
+                ))
         self.commit_if_not_auto_commit()
 
     def create_views(self):
         for view in self.views:
             get_logger().info('creating view %s', view.__tablename__)
-            self.engine.execute('CREATE VIEW {} AS {}'.format(
-                view.__tablename__,
-                view.__query__
-            ))
+            for statement in get_create_view_statements(self.engine.dialect.name, view):
+                self.engine.execute(statement)
         self.commit_if_not_auto_commit()
 
+    def refresh_materialized_views(self, full: bool = False) -> int:
+        """Refreshes the materialized views (see is_maintained_table).
+
+        Unless full is set, views supporting it are only refreshed for the persons
+        pending refresh (populated by the import). Returns the number of those persons.
+        """
+        dialect = self.engine.dialect.name
+        pending_refresh = self.person_review_stats_refresh
+        with self.semi_transaction() as session:
+            pending_count = pending_refresh.count()
+            for view in self.views:
+                if not is_materialized_view(view):
+                    continue
+                get_logger().info(
+                    'refreshing materialized view %s (pending persons: %d, full: %s)',
+                    view.__tablename__, pending_count, full
+                )
+                for statement in get_refresh_view_statements(dialect, view, full=full):
+                    session.execute(sqlalchemy.text(statement))
+            pending_refresh.delete_all()
+        return pending_count
+
+    def get_schema_indexes(self) -> List[sqlalchemy.Index]:
+        """Returns the secondary (including functional) indexes defined by the schema."""
+        return [
+            index
+            for table in Base.metadata.sorted_tables
+            for index in sorted(table.indexes, key=lambda index: index.name)
+        ]
+
+    def create_missing_indexes(self) -> List[str]:
+        """Creates indexes defined by the schema but not present in the database
+        (create_all won't create them for existing tables). Returns the created index names."""
+        created_index_names = []
+        for index in self.get_schema_indexes():
+            if self._get_relation_kind(index.name) is None:
+                get_logger().info('creating index %s', index.name)
+                index.create(self.engine)
+                created_index_names.append(index.name)
+        return created_index_names
+
+    def drop_indexes(self):
+        """Drops the secondary indexes defined by the schema (e.g. for benchmarking)."""
+        for index in self.get_schema_indexes():
+            if self._get_relation_kind(index.name) is not None:
+                get_logger().info('dropping index %s', index.name)
+                index.drop(self.engine)
+
     def _shallow_migrate_schema(self):
         get_logger().info('shallow migrate schema (no data modification)')
         Base.metadata.create_all(self.engine)
+        self.create_missing_indexes()
         self.drop_views()
         self.create_views()
 
@@ -267,7 +731,16 @@ class Database:
         return self.session.autocommit
 
     def begin(self) -> ContextManager[Session]:
-        return self.session.begin()
+        """Begins a transaction (of an autocommit session), e.g. of a request,
+        with the statement timeout applied (if configured)."""
+        transaction = self.session.begin()
+        if self.statement_timeout is not None:
+            try:
+                set_local_statement_timeout(self.session.connection(), self.statement_timeout)
+            except:  # noqa: E722
+                transaction.rollback()
+                raise
+        return transaction
 
     def commit_if_not_auto_commit(self):
         if not self.is_auto_commit():
@@ -286,6 +759,52 @@ class Database:
                 self.session.rollback()
                 raise
 
+    @contextmanager
+    def savepoint(self):
+        """Rolls back the changes made within the context on error, while keeping the previous
+        (uncommitted) changes of the current transaction."""
+        if self.engine.dialect.name == 'sqlite':
+            begin_sqlite_transaction_if_not_in_transaction(self.session.connection())
+        with self.session.begin_nested():
+            yield self.session
+
+    @contextmanager
+    def in_ids_condition(self, field, ids, threshold: int = None):
+        """Yields a filter condition for the field being one of the ids.
+
+        Above the threshold, the ids are bulk inserted into a temporary table which the
+        condition selects from, rather than passing every id as a bind parameter of the
+        IN list (slow to compile and plan, and limited on SQLite).
+        The temporary table is only visible to the connection of the current transaction,
+        the condition must therefore be used within the context.
+        """
+        # a null id wouldn't match any row
+        ids = list({value for value in ids if value is not None})
+        if threshold is None:
+            threshold = self.temporary_id_table_threshold
+        # (hot standby replicas don't allow temporary tables)
+        if len(ids) <= threshold or self.read_only:
+            yield field.in_(ids)
+            return
+        if self.is_auto_commit() and self.session().transaction is None:
+            # otherwise every statement may use a different pooled connection
+            with self.session.begin():
+                with self.in_ids_condition(field, ids, threshold=threshold) as condition:
+                    yield condition
+            return
+        table = sqlalchemy.Table(
+            'tmp_ids_%d' % next(_temporary_table_counter), sqlalchemy.MetaData(),
+            sqlalchemy.Column('id', field.type, primary_key=True),
+            prefixes=['TEMPORARY']
+        )
+        connection = self.session.connection()
+        table.create(connection)
+        for chunk in iter_chunks(ids, get_max_rows_per_statement(self.engine.dialect.name, 1)):
+            connection.execute(table.insert().values([{'id': value} for value in chunk]))
+        yield field.in_(sqlalchemy.select([table.c.id]))
+        # (on error, the rollback of the transaction will discard the table)
+        table.drop(connection)
+
     def remove_local(self):
         self.session.remove()
 
@@ -299,29 +818,67 @@ class Database:
         return self.tables[name]
 
 
-def connect_database(*args, autocommit: bool = False, **kwargs) -> Database:
+def connect_database(
+        *args, autocommit: bool = False, statement_timeout: float = None,
+        **kwargs) -> Database:
     engine = db_connect(*args, **kwargs)
-    return Database(engine, autocommit=autocommit)
+    return Database(engine, autocommit=autocommit, statement_timeout=statement_timeout)
 
 
-def connect_configured_database(autocommit: bool = False) -> Database:
+def connect_configured_database(autocommit: bool = False, read_only: bool = False) -> Database:
+    """Connects to the configured database.
+
+    If read_only is set and a read_only_url is configured, the read-only replica is used instead.
+    """
     config = get_app_config()
     db_config = config['database']
     name = db_config['name']
-    if name.startswith('sqlite:'):
-        return Database(sqlalchemy.create_engine(name, echo=False))
-    db_host = db_config['host']
-    db_port = db_config['port']
-    db_user = db_config['user']
-    db_password = db_config['password']
-    return connect_database(
-        db=name,
-        host=db_host,
-        port=db_port,
-        user=db_user,
-        password=db_password,
-        autocommit=autocommit
+    read_only_url = db_config.get('read_only_url') if read_only else None
+    statement_timeout = db_config.getfloat('request_statement_timeout', fallback=None)
+    if read_only_url:
+        db = Database(
+            sqlalchemy.create_engine(read_only_url, echo=False, **get_engine_pool_kwargs(
+                db_config, make_url(read_only_url).get_backend_name()
+            )),
+            autocommit=autocommit, read_only=True, statement_timeout=statement_timeout
+        )
+    elif name.startswith('sqlite:'):
+        db = Database(
+            sqlalchemy.create_engine(
+                name, echo=False, **get_engine_pool_kwargs(db_config, 'sqlite')
+            ),
+            autocommit=autocommit, statement_timeout=statement_timeout
+        )
+    else:
+        db_host = db_config['host']
+        db_port = db_config['port']
+        db_user = db_config['user']
+        db_password = db_config['password']
+        db = connect_database(
+            db=name,
+            host=db_host,
+            port=db_port,
+            user=db_user,
+            password=db_password,
+            autocommit=autocommit,
+            statement_timeout=statement_timeout,
+            **get_engine_pool_kwargs(db_config, 'postgresql')
+        )
+    db.configure_bulk_load(
+        bulk_load_method=parse_bulk_load_method(db_config.get('bulk_load_method')),
+        bulk_load_method_by_table_name=parse_bulk_load_method_by_table_name(
+            db_config.get('bulk_load_method_by_table')
+        ),
+        staged_load_table_names=parse_staged_load_table_names(
+            db_config.get('staged_load_tables'), db.engine.dialect.name
+        )
     )
+    slow_query_threshold = db_config.getfloat('slow_query_threshold', fallback=None)
+    if (
+            db_config.getboolean('query_instrumentation_enabled', fallback=False) or
+            slow_query_threshold is not None):
+        instrument_engine(db.engine, slow_query_threshold=slow_query_threshold)
+    return db
 
 
 @contextmanager
@@ -356,6 +913,7 @@ def insert_dataset(db: Database, dataset: Dataset):
             get_logger().debug("data %s:\n%s", table_name, dataset[table_name])
             db[table_name].create_list(dataset[table_name])
     db.commit_if_not_auto_commit()
+    db.refresh_materialized_views(full=True)
 
 
 @contextmanager
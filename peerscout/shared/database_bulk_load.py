@@ -0,0 +1,130 @@
+import io
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import JSON, LargeBinary, PickleType
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import TypeDecorator
+
+from peerscout.utils.collection import parse_list
+
+
+class BulkLoadMethods:
+    AUTO = 'auto'
+    COPY = 'copy'
+    EXECUTEMANY = 'executemany'
+
+
+BULK_LOAD_METHODS = {BulkLoadMethods.AUTO, BulkLoadMethods.COPY, BulkLoadMethods.EXECUTEMANY}
+
+COPY_DIALECT_NAMES = {'postgresql'}
+
+# column types that can't simply be written as CSV values
+NON_COPY_COLUMN_TYPES = (ARRAY, JSON, LargeBinary, PickleType)
+
+DEFAULT_COPY_CHUNK_SIZE = 100000
+
+# the large tables with a composite primary key, imported via staging tables (COPY) by default
+DEFAULT_STAGED_LOAD_TABLE_NAMES = ['manuscript_stage', 'manuscript_author']
+
+
+def parse_bulk_load_method(method: str) -> str:
+    method = (method or BulkLoadMethods.AUTO).strip().lower()
+    if method not in BULK_LOAD_METHODS:
+        raise ValueError('unsupported bulk load method: %s (expected one of %s)' % (
+            method, sorted(BULK_LOAD_METHODS)
+        ))
+    return method
+
+
+def parse_bulk_load_method_by_table_name(s: str) -> Dict[str, str]:
+    """Parses a comma separated list of table_name=method."""
+    result = {}
+    for item in parse_list(s or ''):
+        table_name, _, method = item.partition('=')
+        result[table_name.strip()] = parse_bulk_load_method(method)
+    return result
+
+
+def get_default_staged_load_table_names(dialect_name: str) -> List[str]:
+    """The tables imported via staging tables unless configured otherwise
+    (only where the staging tables can be bulk loaded using COPY)."""
+    if dialect_name in COPY_DIALECT_NAMES:
+        return list(DEFAULT_STAGED_LOAD_TABLE_NAMES)
+    return []
+
+
+def parse_staged_load_table_names(s: Optional[str], dialect_name: str) -> List[str]:
+    """Parses a comma separated list of table names (None being the default of the dialect)."""
+    if s is None:
+        return get_default_staged_load_table_names(dialect_name)
+    return parse_list(s)
+
+
+def _is_copy_supported_for_column_type(column_type) -> bool:
+    if isinstance(column_type, NON_COPY_COLUMN_TYPES):
+        return False
+    if isinstance(column_type, TypeDecorator):
+        # e.g. variants, resolve the type used by PostgreSQL
+        return _is_copy_supported_for_column_type(
+            column_type.load_dialect_impl(postgresql.dialect())
+        )
+    return True
+
+
+def is_copy_supported_for_table(table) -> bool:
+    return all(
+        _is_copy_supported_for_column_type(column.type)
+        for column in table.columns
+    )
+
+
+def format_csv_value(value) -> str:
+    # all values are quoted, an unquoted empty value is NULL (COPY's default in CSV format)
+    if value is None:
+        return ''
+    return '"%s"' % str(value).replace('"', '""')
+
+
+def write_csv_rows(buffer, rows):
+    for row in rows:
+        buffer.write(','.join(format_csv_value(value) for value in row))
+        buffer.write('\n')
+
+
+def copy_from_stdin(pd_table, conn, keys, data_iter):
+    """pandas.DataFrame.to_sql insertion method, streaming the rows as CSV to COPY FROM STDIN."""
+    buffer = io.StringIO()
+    write_csv_rows(buffer, data_iter)
+    buffer.seek(0)
+    preparer = conn.dialect.identifier_preparer
+    table_name = preparer.quote(pd_table.name)
+    if pd_table.schema:
+        table_name = '%s.%s' % (preparer.quote_schema(pd_table.schema), table_name)
+    sql = 'COPY %s (%s) FROM STDIN WITH (FORMAT csv)' % (
+        table_name, ', '.join(preparer.quote(key) for key in keys)
+    )
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+
+def get_to_sql_insert_method(
+        bulk_load_method: str, dialect_name: str, table) -> Optional[Callable]:
+    """Returns the to_sql method for the bulk load method (None being the pandas default,
+    executemany)."""
+    if bulk_load_method == BulkLoadMethods.AUTO:
+        bulk_load_method = (
+            BulkLoadMethods.COPY
+            if dialect_name in COPY_DIALECT_NAMES and is_copy_supported_for_table(table)
+            else BulkLoadMethods.EXECUTEMANY
+        )
+    if bulk_load_method == BulkLoadMethods.COPY:
+        if dialect_name not in COPY_DIALECT_NAMES:
+            raise ValueError('copy bulk load method not supported by %s' % dialect_name)
+        return copy_from_stdin
+    if bulk_load_method == BulkLoadMethods.EXECUTEMANY:
+        return None
+    raise ValueError('unsupported bulk load method: %s' % bulk_load_method)
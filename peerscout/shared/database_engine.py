@@ -0,0 +1,74 @@
+import time
+
+import sqlalchemy
+from sqlalchemy import event
+
+
+# pool sizing options (integers), SQLite's default pools don't support those
+POOL_SIZING_OPTION_NAMES = ['pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle']
+
+_STATEMENT_TIMEOUT_KEY = 'statement_timeout'
+
+# number of SQLite virtual machine instructions between checks of the statement deadline
+SQLITE_PROGRESS_HANDLER_INSTRUCTIONS = 1000
+
+
+def get_engine_pool_kwargs(db_config, dialect_name: str) -> dict:
+    """Returns the create_engine pool options configured in the database section."""
+    kwargs = {}
+    if db_config.getboolean('pool_pre_ping', fallback=False):
+        kwargs['pool_pre_ping'] = True
+    if dialect_name != 'sqlite':
+        for name in POOL_SIZING_OPTION_NAMES:
+            value = db_config.getint(name, fallback=None)
+            if value is not None:
+                kwargs[name] = value
+    return kwargs
+
+
+def set_local_statement_timeout(connection, timeout: float):
+    """Limits the duration (in seconds) of each statement of the current transaction.
+
+    On SQLite (e.g. as a stand-in for testing), statements are interrupted by a progress handler
+    and enable_sqlite_statement_timeout needs to have been called for the engine.
+    """
+    dialect_name = connection.dialect.name
+    if dialect_name == 'postgresql':
+        connection.execute(sqlalchemy.text(
+            'SET LOCAL statement_timeout = %d' % max(1, round(timeout * 1000))
+        ))
+    elif dialect_name == 'sqlite':
+        # the pool's checkin listener will remove it again
+        connection.info[_STATEMENT_TIMEOUT_KEY] = timeout
+    else:
+        raise Exception('unsupported dialect: %s' % dialect_name)
+
+
+def enable_sqlite_statement_timeout(engine):
+    def before_cursor_execute(conn, *_):
+        timeout = conn.info.get(_STATEMENT_TIMEOUT_KEY)
+        if timeout is None:
+            return
+        deadline = time.perf_counter() + timeout
+        conn.connection.set_progress_handler(
+            lambda: time.perf_counter() > deadline, SQLITE_PROGRESS_HANDLER_INSTRUCTIONS
+        )
+
+    def checkin(dbapi_connection, connection_record):
+        if connection_record.info.pop(_STATEMENT_TIMEOUT_KEY, None) is None:
+            return
+        if dbapi_connection is not None:
+            dbapi_connection.set_progress_handler(None, SQLITE_PROGRESS_HANDLER_INSTRUCTIONS)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'checkin', checkin)
+
+
+def begin_sqlite_transaction_if_not_in_transaction(connection):
+    """Begins the transaction of the SQLite connection (if not already begun).
+
+    pysqlite only begins a transaction before modifying statements, a savepoint outside of
+    a transaction would become the transaction instead (and be committed when released).
+    """
+    if not connection.connection.in_transaction:
+        connection.execute(sqlalchemy.text('BEGIN'))
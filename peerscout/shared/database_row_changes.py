@@ -0,0 +1,66 @@
+import hashlib
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+from peerscout.utils.pandas import is_null_value
+
+
+def _normalize_datetime(value):
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        # the time zone isn't stored, the database keeps the local time
+        timestamp = timestamp.tz_localize(None)
+    return timestamp.isoformat()
+
+
+def _normalize_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def get_value_normalizer(column_type) -> Callable:
+    """Returns a function normalizing a value of the column type for comparison,
+    between the value read from the database and the one about to be written."""
+    if isinstance(column_type, sqlalchemy.DateTime):
+        normalize = _normalize_datetime
+    elif isinstance(column_type, sqlalchemy.Boolean):
+        normalize = bool
+    elif isinstance(column_type, sqlalchemy.Integer):
+        normalize = int
+    elif isinstance(column_type, sqlalchemy.Float):
+        normalize = float
+    else:
+        normalize = _normalize_value
+    return lambda value: None if is_null_value(value) else normalize(value)
+
+
+def get_row_hash(values) -> bytes:
+    return hashlib.blake2b(repr(tuple(values)).encode('utf-8'), digest_size=16).digest()
+
+
+class RowChanges:
+    """The rows to insert and update and the keys of the rows to delete
+    (to replace the existing rows of a table with the passed in rows)."""
+
+    def __init__(
+            self, inserted: List[dict] = None, updated: List[dict] = None,
+            deleted_keys: List[tuple] = None, unchanged_count: int = 0):
+        self.inserted = inserted or []
+        self.updated = updated or []
+        self.deleted_keys = deleted_keys or []
+        self.unchanged_count = unchanged_count
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, self.get_counts())
+
+    def get_counts(self) -> dict:
+        return {
+            'inserted': len(self.inserted),
+            'updated': len(self.updated),
+            'deleted': len(self.deleted_keys),
+            'unchanged': self.unchanged_count
+        }
@@ -8,7 +8,9 @@ from sqlalchemy import (
     PickleType,
     String,
     ForeignKey,
-    TIMESTAMP
+    Index,
+    TIMESTAMP,
+    func
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.dialects import postgresql
@@ -33,6 +35,23 @@ class ImportProcessed(Base):
     when = Column(TIMESTAMP)
 
 
+class ImportXmlFile(Base):
+    """Hashes of the imported XML files (of the zip files), to skip unchanged files."""
+    __tablename__ = "import_xml_file"
+
+    manuscript_number = Column(String, primary_key=True)
+    content_hash = Column(String)
+    rows_hash = Column(String)
+    version = Column(Integer)
+
+
+class PersonReviewStatsRefresh(Base):
+    """Persons with review stats pending refresh (see materialized views)."""
+    __tablename__ = "person_review_stats_refresh"
+
+    person_id = Column(String, primary_key=True)
+
+
 class Person(Base):
     __tablename__ = "person"
 
@@ -45,8 +64,8 @@ class Person(Base):
     first_name = Column(String)
     middle_name = Column(String)
     last_name = Column(String)
-    status = Column(String)
-    email = Column(String)
+    status = Column(String, info={'categorical': True})
+    email = Column(String, index=True)
     institution = Column(String)
     is_early_career_researcher = Column(Boolean, nullable=False, default=False)
 
@@ -73,6 +92,10 @@ class PersonKeyword(Base):
     person_id = create_person_id_fk(primary_key=True)
     keyword = Column(String, primary_key=True)
 
+    __table_args__ = (
+        Index('ix_person_keyword_lower_keyword', func.lower(keyword)),
+    )
+
 
 class PersonMembership(Base):
     __tablename__ = "person_membership"
@@ -90,6 +113,10 @@ class PersonRole(Base):
     person_id = create_person_id_fk(primary_key=True)
     role = Column(String, primary_key=True)
 
+    __table_args__ = (
+        Index('ix_person_role_role_person_id', role, person_id),
+    )
+
 
 class PersonSubjectArea(Base):
     __tablename__ = "person_subject_area"
@@ -140,7 +167,7 @@ class ManuscriptAuthor(Base):
     __tablename__ = "manuscript_author"
 
     version_id = create_manuscript_version_id_fk(primary_key=True)
-    person_id = create_person_id_fk(primary_key=True)
+    person_id = create_person_id_fk(primary_key=True, index=True)
     seq = Column(Integer)
     is_corresponding_author = Column(Boolean)
 
@@ -149,36 +176,36 @@ class ManuscriptEditor(Base):
     __tablename__ = "manuscript_editor"
 
     version_id = create_manuscript_version_id_fk(primary_key=True)
-    person_id = create_person_id_fk(primary_key=True)
+    person_id = create_person_id_fk(primary_key=True, index=True)
 
 
 class ManuscriptSeniorEditor(Base):
     __tablename__ = "manuscript_senior_editor"
 
     version_id = create_manuscript_version_id_fk(primary_key=True)
-    person_id = create_person_id_fk(primary_key=True)
+    person_id = create_person_id_fk(primary_key=True, index=True)
 
 
 class ManuscriptReviewer(Base):
     __tablename__ = "manuscript_reviewer"
 
     version_id = create_manuscript_version_id_fk(primary_key=True)
-    person_id = create_person_id_fk(primary_key=True)
+    person_id = create_person_id_fk(primary_key=True, index=True)
 
 
 class ManuscriptPotentialEditor(Base):
     __tablename__ = "manuscript_potential_editor"
 
     version_id = create_manuscript_version_id_fk(primary_key=True)
-    person_id = create_person_id_fk(primary_key=True)
+    person_id = create_person_id_fk(primary_key=True, index=True)
 
 
 class ManuscriptPotentialReviewer(Base):
     __tablename__ = "manuscript_potential_reviewer"
 
     version_id = create_manuscript_version_id_fk(primary_key=True)
-    person_id = create_person_id_fk(primary_key=True)
-    status = Column(String)
+    person_id = create_person_id_fk(primary_key=True, index=True)
+    status = Column(String, info={'categorical': True})
     suggested_to_include = Column(Boolean)
     suggested_to_exclude = Column(Boolean)
 
@@ -189,6 +216,10 @@ class ManuscriptKeyword(Base):
     version_id = create_manuscript_version_id_fk(primary_key=True)
     keyword = Column(String, primary_key=True)
 
+    __table_args__ = (
+        Index('ix_manuscript_keyword_lower_keyword', func.lower(keyword)),
+    )
+
 
 class ManuscriptSubjectArea(Base):
     __tablename__ = "manuscript_subject_area"
@@ -208,10 +239,14 @@ class ManuscriptStage(Base):
     __tablename__ = "manuscript_stage"
 
     version_id = create_manuscript_version_id_fk(primary_key=True)
-    person_id = create_person_id_fk(primary_key=True)
+    person_id = create_person_id_fk(primary_key=True, index=True)
     triggered_by_person_id = create_person_id_fk(nullable=True)
     stage_timestamp = Column(TIMESTAMP, primary_key=True)
-    stage_name = Column(String, primary_key=True)
+    stage_name = Column(String, primary_key=True, info={'categorical': True})
+
+    __table_args__ = (
+        Index('ix_manuscript_stage_version_id_stage_name', version_id, stage_name),
+    )
 
 
 class ManuscriptFunding(Base):
@@ -226,7 +261,7 @@ class ManuscriptAuthorFunding(Base):
     __tablename__ = "manuscript_author_funding"
 
     version_id = create_manuscript_version_id_fk(primary_key=True)
-    person_id = create_person_id_fk(primary_key=True)
+    person_id = create_person_id_fk(primary_key=True, index=True)
     funder_name = Column(String, primary_key=True)
     grant_reference_number = Column(String, primary_key=True)
 
@@ -260,6 +295,8 @@ class ML_ModelData(Base):
 TABLES = [
     SchemaVersion,
     ImportProcessed,
+    ImportXmlFile,
+    PersonReviewStatsRefresh,
     Person,
     PersonDatesNotAvailable,
     PersonKeyword,
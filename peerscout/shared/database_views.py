@@ -1,3 +1,5 @@
+from typing import List
+
 from sqlalchemy import (
     Column,
     Boolean,
@@ -9,6 +11,22 @@ from sqlalchemy import (
 from sqlalchemy.ext.declarative import declarative_base
 
 
+# persons whose materialized review stats need to be refreshed (see PersonReviewStatsRefresh)
+PENDING_REFRESH_PERSON_CONDITION = (
+    'person_id in (select person_id from person_review_stats_refresh)'
+)
+
+DROP_KEYWORD_BY_RELATION_KIND = {
+    # sqlite (sqlite_master.type)
+    'view': 'VIEW',
+    'table': 'TABLE',
+    # postgresql (pg_class.relkind)
+    'v': 'VIEW',
+    'm': 'MATERIALIZED VIEW',
+    'r': 'TABLE'
+}
+
+
 def compile_minutes_duration(dialect, minutes):
     if dialect == 'postgresql':
         return "INTERVAL 'P0Y0M0DT0H{}M0S'".format(minutes)
@@ -180,27 +198,118 @@ def create_views(dialect):
   from manuscript_person_review_times
   """
 
+    def review_stats_query(conditions=None):
+        where = (
+            '  where {}\n'.format(' and '.join(conditions))
+            if conditions
+            else ''
+        )
+        return _BASE_REVIEW_STATS_QUERY + where + '  group by person_id\n'
+
+    last12m_condition = 'contacted_timestamp >= (current_date - {interval})'.format(
+        interval=one_year
+    )
+
     class PersonReviewStatsOverall(PersonReviewStatsMixin, Base):
         __tablename__ = "person_review_stats_overall"
 
-        __query__ =\
-            _BASE_REVIEW_STATS_QUERY +\
-            """
-    group by person_id
-    """
+        __materialized__ = True
+
+        __query__ = review_stats_query()
+
+        # used to only refresh the stats of persons pending refresh
+        # (the view is therefore a maintained table on PostgreSQL too)
+        __refresh_query__ = review_stats_query([PENDING_REFRESH_PERSON_CONDITION])
 
     class PersonReviewStatsLast12m(PersonReviewStatsMixin, Base):
         __tablename__ = "person_review_stats_last12m"
 
-        __query__ =\
-            _BASE_REVIEW_STATS_QUERY +\
-            """
-    where contacted_timestamp >= (current_date - {interval})
-    group by person_id
-    """.format(interval=one_year)
+        # the stats change with the current date, this view is therefore always fully refreshed
+        __materialized__ = True
+
+        __query__ = review_stats_query([last12m_condition])
 
     return [
         ManuscriptPersonReviewTimes,
         PersonReviewStatsOverall,
         PersonReviewStatsLast12m
     ]
+
+
+def is_materialized_view(view) -> bool:
+    return getattr(view, '__materialized__', False)
+
+
+def is_maintained_table(dialect: str, view) -> bool:
+    """Whether the materialized view is a table maintained by refresh_materialized_views.
+
+    That is the case on SQLite and for views defining a __refresh_query__,
+    as PostgreSQL materialized views can only be refreshed fully.
+    """
+    return dialect == 'sqlite' or getattr(view, '__refresh_query__', None) is not None
+
+
+def _get_primary_key_names(view):
+    return [c.name for c in view.__table__.primary_key]
+
+
+def get_relation_kind_query(dialect: str) -> str:
+    """Query returning the kind of an existing relation (e.g. view), by name."""
+    if dialect == 'postgresql':
+        return (
+            'select c.relkind from pg_class c'
+            ' join pg_namespace n on n.oid = c.relnamespace'
+            ' where c.relname = :name and n.nspname = current_schema()'
+        )
+    elif dialect == 'sqlite':
+        return 'select type from sqlite_master where name = :name'
+    else:
+        raise Exception("unsupported dialect: {}".format(dialect))
+
+
+def get_drop_relation_statement(relation_kind: str, name: str) -> str:
+    return 'DROP {} IF EXISTS {}'.format(DROP_KEYWORD_BY_RELATION_KIND[relation_kind], name)
+
+
+def get_create_view_statements(dialect: str, view) -> List[str]:
+    name = view.__tablename__
+    if not is_materialized_view(view):
+        return ['CREATE VIEW {} AS {}'.format(name, view.__query__)]
+    if is_maintained_table(dialect, view):
+        create_statement = 'CREATE TABLE {} AS {}'.format(name, view.__query__)
+    elif dialect == 'postgresql':
+        create_statement = 'CREATE MATERIALIZED VIEW {} AS {}'.format(name, view.__query__)
+    else:
+        raise Exception("unsupported dialect: {}".format(dialect))
+    return [
+        create_statement,
+        # the unique index is also required to refresh PostgreSQL views concurrently
+        'CREATE UNIQUE INDEX {name}_unique_idx ON {name} ({columns})'.format(
+            name=name, columns=', '.join(_get_primary_key_names(view))
+        )
+    ]
+
+
+def get_refresh_view_statements(dialect: str, view, full: bool = False) -> List[str]:
+    """Statements refreshing the materialized view.
+
+    Unless full is set, views defining a __refresh_query__ (maintained tables)
+    will only be refreshed for the persons pending refresh.
+    Other PostgreSQL materialized views are refreshed fully (concurrently, not blocking readers).
+    """
+    name = view.__tablename__
+    if is_maintained_table(dialect, view):
+        refresh_query = getattr(view, '__refresh_query__', None)
+        if full or refresh_query is None:
+            return [
+                'DELETE FROM {}'.format(name),
+                'INSERT INTO {} {}'.format(name, view.__query__)
+            ]
+        return [
+            'DELETE FROM {} WHERE {}'.format(name, PENDING_REFRESH_PERSON_CONDITION),
+            'INSERT INTO {} {}'.format(name, refresh_query)
+        ]
+    elif dialect == 'postgresql':
+        return ['REFRESH MATERIALIZED VIEW CONCURRENTLY {}'.format(name)]
+    else:
+        raise Exception("unsupported dialect: {}".format(dialect))
@@ -0,0 +1,180 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_PARAMETERS_LENGTH = 500
+
+_thread_local = threading.local()
+
+_QUERY_START_TIMES_KEY = 'query_start_times'
+
+# bind parameters of the supported drivers: %(name)s (psycopg2), ? (sqlite), :name
+_PARAMETER_PATTERN = re.compile(r'%\(\w+\)s|%s|\?|(?<!:):\w+')
+_STRING_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_PATTERN = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMETER_LIST_PATTERN = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def get_statement_fingerprint(statement: str) -> str:
+    """Normalises the statement, replacing parameters and literals with "?"
+    and lists of parameters (e.g. of IN) with "(?...)", in order to group similar statements.
+    """
+    fingerprint = _STRING_LITERAL_PATTERN.sub('?', statement)
+    fingerprint = _PARAMETER_PATTERN.sub('?', fingerprint)
+    fingerprint = _NUMBER_LITERAL_PATTERN.sub('?', fingerprint)
+    fingerprint = _WHITESPACE_PATTERN.sub(' ', fingerprint).strip()
+    return _PARAMETER_LIST_PATTERN.sub('(?...)', fingerprint)
+
+
+def get_parameter_count(parameters, executemany: bool) -> int:
+    if executemany:
+        return sum(get_parameter_count(p, False) for p in parameters or [])
+    return len(parameters or [])
+
+
+def format_parameters(parameters, max_length: int = DEFAULT_MAX_PARAMETERS_LENGTH) -> str:
+    formatted = repr(parameters)
+    if len(formatted) > max_length:
+        return '%s... (%d characters)' % (formatted[:max_length], len(formatted))
+    return formatted
+
+
+class StatementStats:
+    __slots__ = ('count', 'total_duration', 'max_duration', 'total_rows', 'max_parameter_count')
+
+    def __init__(self):
+        self.count = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.total_rows = 0
+        self.max_parameter_count = 0
+
+    def add(self, duration: float, row_count: Optional[int], parameter_count: int):
+        self.count += 1
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+        if row_count is not None and row_count > 0:
+            self.total_rows += row_count
+        self.max_parameter_count = max(self.max_parameter_count, parameter_count)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class QueryStatsCollector:
+    """Aggregates the executed statements by fingerprint (e.g. of a request or pipeline step).
+
+    A high count of the same fingerprint usually indicates an N+1 problem,
+    a high max_parameter_count a large IN list.
+    """
+
+    def __init__(self):
+        self.stats_by_fingerprint: Dict[str, StatementStats] = OrderedDict()
+
+    def add(self, statement: str, duration: float, row_count: Optional[int], parameter_count: int):
+        fingerprint = get_statement_fingerprint(statement)
+        stats = self.stats_by_fingerprint.get(fingerprint)
+        if stats is None:
+            stats = StatementStats()
+            self.stats_by_fingerprint[fingerprint] = stats
+        stats.add(duration, row_count, parameter_count)
+
+    @property
+    def query_count(self) -> int:
+        return sum(stats.count for stats in self.stats_by_fingerprint.values())
+
+    @property
+    def total_duration(self) -> float:
+        return sum(stats.total_duration for stats in self.stats_by_fingerprint.values())
+
+    def get_top_statements(self, limit: int = 5) -> List[dict]:
+        return [
+            {'fingerprint': fingerprint, **stats.to_dict()}
+            for fingerprint, stats in sorted(
+                self.stats_by_fingerprint.items(),
+                key=lambda item: -item[1].total_duration
+            )[:limit]
+        ]
+
+    def log_summary(
+            self, name: str, logger: logging.Logger = LOGGER, level: int = logging.INFO,
+            limit: int = 5):
+        logger.log(
+            level, '%s: %d queries (%d distinct) in %.3fs',
+            name, self.query_count, len(self.stats_by_fingerprint), self.total_duration
+        )
+        for statement in self.get_top_statements(limit=limit):
+            logger.log(
+                level,
+                '%s: %.3fs, count=%d, max=%.3fs, rows=%d, max parameters=%d: %s',
+                name, statement['total_duration'], statement['count'],
+                statement['max_duration'], statement['total_rows'],
+                statement['max_parameter_count'], statement['fingerprint']
+            )
+
+
+def get_current_query_stats_collector() -> Optional[QueryStatsCollector]:
+    return getattr(_thread_local, 'collector', None)
+
+
+def set_current_query_stats_collector(
+        collector: Optional[QueryStatsCollector]) -> Optional[QueryStatsCollector]:
+    """Sets the collector of the current thread, returns the previous one."""
+    previous_collector = get_current_query_stats_collector()
+    _thread_local.collector = collector
+    return previous_collector
+
+
+@contextmanager
+def collecting_query_stats():
+    collector = QueryStatsCollector()
+    previous_collector = set_current_query_stats_collector(collector)
+    try:
+        yield collector
+    finally:
+        set_current_query_stats_collector(previous_collector)
+
+
+def instrument_engine(
+        engine, slow_query_threshold: float = None,
+        max_parameters_length: int = DEFAULT_MAX_PARAMETERS_LENGTH):
+    """Records the executed statements in the query stats collector of the current thread
+    (if any) and logs statements taking at least slow_query_threshold seconds."""
+
+    def before_cursor_execute(conn, *_):
+        conn.info.setdefault(_QUERY_START_TIMES_KEY, []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, _context, executemany):
+        duration = time.perf_counter() - conn.info[_QUERY_START_TIMES_KEY].pop()
+        row_count = cursor.rowcount if cursor.rowcount >= 0 else None
+        collector = get_current_query_stats_collector()
+        if collector is not None:
+            collector.add(
+                statement, duration, row_count, get_parameter_count(parameters, executemany)
+            )
+        if slow_query_threshold is not None and duration >= slow_query_threshold:
+            LOGGER.warning(
+                'slow query (%.3fs, rows=%s): %s; parameters: %s',
+                duration, row_count, _WHITESPACE_PATTERN.sub(' ', statement).strip(),
+                format_parameters(parameters, max_length=max_parameters_length)
+            )
+
+    def handle_error(exception_context):
+        # after_cursor_execute won't be called for the failed statement
+        conn = exception_context.connection
+        if conn is not None and conn.info.get(_QUERY_START_TIMES_KEY):
+            conn.info[_QUERY_START_TIMES_KEY].pop()
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(engine, 'handle_error', handle_error)
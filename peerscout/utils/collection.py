@@ -1,5 +1,6 @@
 from collections import defaultdict
-from itertools import groupby
+from itertools import groupby, islice
+from typing import Iterable, List
 
 
 def flatten(l):
@@ -10,6 +11,15 @@ def iter_flatten(l):
     return (item for sublist in l for item in sublist)
 
 
+def iter_chunks(iterable: Iterable, chunk_size: int) -> Iterable[List]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def filter_none(l):
     return [item for item in l if item is not None]
 
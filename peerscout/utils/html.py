@@ -27,4 +27,7 @@ def strip_tags(text):
 
 
 def unescape_and_strip_tags(text):
+    if '&' not in text and '<' not in text:
+        # nothing to unescape or strip (avoids creating a parser for most values)
+        return text
     return strip_tags(html.unescape(text))
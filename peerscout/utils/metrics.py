@@ -0,0 +1,155 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Union
+
+
+DEFAULT_HISTOGRAM_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def format_metric_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def escape_label_value(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (key, escape_label_value(value))
+        for key, value in labels.items()
+    )
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._value = 0
+
+    @property
+    def value(self):
+        return self._value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def iter_prometheus_lines(self) -> Iterable[str]:
+        yield '# HELP %s %s' % (self.name, self.description)
+        yield '# TYPE %s counter' % self.name
+        yield '%s %s' % (self.name, format_metric_value(self._value))
+
+
+class _HistogramValues:
+    __slots__ = ('bucket_counts', 'sum', 'count')
+
+    def __init__(self, bucket_count: int):
+        self.bucket_counts = [0] * bucket_count
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Histogram, optionally partitioned by the value of a single label (e.g. the stage)."""
+
+    def __init__(
+            self, name: str, description: str, label_name: str = None,
+            buckets: Sequence[float] = DEFAULT_HISTOGRAM_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_name = label_name
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._lock = threading.Lock()
+        self._values_by_label_value: Dict[str, _HistogramValues] = {}
+
+    def observe(self, value: float, label_value: str = None):
+        bucket_index = bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values_by_label_value.get(label_value)
+            if values is None:
+                values = _HistogramValues(len(self.buckets))
+                self._values_by_label_value[label_value] = values
+            values.bucket_counts[bucket_index] += 1
+            values.sum += value
+            values.count += 1
+
+    def get_count(self, label_value: str = None) -> int:
+        values = self._values_by_label_value.get(label_value)
+        return values.count if values is not None else 0
+
+    def _get_labels(self, label_value: str) -> dict:
+        return {self.label_name: label_value} if self.label_name else {}
+
+    def iter_prometheus_lines(self) -> Iterable[str]:
+        yield '# HELP %s %s' % (self.name, self.description)
+        yield '# TYPE %s histogram' % self.name
+        with self._lock:
+            values_by_label_value = sorted(
+                (
+                    label_value,
+                    list(values.bucket_counts), values.sum, values.count
+                )
+                for label_value, values in self._values_by_label_value.items()
+            )
+        for label_value, bucket_counts, values_sum, values_count in values_by_label_value:
+            labels = self._get_labels(label_value)
+            cumulative_count = 0
+            for bucket, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative_count += bucket_count
+                yield '%s_bucket%s %d' % (
+                    self.name,
+                    format_labels({**labels, 'le': format_metric_value(bucket)}),
+                    cumulative_count
+                )
+            yield '%s_sum%s %s' % (
+                self.name, format_labels(labels), format_metric_value(values_sum)
+            )
+            yield '%s_count%s %d' % (self.name, format_labels(labels), values_count)
+
+
+Metric = Union[Counter, Histogram]
+
+
+class MetricsRegistry:
+    """Process local metrics, exposed in the Prometheus text format.
+
+    Note: with pre-forked workers, each worker process reports its own metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: List[Metric] = []
+
+    def _register(self, metric):
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError('metric already registered: %s' % metric.name)
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._register(Counter(name, description))
+
+    def histogram(
+            self, name: str, description: str, label_name: str = None,
+            buckets: Sequence[float] = DEFAULT_HISTOGRAM_BUCKETS) -> Histogram:
+        return self._register(Histogram(
+            name, description, label_name=label_name, buckets=buckets
+        ))
+
+    def to_prometheus_text(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        return ''.join(
+            line + '\n'
+            for metric in metrics
+            for line in metric.iter_prometheus_lines()
+        )
@@ -1,3 +1,7 @@
+import math
+from typing import Iterable
+
+import numpy as np
 import pandas as pd
 
 
@@ -51,8 +55,42 @@ def groupby_agg_droplevel(df, groupby_columns, agg_param):
     return df
 
 
+def is_null_value(value) -> bool:
+    """Scalar alternative to pd.isnull (None, NaN or NaT), other values (e.g. lists) aren't null."""
+    return value is None or value is pd.NaT or (isinstance(value, float) and math.isnan(value))
+
+
+def _replace_null_with_none_in_series(series: pd.Series) -> np.ndarray:
+    # (Series.astype rather than ndarray.astype, which would convert datetime64 to int)
+    values = series.astype(object).values
+    null_mask = series.isnull().values
+    if null_mask.any():
+        values[null_mask] = None
+    return values
+
+
 def replace_null_with_none(df: pd.DataFrame) -> pd.DataFrame:
     """Replaces pandas null (NaN, NaT, None) with None.
     The effect is that the column type will be changed to object.
+
+    The columns are converted one at a time, rather than creating temporary copies of the
+    whole frame (prefer iter_records or native dtypes for large frames).
+    """
+    values = np.empty(df.shape, dtype=object)
+    for i in range(df.shape[1]):
+        values[:, i] = _replace_null_with_none_in_series(df.iloc[:, i])
+    return pd.DataFrame(values, index=df.index, columns=df.columns, dtype=object)
+
+
+def iter_records(df: pd.DataFrame) -> Iterable[dict]:
+    """Yields the rows as dicts (e.g. for a bulk insert), with pandas nulls replaced by None.
+
+    Unlike replace_null_with_none(df).to_dict(orient='records'), only one row at a time is
+    converted and the frame keeps its native dtypes.
     """
-    return df.astype(object).where((pd.notnull(df)), None)
+    columns = list(df.columns)
+    for row in df.itertuples(index=False, name=None):
+        yield {
+            column: None if is_null_value(value) else value
+            for column, value in zip(columns, row)
+        }
@@ -1,4 +1,5 @@
 import threading
+from concurrent.futures import Future
 
 
 def lazy_thread_local(constructor):
@@ -11,3 +12,43 @@ def lazy_thread_local(constructor):
             data.value = constructor()
             return data.value
     return lazy_getter
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into a single call.
+
+    Callers arriving while a call for the same key is in flight wait for it
+    and receive its result (or exception), rather than calling the function again.
+    on_coalesced (if any) is called for every such coalesced call.
+    """
+
+    def __init__(self, on_coalesced=None):
+        self._lock = threading.Lock()
+        self._future_by_key = {}
+        self._on_coalesced = on_coalesced
+        self.coalesced_count = 0
+
+    def __call__(self, key, fn):
+        with self._lock:
+            future = self._future_by_key.get(key)
+            if future is not None:
+                self.coalesced_count += 1
+                is_leader = False
+            else:
+                future = Future()
+                self._future_by_key[key] = future
+                is_leader = True
+        if not is_leader:
+            if self._on_coalesced is not None:
+                self._on_coalesced()
+            return future.result()
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._future_by_key[key]
@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Optional
+
+
+_thread_local = threading.local()
+
+
+class TimingCollector:
+    """Collects the total duration (in seconds) by stage name, in the order the stages started.
+
+    Durations of nested stages are also included in the duration of the outer stage.
+    """
+
+    def __init__(self):
+        self.duration_by_stage: Dict[str, float] = OrderedDict()
+
+    def add(self, stage: str, duration: float):
+        self.duration_by_stage[stage] = self.duration_by_stage.get(stage, 0.0) + duration
+
+
+class _TimingSpan:
+    __slots__ = ('_collector', '_stage', '_start')
+
+    def __init__(self, collector: TimingCollector, stage: str):
+        self._collector = collector
+        self._stage = stage
+        self._start = None
+
+    def __enter__(self):
+        self._collector.duration_by_stage.setdefault(self._stage, 0.0)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self._collector.add(self._stage, time.perf_counter() - self._start)
+        return False
+
+
+class _NullTimingSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+_NULL_TIMING_SPAN = _NullTimingSpan()
+
+
+def get_current_timing_collector() -> Optional[TimingCollector]:
+    return getattr(_thread_local, 'collector', None)
+
+
+def timing_span(stage: str):
+    """Returns a context manager timing the stage, if timings are being collected
+    in the current thread (otherwise it does nothing)."""
+    collector = get_current_timing_collector()
+    if collector is None:
+        return _NULL_TIMING_SPAN
+    return _TimingSpan(collector, stage)
+
+
+def timed(stage: str):
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with timing_span(stage):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def collecting_timings():
+    previous_collector = get_current_timing_collector()
+    collector = TimingCollector()
+    _thread_local.collector = collector
+    try:
+        yield collector
+    finally:
+        _thread_local.collector = previous_collector
@@ -0,0 +1,58 @@
+import pytest
+import sqlalchemy
+
+from peerscout.shared.database import Database
+from peerscout.shared.database_bulk_load import BulkLoadMethods
+
+from peerscout.benchmarks.bulk_load import (
+    BulkLoadPaths,
+    generate_frames,
+    get_supported_methods,
+    run_benchmark
+)
+
+
+@pytest.fixture(name='db')
+def _db():
+    db = Database(sqlalchemy.create_engine('sqlite://', echo=False))
+    db.update_schema()
+    yield db
+    db.close()
+
+
+class TestGenerateFrames:
+    def test_should_generate_stages_with_unique_primary_key(self):
+        stage_df = generate_frames(100)['manuscript_stage']
+        assert len(stage_df) == 100
+        assert not stage_df.duplicated(
+            ['version_id', 'person_id', 'stage_timestamp', 'stage_name']
+        ).any()
+
+
+class TestGetSupportedMethods:
+    def test_should_only_support_executemany_on_sqlite(self):
+        assert get_supported_methods('sqlite') == [BulkLoadMethods.EXECUTEMANY]
+
+    def test_should_support_copy_on_postgresql(self):
+        assert get_supported_methods('postgresql') == [
+            BulkLoadMethods.EXECUTEMANY, BulkLoadMethods.COPY
+        ]
+
+
+@pytest.mark.slow
+class TestRunBenchmark:
+    def test_should_load_all_rows_for_each_method(self, db):
+        results = run_benchmark(db, generate_frames(100), [BulkLoadMethods.EXECUTEMANY])
+        assert [(r['method'], r['path'], r['rows']) for r in results] == [
+            (BulkLoadMethods.EXECUTEMANY, BulkLoadPaths.WRITE_FRAME, 100),
+            (BulkLoadMethods.EXECUTEMANY, BulkLoadPaths.STAGED_UPSERT, 100)
+        ]
+        assert all(r['rows_per_second'] > 0 for r in results)
+        assert db.manuscript_stage.count() == 100
+
+    def test_should_replace_previously_loaded_rows(self, db):
+        frames = generate_frames(100)
+        run_benchmark(db, frames, [BulkLoadMethods.EXECUTEMANY])
+        run_benchmark(db, frames, [BulkLoadMethods.EXECUTEMANY])
+        assert db.person.count() == len(frames['person'])
+        assert db.manuscript_stage.count() == 100
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+import sqlalchemy
+
+from peerscout.shared.database import Database
+
+from peerscout.benchmarks.data_import import (
+    generate_stage,
+    get_stages,
+    import_xml_stage,
+    parse_args,
+    prepare_database,
+    run_benchmark,
+    run_in_separate_process
+)
+
+
+def _return_row_count():
+    return 123
+
+
+def _fail():
+    raise RuntimeError('stage failed')
+
+
+class TestRunInSeparateProcess:
+    def test_should_return_rows_duration_and_peak_memory(self):
+        result = run_in_separate_process(_return_row_count)
+        assert result['rows'] == 123
+        assert result['duration'] >= 0
+        assert result['peak_memory'] > 0
+
+    def test_should_raise_error_of_failed_stage(self):
+        with pytest.raises(Exception, match='stage failed'):
+            run_in_separate_process(_fail)
+
+
+@pytest.mark.slow
+class TestRunBenchmark:
+    def test_should_import_generated_dataset(self, tmpdir):
+        data_dir = str(tmpdir)
+        database_url = 'sqlite:///%s' % os.path.join(data_dir, 'test.db')
+        args = parse_args([
+            '--manuscripts=5', '--manuscripts-per-zip=2', '--zips-per-commit=2', '--reimport'
+        ])
+        prepare_database(database_url)
+        results = run_benchmark(get_stages(args, database_url, data_dir))
+        rows_by_stage = {r['stage']: r['rows'] for r in results}
+        assert list(rows_by_stage.keys()) == [
+            'generate', 'importDataToDatabase', 'importDataToDatabase (unchanged)',
+            'refresh_materialized_views', 'convertEditorsCsv',
+            'import_editor_roles_and_keywords_csv', 'importEarlyCareerResearchersCsv'
+        ]
+        assert rows_by_stage['generate'] == 5
+        assert rows_by_stage['importDataToDatabase'] > 0
+        assert (
+            rows_by_stage['importDataToDatabase (unchanged)'] ==
+            rows_by_stage['importDataToDatabase']
+        )
+
+        db = Database(sqlalchemy.create_engine(database_url, echo=False))
+        try:
+            assert db.manuscript.count() == 5
+        finally:
+            db.close()
+
+    def test_should_import_generated_dataset_staging_configured_tables(self, tmpdir):
+        data_dir = str(tmpdir)
+        database_url = 'sqlite:///%s' % os.path.join(data_dir, 'test.db')
+        prepare_database(database_url)
+        generate_stage(data_dir, 5, seed=0, manuscripts_per_zip=2)
+        row_count = import_xml_stage(
+            database_url, data_dir, staged_load=False, max_workers=1,
+            staged_load_tables='manuscript_stage, manuscript_author'
+        )
+        assert row_count > 0
+
+        db = Database(sqlalchemy.create_engine(database_url, echo=False))
+        try:
+            assert db.manuscript_author.count() > 0
+            assert db.manuscript_stage.count() > 0
+        finally:
+            db.close()
@@ -0,0 +1,50 @@
+import pytest
+
+from peerscout.utils.pandas import iter_records
+
+from peerscout.benchmarks.null_normalization import (
+    generate_frame,
+    get_variants,
+    measure,
+    run_benchmark
+)
+
+
+class TestGenerateFrame:
+    def test_should_generate_frame_with_nulls(self):
+        df = generate_frame(100)
+        assert len(df) == 100
+        assert df['score'].isnull().any()
+        assert df['timestamp'].isnull().any()
+
+
+class TestGetVariants:
+    def test_should_replace_nulls_with_none_in_all_record_variants(self):
+        df = generate_frame(100)
+        variants = get_variants()
+        expected_records = list(iter_records(df))
+        assert variants['records: astype(object).where'](df) == expected_records
+        assert variants['records: replace_null_with_none'](df) == expected_records
+        assert variants['records: iter_records (chunks)'](df) == len(df)
+
+    def test_should_replace_nulls_with_none_in_all_frame_variants(self):
+        df = generate_frame(100)
+        variants = get_variants()
+        assert variants['frame: astype(object).where'](df).equals(
+            variants['frame: replace_null_with_none'](df)
+        )
+
+
+class TestMeasure:
+    def test_should_measure_peak_memory_of_allocations(self):
+        result = measure(lambda df: [0] * 100000, generate_frame(10))
+        assert result['duration'] >= 0
+        assert result['peak_memory'] >= 100000 * 8
+
+
+@pytest.mark.slow
+class TestRunBenchmark:
+    def test_should_measure_all_variants(self):
+        results = run_benchmark(generate_frame(100))
+        assert [r['variant'] for r in results] == list(get_variants().keys())
+        assert all(r['peak_memory'] > 0 for r in results)
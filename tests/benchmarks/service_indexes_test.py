@@ -0,0 +1,58 @@
+import pytest
+import sqlalchemy
+
+from peerscout.shared.database import Database
+from peerscout.shared.database_schema import Person
+
+from peerscout.benchmarks.service_indexes import (
+    generate_frames,
+    get_service_queries,
+    load_frames,
+    run_benchmark
+)
+
+
+@pytest.fixture(name='db')
+def _db():
+    db = Database(sqlalchemy.create_engine('sqlite://', echo=False))
+    db.update_schema()
+    yield db
+    db.close()
+
+
+class TestGenerateFrames:
+    def test_should_generate_active_persons_with_email(self):
+        person_df = generate_frames(100)['person']
+        assert person_df['email'].notnull().all()
+        assert set(person_df['status']) == {Person.Status.ACTIVE}
+
+    def test_should_generate_unique_keywords(self):
+        person_keyword_df = generate_frames(100)['person_keyword']
+        assert len(person_keyword_df) > 0
+        assert not person_keyword_df.duplicated().any()
+
+
+@pytest.mark.slow
+class TestGetServiceQueries:
+    def test_should_return_same_results_with_and_without_indexes(self, db):
+        frames = generate_frames(200)
+        load_frames(db, frames)
+        queries = get_service_queries(db, frames)
+        results_with_indexes = {name: query_fn() for name, query_fn in queries.items()}
+        db.drop_indexes()
+        results_without_indexes = {name: query_fn() for name, query_fn in queries.items()}
+        assert results_without_indexes == results_with_indexes
+        assert results_with_indexes['stage person ids by version ids']
+
+
+@pytest.mark.slow
+class TestRunBenchmark:
+    def test_should_time_all_queries_and_restore_indexes(self, db):
+        frames = generate_frames(100)
+        results = run_benchmark(db, frames, repeat=1)
+        assert [r['query'] for r in results] == list(get_service_queries(db, frames).keys())
+        assert all(
+            r['without_indexes'] >= 0 and r['with_indexes'] >= 0
+            for r in results
+        )
+        assert db.create_missing_indexes() == []
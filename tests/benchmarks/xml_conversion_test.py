@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from lxml.builder import E
+
+from peerscout.preprocessing.importDataToDatabase import TableOperationRecorders
+
+from peerscout.benchmarks.xml_conversion import (
+    get_variants,
+    load_scaled_xml_contents,
+    run_benchmark,
+    scale_xml_root
+)
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'preprocessing', 'test_data')
+XML_FILE = os.path.join(TEST_DATA_DIR, 'regular-00001.xml')
+
+
+def _get_sorted_operations(fn, contents):
+    tables = TableOperationRecorders()
+    for manuscript_number, content in contents:
+        fn(content, tables, manuscript_number)
+    return sorted(repr(operation) for operation in tables.operations)
+
+
+class TestScaleXmlRoot:
+    def test_should_repeat_versions_and_persons_with_distinct_keys(self):
+        root = scale_xml_root(E.xml(
+            E.manuscript(E.version(E.key('00001|0'))),
+            E.people(E.person(E('person-id', 'person1')))
+        ), 3)
+        assert [key.text for key in root.findall('manuscript/version/key')] == [
+            '00001|0', '00001|1', '00001|2'
+        ]
+        assert [key.text for key in root.findall('people/person/person-id')] == [
+            'person1', 'person1-1', 'person1-2'
+        ]
+
+
+class TestLoadScaledXmlContents:
+    def test_should_use_manuscript_number_of_filename(self):
+        contents = load_scaled_xml_contents([XML_FILE], 2)
+        assert [manuscript_number for manuscript_number, _ in contents] == ['regular-00001']
+
+
+@pytest.mark.slow
+class TestGetVariants:
+    def test_should_convert_to_the_same_operations(self):
+        contents = load_scaled_xml_contents([XML_FILE], 2)
+        operations_by_variant = {
+            name: _get_sorted_operations(fn, contents)
+            for name, fn in get_variants().items()
+        }
+        baseline_operations = operations_by_variant.pop('convert_xml (parsed tree)')
+        assert baseline_operations
+        for operations in operations_by_variant.values():
+            assert operations == baseline_operations
+
+
+@pytest.mark.slow
+class TestRunBenchmark:
+    def test_should_time_all_variants(self):
+        contents = load_scaled_xml_contents([XML_FILE], 2)
+        results = run_benchmark(contents, repeat=1)
+        assert [r['variant'] for r in results] == list(get_variants().keys())
+        assert {r['operation_count'] for r in results} == {
+            len(_get_sorted_operations(get_variants()['convert_xml (parsed tree)'], contents))
+        }
@@ -0,0 +1,90 @@
+import csv
+import io
+
+import pytest
+
+from peerscout.preprocessing.convertMboxFiles import convert_mbox_file
+from peerscout.preprocessing.mbox_parser import (
+    find_message_shard_boundaries,
+    iter_message_header_lines,
+    parse_header_properties,
+    split_messages_skip_content
+)
+
+FIELDNAMES = ['From', 'Subject', 'Message-ID']
+
+
+def _mbox_content(message_count):
+    return b''.join(
+        (
+            b'From sender%d@example.org Mon Jan  1 00:00:00 2018\n'
+            b'From: Sender %d <sender%d@example.org>\r\n'
+            b'Subject: Subject %d\n'
+            b'Message-ID: <message%d@example.org>\n'
+            b'X-Other: other\n'
+            b'\n'
+            b'content line 1\n'
+            b'\n'
+            b'content line 2, From the content\n'
+        ) % (i, i, i, i, i)
+        for i in range(message_count)
+    )
+
+
+def _convert_to_csv(filename, stream, **kwargs):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FIELDNAMES, extrasaction='ignore')
+    convert_mbox_file(filename, stream, writer, FIELDNAMES, **kwargs)
+    return out.getvalue()
+
+
+class TestIterMessageHeaderLines:
+    @pytest.mark.parametrize('shard_count', [1, 2, 3, 10])
+    def test_should_yield_same_header_lines_as_split_messages(self, shard_count):
+        content = b'ignored line\n' + _mbox_content(10) + b'From last\nSubject: last'
+        boundaries = find_message_shard_boundaries(content, shard_count)
+        assert len(boundaries) == shard_count + 1
+        assert [
+            [bytes(line) for line in lines]
+            for start, end in zip(boundaries, boundaries[1:])
+            for lines in iter_message_header_lines(content, start, end)
+        ] == list(split_messages_skip_content(io.BytesIO(content)))
+
+    def test_should_parse_memoryview_header_lines(self):
+        assert [
+            dict(parse_header_properties(lines, required_keys=FIELDNAMES))
+            for lines in iter_message_header_lines(_mbox_content(1))
+        ] == [{
+            'From': 'Sender 0 <sender0@example.org>',
+            'Subject': 'Subject 0',
+            'Message-ID': '<message0@example.org>'
+        }]
+
+
+class TestFindMessageShardBoundaries:
+    def test_should_only_split_at_message_start_lines(self):
+        content = _mbox_content(3)
+        boundaries = find_message_shard_boundaries(content, 10)
+        assert boundaries[0] == 0
+        assert boundaries[-1] == len(content)
+        assert all(
+            content[position:].startswith(b'From sender')
+            for position in boundaries[1:-1]
+        )
+
+
+@pytest.mark.slow
+class TestConvertMboxFile:
+    def test_should_write_same_csv_using_worker_processes(self, tmpdir):
+        mbox_file = tmpdir.join('test.mbox')
+        mbox_file.write_binary(_mbox_content(100))
+        with open(str(mbox_file), 'rb') as stream:
+            expected = _convert_to_csv('test.mbox', stream)
+        with open(str(mbox_file), 'rb') as stream:
+            assert _convert_to_csv('test.mbox', stream, max_workers=2) == expected
+        assert 'Subject 99' in expected
+
+    def test_should_convert_stream_without_file_serially(self):
+        assert 'Subject 1' in _convert_to_csv(
+            'test.mbox', io.BytesIO(_mbox_content(2)), max_workers=2
+        )
@@ -1,10 +1,16 @@
 from datetime import datetime
 import os
+import zipfile
 from unittest.mock import Mock
 
+import pandas as pd
+
+from peerscout.preprocessing import convertUtils as convertUtilsModule
 from peerscout.preprocessing.convertUtils import (
     sort_relative_filenames_by_file_modified_time,
-    process_files_in_directory
+    process_files_in_directory,
+    process_files_in_zip_after_inspecting,
+    TableOutput
 )
 
 FILE_1 = 'file1.dummy'
@@ -40,3 +46,70 @@ class TestProcessFilesInDirectory:
         process_files_in_directory(str(tmpdir), process_file)
         filename_args = [a[0][0] for a in process_file.call_args_list]
         assert filename_args == [FILE_2, FILE_1]
+
+
+class TestProcessFilesInZipAfterInspecting:
+    def test_should_pass_inspect_result_and_stream_from_start(self, tmpdir):
+        zip_path = str(tmpdir.join('test.zip'))
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            zf.writestr(FILE_1, b'content 1')
+            zf.writestr(FILE_2, b'content 2')
+
+        results = []
+        process_files_in_zip_after_inspecting(
+            zip_path,
+            lambda filename, stream: len(stream.read()),
+            lambda filename, stream, size: results.append((filename, size, stream.read()))
+        )
+        assert results == [(FILE_1, 9, b'content 1'), (FILE_2, 9, b'content 2')]
+
+
+class TestTableOutput:
+    def test_should_fill_missing_values_with_none(self):
+        table = TableOutput(name='test')
+        table.append({'a': 'a1'})
+        table.append({'b': 'b2'})
+        assert table.to_frame().to_dict(orient='records') == [
+            {'a': 'a1', 'b': None},
+            {'a': None, 'b': 'b2'}
+        ]
+
+    def test_should_infer_column_dtypes(self):
+        table = TableOutput(name='test')
+        table.append({'id': 'id1', 'count': 1, 'timestamp': pd.Timestamp('2017-01-01')})
+        df = table.to_frame()
+        assert df['id'].dtype == object
+        assert df['count'].dtype == 'int64'
+        assert df['timestamp'].dtype == 'datetime64[ns]'
+
+    def test_should_remove_rows_by_alternating_properties(self):
+        table = TableOutput(name='test')
+        table.append({'version_id': 'v1', 'person_id': 'p1'})
+        table.append({'version_id': 'v2', 'person_id': 'p1'})
+        table.append({'version_id': 'v1', 'person_id': 'p2'})
+        table.append({'version_id': 'v3', 'person_id': 'p3'})
+        table.remove_where_property_is('version_id', 'v1')
+        table.append({'version_id': 'v4', 'person_id': 'p1'})
+        table.remove_where_property_is('person_id', 'p1')
+        assert table.to_frame().to_dict(orient='records') == [
+            {'version_id': 'v3', 'person_id': 'p3'}
+        ]
+        assert len(table) == 1
+
+    def test_should_keep_rows_after_compacting(self, monkeypatch):
+        monkeypatch.setattr(convertUtilsModule, 'MIN_REMOVED_ROW_COUNT_TO_COMPACT', 2)
+        table = TableOutput(name='test')
+        for i, id_value in enumerate([0, 0, 1]):
+            table.append({'id': id_value, 'value': i})
+        table.remove_where_property_is('id', 0)
+        assert table.row_count == 1
+        table.append({'id': 0, 'value': 3})
+        table.remove_where_property_is('id', 1)
+        assert table.to_frame().to_dict(orient='records') == [{'id': 0, 'value': 3}]
+
+    def test_should_include_header_in_matrix(self):
+        table = TableOutput(name='test')
+        table.append({'a': 'a1', 'b': 'b1'})
+        table.append({'a': 'a2', 'b': 'b2'})
+        table.remove_where_property_is('a', 'a1')
+        assert table.matrix().tolist() == [['a', 'b'], ['a2', 'b2']]
@@ -5,24 +5,46 @@ import zipfile
 import io
 import os
 from contextlib import contextmanager
+from functools import partial
 import logging
 from unittest.mock import patch, ANY
+from xml.etree import ElementTree
 
+import pandas as pd
 import pytest
 
 from lxml import etree
 from lxml.builder import E
 
+import peerscout.shared.database as database_module
 from peerscout.shared.database import empty_in_memory_database
+from peerscout.shared.database_bulk_load import DEFAULT_STAGED_LOAD_TABLE_NAMES
 
 from peerscout.preprocessing import importDataToDatabase as importDataToDatabaseModule
+from peerscout.preprocessing.convertUtils import (
+    parse_xml_file,
+    process_files_in_zip,
+    process_files_in_zip_in_parallel
+)
 from peerscout.preprocessing.importDataToDatabase import (
+    BatchedZipImport,
     default_field_mapping_by_table_name,
+    compile_xml_converter,
+    convert_xml,
+    convert_xml_file_contents,
+    convert_xml_file_contents_to_table_operations,
+    convert_xml_file_stream_to_hashed_table_operations,
+    convert_xml_stream,
     convert_zip_file,
+    create_table_outputs,
     extract_person_keywords_from_person_node,
+    iter_xml_tree_events,
     parse_keyword_str,
+    replay_table_operations,
+    TableOperationRecorders,
     NoteTypes
 )
+from peerscout.preprocessing.synthetic_data import PersonPools, generate_manuscript_xml_root
 
 from ..test_utils import log_on_exception
 
@@ -80,14 +102,14 @@ def zip_for_xml(xml_roots):
     return zip_stream
 
 
-def convert_zip_stream(db, zip_stream):
+def convert_zip_stream(db, zip_stream, **kwargs):
     field_mapping_by_table_name = default_field_mapping_by_table_name
     early_career_researcher_person_ids = set()
 
     get_logger().info('zip_stream: %s', zip_stream)
-    convert_zip_file(
+    return convert_zip_file(
         'dummy.zip', zip_stream, db, field_mapping_by_table_name,
-        early_career_researcher_person_ids
+        early_career_researcher_person_ids, **kwargs
     )
 
 
@@ -98,14 +120,24 @@ def _person_xml_node_by_id(xml_root, person_id):
 
 
 @contextmanager
-def empty_database_and_convert_zip_stream(zip_stream):
+def empty_database_and_convert_zip_stream(zip_stream, **kwargs):
     with empty_in_memory_database() as db:
-        convert_zip_stream(db, zip_stream)
+        convert_zip_stream(db, zip_stream, **kwargs)
         yield db
 
 
-def empty_database_and_convert_files(filenames):
-    return empty_database_and_convert_zip_stream(zip_for_files(filenames))
+def empty_database_and_convert_files(filenames, **kwargs):
+    return empty_database_and_convert_zip_stream(zip_for_files(filenames), **kwargs)
+
+
+def _read_all_frames(db):
+    return {
+        table_name: db[table_name].read_frame().reset_index().sort_values(
+            [c.name for c in db[table_name].primary_key]
+        ).reset_index(drop=True)
+        for table_name in db.sorted_table_names()
+        if table_name != 'import_processed'
+    }
 
 
 @pytest.mark.slow
@@ -269,6 +301,91 @@ class TestConvertZipFile:
                 {(AUTHOR_1_ID, ROLE_1), (AUTHOR_1_ID, ROLE_2)}
             )
 
+    def test_should_remove_person_roles_no_longer_present_on_reimport(self, logger):
+        xml_root = etree.parse(os.path.join(TEST_DATA_DIR, 'regular-00001.xml')).getroot()
+        author1 = _person_xml_node_by_id(xml_root, AUTHOR_1_ID)
+        roles = E.roles(
+            E.role(E('role-type', ROLE_1)),
+            E.role(E('role-type', ROLE_2))
+        )
+        author1.append(roles)
+        with empty_database_and_convert_zip_stream(zip_for_xml([xml_root])) as db:
+            roles.remove(roles[1])
+            convert_zip_file(
+                'dummy.zip', zip_for_xml([xml_root]), db, default_field_mapping_by_table_name,
+                set(), skip_if_processed=False
+            )
+            df = db.person_role.read_frame().reset_index()
+            logger.debug('df:\n%s', df)
+            assert {*zip(df[PERSON_ID], df['role'])} == {(AUTHOR_1_ID, ROLE_1)}
+
+    def test_should_mark_review_stats_of_persons_with_stages_for_refresh(self):
+        with empty_database_and_convert_files(['regular-00001.xml']) as db:
+            # reviewer2 isn't a known person, their stages won't be imported
+            assert [
+                r.person_id for r in db.person_review_stats_refresh.get_all()
+            ] == ['reviewer1']
+            assert db.person_review_stats_overall.count() == 0
+            assert db.refresh_materialized_views() == 1
+            assert list(db.person_review_stats_overall.read_frame().index) == ['reviewer1']
+            assert db.person_review_stats_refresh.count() == 0
+
+    def test_should_import_the_same_data_using_staged_load(self):
+        with empty_database_and_convert_files(['regular-00001.xml']) as db:
+            expected_frames = _read_all_frames(db)
+        with empty_database_and_convert_files(['regular-00001.xml'], staged_load=True) as db:
+            actual_frames = _read_all_frames(db)
+        assert actual_frames.keys() == expected_frames.keys()
+        for table_name, expected_df in expected_frames.items():
+            pd.testing.assert_frame_equal(
+                actual_frames[table_name], expected_df, obj=table_name
+            )
+
+    def test_should_remove_person_roles_no_longer_present_on_staged_reimport(self):
+        xml_root = etree.parse(os.path.join(TEST_DATA_DIR, 'regular-00001.xml')).getroot()
+        author1 = _person_xml_node_by_id(xml_root, AUTHOR_1_ID)
+        roles = E.roles(
+            E.role(E('role-type', ROLE_1)),
+            E.role(E('role-type', ROLE_2))
+        )
+        author1.append(roles)
+        with empty_database_and_convert_zip_stream(
+                zip_for_xml([xml_root]), staged_load=True) as db:
+            roles.remove(roles[1])
+            convert_zip_stream(
+                db, zip_for_xml([xml_root]), skip_if_processed=False, staged_load=True
+            )
+            df = db.person_role.read_frame().reset_index()
+            assert {*zip(df[PERSON_ID], df['role'])} == {(AUTHOR_1_ID, ROLE_1)}
+
+    def test_should_import_the_same_data_staging_configured_tables_only(self):
+        with empty_database_and_convert_files(['regular-00001.xml']) as db:
+            expected_frames = _read_all_frames(db)
+        with empty_in_memory_database() as db:
+            db.staged_load_table_names = DEFAULT_STAGED_LOAD_TABLE_NAMES
+            row_counts_by_table_name = convert_zip_stream(
+                db, zip_for_files(['regular-00001.xml'])
+            )
+            actual_frames = _read_all_frames(db)
+        assert row_counts_by_table_name['manuscript_author']['staged'] == 2
+        assert row_counts_by_table_name['manuscript_version']['inserted'] == 1
+        for table_name, expected_df in expected_frames.items():
+            pd.testing.assert_frame_equal(
+                actual_frames[table_name], expected_df, obj=table_name
+            )
+
+    def test_should_remove_authors_no_longer_present_on_reimport_staging_configured_tables(
+            self):
+        xml_root = etree.parse(os.path.join(TEST_DATA_DIR, 'regular-00001.xml')).getroot()
+        authors = xml_root.find('.//authors')
+        with empty_in_memory_database() as db:
+            db.staged_load_table_names = DEFAULT_STAGED_LOAD_TABLE_NAMES
+            convert_zip_stream(db, zip_for_xml([xml_root]))
+            authors.remove(authors[1])
+            convert_zip_stream(db, zip_for_xml([xml_root]), skip_if_processed=False)
+            df = db.manuscript_author.read_frame().reset_index()
+            assert list(df[PERSON_ID]) == [AUTHOR_1_ID]
+
     def test_should_import_multiple_person_keywords(self, logger):
         with patch.object(
                 importDataToDatabaseModule, 'extract_person_keywords_from_person_node'
@@ -291,6 +408,420 @@ class TestConvertZipFile:
                 )
 
 
+def _sum_row_counts(row_counts_by_table_name, name):
+    return sum(row_counts[name] for row_counts in row_counts_by_table_name.values())
+
+
+@pytest.mark.slow
+class TestRowChangeDetection:
+    def _reimport(self, db, zip_stream):
+        return convert_zip_stream(
+            db, zip_stream, skip_if_processed=False, skip_unchanged_files=False
+        )
+
+    def test_should_count_inserted_rows_on_first_import(self):
+        with empty_in_memory_database() as db:
+            row_counts_by_table_name = convert_zip_stream(
+                db, zip_for_files(['regular-00001.xml'])
+            )
+            assert row_counts_by_table_name['manuscript_version']['inserted'] == 1
+            assert _sum_row_counts(row_counts_by_table_name, 'updated') == 0
+            assert _sum_row_counts(row_counts_by_table_name, 'unchanged') == 0
+
+    def test_should_not_write_unchanged_rows_on_reimport(self):
+        with empty_database_and_convert_files(['regular-00001.xml']) as db:
+            expected_frames = _read_all_frames(db)
+            with patch.object(
+                    database_module.Entity, 'update_or_create_list',
+                    autospec=True) as update_or_create_list_mock:
+                row_counts_by_table_name = self._reimport(
+                    db, zip_for_files(['regular-00001.xml'])
+                )
+                # only the pending review stats refresh is recorded
+                assert {
+                    c[0][0].table.__tablename__ for c in update_or_create_list_mock.call_args_list
+                } == {'person_review_stats_refresh'}
+            assert _sum_row_counts(row_counts_by_table_name, 'unchanged') > 0
+            for name in ['inserted', 'updated', 'deleted']:
+                assert _sum_row_counts(row_counts_by_table_name, name) == 0
+            actual_frames = _read_all_frames(db)
+            for table_name, expected_df in expected_frames.items():
+                pd.testing.assert_frame_equal(
+                    actual_frames[table_name], expected_df, obj=table_name
+                )
+
+    def test_should_only_update_changed_rows(self):
+        xml_root = etree.parse(os.path.join(TEST_DATA_DIR, 'regular-00001.xml')).getroot()
+        with empty_database_and_convert_zip_stream(zip_for_xml([xml_root])) as db:
+            xml_root.find('manuscript/version/title').text = 'updated title'
+            row_counts_by_table_name = self._reimport(db, zip_for_xml([xml_root]))
+            assert row_counts_by_table_name['manuscript_version']['updated'] == 1
+            assert _sum_row_counts(row_counts_by_table_name, 'updated') == 1
+            assert set(db.manuscript_version.read_frame()['title']) == {'updated title'}
+
+    def test_should_count_deleted_rows_no_longer_present(self):
+        xml_root = etree.parse(os.path.join(TEST_DATA_DIR, 'regular-00001.xml')).getroot()
+        author1 = _person_xml_node_by_id(xml_root, AUTHOR_1_ID)
+        roles = E.roles(
+            E.role(E('role-type', ROLE_1)),
+            E.role(E('role-type', ROLE_2))
+        )
+        author1.append(roles)
+        with empty_database_and_convert_zip_stream(zip_for_xml([xml_root])) as db:
+            roles.remove(roles[1])
+            row_counts_by_table_name = self._reimport(db, zip_for_xml([xml_root]))
+            assert row_counts_by_table_name['person_role'] == {
+                'inserted': 0, 'updated': 0, 'deleted': 1, 'unchanged': 1
+            }
+            df = db.person_role.read_frame().reset_index()
+            assert {*zip(df[PERSON_ID], df['role'])} == {(AUTHOR_1_ID, ROLE_1)}
+
+
+def _process_synthetic_zip(batched_zip_import, db, manuscript_index, fail=False):
+    zip_filename = 'synthetic-%d.zip' % manuscript_index
+    zip_stream = io.BytesIO()
+    with zipfile.ZipFile(zip_stream, 'w') as zf:
+        zf.writestr('%d.xml' % manuscript_index, ElementTree.tostring(
+            generate_manuscript_xml_root(manuscript_index, PersonPools(10), seed=0)
+        ))
+    zip_stream.seek(0)
+
+    def process_zip():
+        result = convert_zip_file(
+            zip_filename, zip_stream, db, default_field_mapping_by_table_name,
+            early_career_researcher_person_ids=set(), commit=False
+        )
+        if fail:
+            raise RuntimeError('failed')
+        return result
+
+    return batched_zip_import.process(zip_filename, process_zip)
+
+
+@pytest.mark.slow
+class TestBatchedZipImport:
+    def test_should_commit_after_every_n_zip_files(self):
+        with empty_in_memory_database() as db:
+            with patch.object(db, 'commit', wraps=db.commit) as commit_mock:
+                batched_zip_import = BatchedZipImport(db, zips_per_commit=2)
+                for manuscript_index in range(3):
+                    _process_synthetic_zip(batched_zip_import, db, manuscript_index)
+                assert commit_mock.call_count == 1
+                batched_zip_import.finish()
+                assert commit_mock.call_count == 2
+            assert db.manuscript.count() == 3
+
+    def test_should_roll_back_failed_zip_file_and_commit_previous_zip_files(self):
+        with empty_in_memory_database() as db:
+            batched_zip_import = BatchedZipImport(db, zips_per_commit=0)
+            assert _process_synthetic_zip(batched_zip_import, db, 0)
+            with pytest.raises(RuntimeError):
+                _process_synthetic_zip(batched_zip_import, db, 1, fail=True)
+            db.session.rollback()
+            assert db.manuscript.count() == 1
+            assert {
+                p.import_processed_id for p in db.import_processed.get_all()
+            } == {'synthetic-0.zip'}
+
+
+def _write_zip_with_author_first_name(zip_path, first_name):
+    xml_root = etree.parse(os.path.join(TEST_DATA_DIR, 'regular-00001.xml')).getroot()
+    xml_root.find(".//person[person-id='%s']/first-name" % AUTHOR_1_ID).text = first_name
+    with open(zip_path, 'wb') as f:
+        f.write(zip_for_xml([xml_root]).getvalue())
+
+
+@contextmanager
+def _unmanaged_database(db):
+    yield db
+
+
+@pytest.mark.slow
+class TestMain:
+    def test_should_not_import_newer_zip_files_after_failed_zip_file(self, tmpdir):
+        first_names = ['First', 'Failed', 'Newer']
+        for i, first_name in enumerate(first_names):
+            zip_path = str(tmpdir.join('%d.zip' % i))
+            _write_zip_with_author_first_name(zip_path, first_name)
+            os.utime(zip_path, (1000 + i, 1000 + i))
+        original_convert_zip_file = convert_zip_file
+
+        def convert_zip_file_failing_for(failing_filename, filename, *args, **kwargs):
+            result = original_convert_zip_file(filename, *args, **kwargs)
+            if filename == failing_filename:
+                raise RuntimeError('failed')
+            return result
+
+        with empty_in_memory_database() as db:
+            with patch.object(
+                    importDataToDatabaseModule, 'connect_managed_configured_database',
+                    return_value=_unmanaged_database(db)):
+                with patch.object(
+                        importDataToDatabaseModule, 'get_downloads_xml_path',
+                        return_value=str(tmpdir)):
+                    with patch.object(
+                            importDataToDatabaseModule, 'convert_zip_file',
+                            side_effect=partial(convert_zip_file_failing_for, '1.zip')):
+                        with pytest.raises(Exception):
+                            importDataToDatabaseModule.main(['--zips-per-commit=0'])
+                    db.session.rollback()
+                    assert {
+                        p.import_processed_id for p in db.import_processed.get_all()
+                    } == {'0.zip'}
+                    assert db.person.get(AUTHOR_1_ID).first_name == 'First'
+
+                    # the next run retries the failed zip file, before the newer zip file
+                    with patch.object(
+                            importDataToDatabaseModule, 'connect_managed_configured_database',
+                            return_value=_unmanaged_database(db)):
+                        importDataToDatabaseModule.main(['--zips-per-commit=0'])
+                    assert db.person.get(AUTHOR_1_ID).first_name == 'Newer'
+
+
+def _zip_for_all_test_files_and_invalid_xml():
+    zip_stream = io.BytesIO()
+    with zipfile.ZipFile(zip_stream, 'w') as zf:
+        for filename in sorted(os.listdir(TEST_DATA_DIR)):
+            zf.write(os.path.join(TEST_DATA_DIR, filename), filename)
+        zf.writestr('invalid.xml', '<invalid')
+        # the same manuscript again, replacing the previous rows
+        zf.write(os.path.join(TEST_DATA_DIR, 'regular-00001.xml'), 'regular-00001-again.xml')
+    zip_stream.seek(0)
+    return zip_stream
+
+
+def _table_csv_by_name(tables):
+    return {name: table.to_frame().to_csv() for name, table in tables.items()}
+
+
+@pytest.mark.slow
+class TestIncrementalXmlImport:
+    def _set_version_title(self, db, title):
+        db.manuscript_version.update(version_id=VERSION_ID1, title=title)
+        db.commit()
+
+    def test_should_not_convert_unchanged_files_again(self):
+        with empty_database_and_convert_files(['regular-00001.xml']) as db:
+            assert db.import_xml_file.count() == 1
+            with patch.object(
+                    importDataToDatabaseModule,
+                    'convert_xml_file_stream_to_hashed_table_operations',
+                    wraps=convert_xml_file_stream_to_hashed_table_operations) as convert_mock:
+                convert_zip_stream(
+                    db, zip_for_files(['regular-00001.xml']), skip_if_processed=False
+                )
+                convert_mock.assert_not_called()
+
+    def test_should_only_convert_changed_files(self):
+        xml_root = etree.parse(os.path.join(TEST_DATA_DIR, 'regular-00001.xml')).getroot()
+        other_xml_root = etree.parse(os.path.join(TEST_DATA_DIR, 'minimal-00001.xml')).getroot()
+        with empty_database_and_convert_zip_stream(
+                zip_for_xml([xml_root, other_xml_root])) as db:
+            xml_root.find('manuscript/version/title').text = 'updated title'
+            with patch.object(
+                    importDataToDatabaseModule,
+                    'convert_xml_file_stream_to_hashed_table_operations',
+                    wraps=convert_xml_file_stream_to_hashed_table_operations) as convert_mock:
+                convert_zip_stream(
+                    db, zip_for_xml([xml_root, other_xml_root]), skip_if_processed=False
+                )
+                assert [c[0][0] for c in convert_mock.call_args_list] == ['0.xml']
+            assert 'updated title' in set(db.manuscript_version.read_frame()['title'])
+
+    def test_should_keep_persons_of_last_file_when_skipping_unchanged_files(self):
+        xml_root = etree.parse(os.path.join(TEST_DATA_DIR, 'regular-00001.xml')).getroot()
+        other_xml_root = etree.parse(os.path.join(TEST_DATA_DIR, 'regular-00001.xml')).getroot()
+        first_name_node = xml_root.find(
+            ".//person[person-id='%s']/first-name" % AUTHOR_1_ID
+        )
+        first_name_node.text = 'First'
+        with empty_database_and_convert_zip_stream(
+                zip_for_xml([xml_root, other_xml_root])) as db:
+            other_first_name = db.person.get(AUTHOR_1_ID).first_name
+            assert other_first_name != 'First'
+            first_name_node.text = 'Updated'
+            convert_zip_stream(
+                db, zip_for_xml([xml_root, other_xml_root]), skip_if_processed=False
+            )
+            assert db.person.get(AUTHOR_1_ID).first_name == other_first_name
+
+    def test_should_keep_persons_of_last_file_using_worker_processes(self):
+        xml_root = etree.parse(os.path.join(TEST_DATA_DIR, 'regular-00001.xml')).getroot()
+        other_xml_root = etree.parse(os.path.join(TEST_DATA_DIR, 'regular-00001.xml')).getroot()
+        first_name_node = xml_root.find(
+            ".//person[person-id='%s']/first-name" % AUTHOR_1_ID
+        )
+        with empty_database_and_convert_zip_stream(
+                zip_for_xml([xml_root, other_xml_root])) as db:
+            other_first_name = db.person.get(AUTHOR_1_ID).first_name
+            first_name_node.text = 'Updated'
+            convert_zip_stream(
+                db, zip_for_xml([xml_root, other_xml_root]), skip_if_processed=False,
+                max_workers=2
+            )
+            assert db.person.get(AUTHOR_1_ID).first_name == other_first_name
+
+    def test_should_not_apply_unchanged_rows_after_data_version_change(self):
+        with empty_database_and_convert_files(['regular-00001.xml']) as db:
+            self._set_version_title(db, 'modified title')
+            data_version = importDataToDatabaseModule.DATA_VERSION + 1
+            with patch.object(importDataToDatabaseModule, 'DATA_VERSION', data_version):
+                convert_zip_stream(db, zip_for_files(['regular-00001.xml']))
+            assert db.manuscript_version.get(VERSION_ID1).title == 'modified title'
+            assert [r.version for r in db.import_xml_file.get_all()] == [data_version]
+
+    def test_should_reimport_unchanged_files_if_not_skipped(self):
+        with empty_database_and_convert_files(['regular-00001.xml']) as db:
+            self._set_version_title(db, 'modified title')
+            convert_zip_stream(
+                db, zip_for_files(['regular-00001.xml']), skip_if_processed=False,
+                skip_unchanged_files=False
+            )
+            assert db.manuscript_version.get(VERSION_ID1).title != 'modified title'
+
+    def test_should_skip_unchanged_files_using_worker_processes(self):
+        with empty_database_and_convert_files(['regular-00001.xml']) as db:
+            self._set_version_title(db, 'modified title')
+            convert_zip_stream(
+                db, zip_for_files(['regular-00001.xml']), skip_if_processed=False,
+                max_workers=2
+            )
+            assert db.manuscript_version.get(VERSION_ID1).title == 'modified title'
+
+
+@pytest.mark.slow
+class TestParallelXmlConversion:
+    def test_should_produce_identical_tables_to_serial_conversion(self):
+        field_mapping_by_table_name = default_field_mapping_by_table_name
+        serial_tables = create_table_outputs()
+        process_files_in_zip(
+            _zip_for_all_test_files_and_invalid_xml(),
+            lambda filename, stream: convert_xml_file_contents(
+                filename, stream, serial_tables, field_mapping_by_table_name
+            ),
+            ext='.xml'
+        )
+        parallel_tables = create_table_outputs()
+        process_files_in_zip_in_parallel(
+            _zip_for_all_test_files_and_invalid_xml(),
+            partial(
+                convert_xml_file_contents_to_table_operations,
+                field_mapping_by_table_name=field_mapping_by_table_name
+            ),
+            lambda _, operations: replay_table_operations(operations, parallel_tables),
+            ext='.xml',
+            max_workers=2,
+            max_pending=3
+        )
+        assert len(serial_tables['manuscript_version'].to_frame()) > 0
+        assert _table_csv_by_name(parallel_tables) == _table_csv_by_name(serial_tables)
+
+    def test_should_import_zip_file_using_worker_processes(self):
+        with empty_database_and_convert_zip_stream(
+                _zip_for_all_test_files_and_invalid_xml()) as db:
+            expected_frames = _read_all_frames(db)
+        with empty_database_and_convert_zip_stream(
+                _zip_for_all_test_files_and_invalid_xml(), max_workers=2) as db:
+            actual_frames = _read_all_frames(db)
+        for table_name, expected_df in expected_frames.items():
+            pd.testing.assert_frame_equal(
+                actual_frames[table_name], expected_df, obj=table_name
+            )
+
+
+def _operations_by_table_name(operations):
+    operations_by_table_name = {}
+    for operation in operations:
+        operations_by_table_name.setdefault(operation[0], []).append(operation)
+    return operations_by_table_name
+
+
+class TestConvertXmlStream:
+    @pytest.mark.parametrize('filename', sorted(os.listdir(TEST_DATA_DIR)))
+    def test_should_produce_same_table_operations_as_convert_xml(self, filename):
+        manuscript_number = os.path.splitext(filename)[0]
+        expected_tables = TableOperationRecorders()
+        with open(os.path.join(TEST_DATA_DIR, filename), 'rb') as f:
+            convert_xml(
+                parse_xml_file(f), expected_tables, manuscript_number,
+                default_field_mapping_by_table_name
+            )
+        actual_tables = TableOperationRecorders()
+        with open(os.path.join(TEST_DATA_DIR, filename), 'rb') as f:
+            convert_xml_stream(
+                f, actual_tables, manuscript_number, default_field_mapping_by_table_name
+            )
+        assert expected_tables.operations
+        assert (
+            _operations_by_table_name(actual_tables.operations) ==
+            _operations_by_table_name(expected_tables.operations)
+        )
+
+    def test_should_find_unknown_paths(self):
+        xml_root = E.xml(
+            E.manuscript(
+                E.other(E.child('x')),
+                E('production-data', E('production-data-doi', 'doi'))
+            ),
+            E.people(
+                E.person(E('person-id', PERSON_ID), E.other(E.child('x')))
+            ),
+            E.other(E.child('x'))
+        )
+        assert convert_xml_stream(
+            io.BytesIO(etree.tostring(xml_root)), TableOperationRecorders(), 'ms-00001',
+            default_field_mapping_by_table_name
+        ) == {'manuscript/other', 'people/person/other', 'other'}
+
+    def test_should_not_convert_any_records_of_an_invalid_file(self):
+        tables = create_table_outputs()
+        xml = etree.tostring(E.xml(
+            E.people(E.person(E('person-id', PERSON_ID)))
+        ))
+        with pytest.raises(Exception):
+            convert_xml_file_contents(
+                'ms-00001.xml', io.BytesIO(xml[:-len('</xml>')]), tables,
+                default_field_mapping_by_table_name
+            )
+        assert len(tables['person'].to_frame()) == 0
+
+
+class TestCompiledXmlConverter:
+    @pytest.mark.parametrize('filename', sorted(os.listdir(TEST_DATA_DIR)))
+    def test_should_produce_same_table_operations_as_convert_xml_for_parsed_tree(
+            self, filename):
+        manuscript_number = os.path.splitext(filename)[0]
+        with open(os.path.join(TEST_DATA_DIR, filename), 'rb') as f:
+            doc = parse_xml_file(f)
+        expected_tables = TableOperationRecorders()
+        convert_xml(doc, expected_tables, manuscript_number, default_field_mapping_by_table_name)
+        actual_tables = TableOperationRecorders()
+        compile_xml_converter(default_field_mapping_by_table_name).convert_events(
+            iter_xml_tree_events(doc), actual_tables, manuscript_number
+        )
+        assert (
+            _operations_by_table_name(actual_tables.operations) ==
+            _operations_by_table_name(expected_tables.operations)
+        )
+
+    def test_should_only_convert_persons_without_manuscript_mapping(self):
+        field_mapping_by_table_name = {
+            k: v for k, v in default_field_mapping_by_table_name.items()
+            if k != 'manuscript'
+        }
+        xml_root = E.xml(
+            E.manuscript(E.version(E.key('00001|0'), E('manuscript-number', 'ms-00001'))),
+            E.people(E.person(E('person-id', PERSON_ID)))
+        )
+        tables = TableOperationRecorders()
+        compile_xml_converter(field_mapping_by_table_name).convert_events(
+            iter_xml_tree_events(xml_root), tables, 'ms-00001'
+        )
+        assert {table_name for table_name, _, _ in tables.operations} == set(
+            importDataToDatabaseModule.all_persons_table_names
+        )
+
+
 class TestExtractPersonKeywordsFromPersonNode:
     def test_should_not_extract_keyword_from_note_with_different_note_type(self):
         with patch.object(
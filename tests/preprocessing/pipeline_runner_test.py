@@ -0,0 +1,109 @@
+import os
+from functools import partial
+
+import pytest
+
+from peerscout.preprocessing.pipeline_runner import (
+    PipelineCheckpoint,
+    PipelineStep,
+    run_pipeline,
+    validate_steps
+)
+
+
+def _append_line(filename, line):
+    with open(filename, 'a') as f:
+        f.write(line + '\n')
+
+
+def _read_lines(filename):
+    if not os.path.exists(filename):
+        return []
+    with open(filename, 'r') as f:
+        return f.read().splitlines()
+
+
+def _fail():
+    raise RuntimeError('step failed')
+
+
+class TestValidateSteps:
+    def test_should_reject_unknown_dependencies(self):
+        with pytest.raises(Exception, match='unknown'):
+            validate_steps([PipelineStep('a', None, depends_on=['b'])])
+
+    def test_should_reject_dependency_cycles(self):
+        with pytest.raises(Exception, match='cycle'):
+            validate_steps([
+                PipelineStep('a', None, depends_on=['b']),
+                PipelineStep('b', None, depends_on=['a'])
+            ])
+
+
+class TestRunPipeline:
+    def test_should_run_steps_in_declared_order_after_their_dependencies(self):
+        names = []
+        steps = [
+            PipelineStep('b', partial(names.append, 'b'), depends_on=['a']),
+            PipelineStep('a', partial(names.append, 'a')),
+            PipelineStep('c', partial(names.append, 'c'))
+        ]
+        assert list(run_pipeline(steps).keys()) == ['a', 'b', 'c']
+        assert names == ['a', 'b', 'c']
+
+    def test_should_skip_steps_completed_according_to_checkpoint(self, tmpdir):
+        checkpoint = PipelineCheckpoint(str(tmpdir.join('checkpoint.json')))
+        checkpoint.mark_completed('a', 1.0)
+        names = []
+        run_pipeline([
+            PipelineStep('a', partial(names.append, 'a')),
+            PipelineStep('b', partial(names.append, 'b'), depends_on=['a'])
+        ], checkpoint=checkpoint)
+        assert names == ['b']
+
+    def test_should_resume_from_failed_step(self, tmpdir):
+        checkpoint_filename = str(tmpdir.join('checkpoint.json'))
+        names = []
+        with pytest.raises(RuntimeError):
+            run_pipeline([
+                PipelineStep('a', partial(names.append, 'a')),
+                PipelineStep('b', _fail, depends_on=['a']),
+                PipelineStep('c', partial(names.append, 'c'), depends_on=['b'])
+            ], checkpoint=PipelineCheckpoint(checkpoint_filename))
+        checkpoint = PipelineCheckpoint(checkpoint_filename)
+        assert checkpoint.completed_step_names == ['a']
+        assert checkpoint.failed_step_names == ['b']
+
+        run_pipeline([
+            PipelineStep('a', partial(names.append, 'a')),
+            PipelineStep('b', partial(names.append, 'b'), depends_on=['a']),
+            PipelineStep('c', partial(names.append, 'c'), depends_on=['b'])
+        ], checkpoint=checkpoint)
+        assert names == ['a', 'b', 'c']
+        assert PipelineCheckpoint(checkpoint_filename).failed_step_names == []
+
+    def test_should_run_steps_in_separate_processes(self, tmpdir):
+        filename = str(tmpdir.join('steps.txt'))
+        checkpoint = PipelineCheckpoint(str(tmpdir.join('checkpoint.json')))
+        run_pipeline([
+            PipelineStep('a', partial(_append_line, filename, 'a')),
+            PipelineStep('b', partial(_append_line, filename, 'b'), depends_on=['a']),
+            PipelineStep('c', partial(_append_line, filename, 'c'), depends_on=['a']),
+            PipelineStep('d', partial(_append_line, filename, 'd'), depends_on=['b', 'c'])
+        ], checkpoint=checkpoint, max_workers=2)
+        lines = _read_lines(filename)
+        assert lines[0] == 'a'
+        assert sorted(lines[1:3]) == ['b', 'c']
+        assert lines[3] == 'd'
+        assert set(checkpoint.completed_step_names) == {'a', 'b', 'c', 'd'}
+
+    def test_should_not_start_further_steps_after_failure_in_separate_process(self, tmpdir):
+        filename = str(tmpdir.join('steps.txt'))
+        checkpoint = PipelineCheckpoint(str(tmpdir.join('checkpoint.json')))
+        with pytest.raises(Exception, match='failed pipeline steps'):
+            run_pipeline([
+                PipelineStep('a', _fail),
+                PipelineStep('b', partial(_append_line, filename, 'b'), depends_on=['a'])
+            ], checkpoint=checkpoint, max_workers=2)
+        assert _read_lines(filename) == []
+        assert checkpoint.failed_step_names == ['a']
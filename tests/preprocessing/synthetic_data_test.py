@@ -0,0 +1,66 @@
+from io import StringIO
+from xml.etree.ElementTree import tostring
+
+import pytest
+
+from peerscout.shared.database import empty_in_memory_database
+
+from peerscout.preprocessing import import_editor_roles_and_keywords_csv
+from peerscout.preprocessing import importEarlyCareerResearchersCsv
+from peerscout.preprocessing.importDataToDatabase import (
+    convert_zip_file,
+    default_field_mapping_by_table_name
+)
+from peerscout.preprocessing.synthetic_data import (
+    PersonPools,
+    generate_dataset,
+    generate_manuscript_xml_root
+)
+
+MANUSCRIPT_COUNT = 20
+
+
+class TestGenerateManuscriptXmlRoot:
+    def test_should_generate_the_same_manuscript_using_the_same_seed(self):
+        person_pools = PersonPools(MANUSCRIPT_COUNT)
+        assert (
+            tostring(generate_manuscript_xml_root(1, person_pools, seed=1)) ==
+            tostring(generate_manuscript_xml_root(1, person_pools, seed=1))
+        )
+        assert (
+            tostring(generate_manuscript_xml_root(1, person_pools, seed=1)) !=
+            tostring(generate_manuscript_xml_root(2, person_pools, seed=1))
+        )
+
+
+@pytest.mark.slow
+class TestGenerateDataset:
+    def test_should_generate_dataset_which_can_be_imported(self, tmpdir):
+        dataset = generate_dataset(str(tmpdir), MANUSCRIPT_COUNT, manuscripts_per_zip=8)
+        assert len(dataset['zip_filenames']) == 3
+        with empty_in_memory_database() as db:
+            for zip_filename in dataset['zip_filenames']:
+                with open(zip_filename, 'rb') as zip_stream:
+                    convert_zip_file(
+                        zip_filename, zip_stream, db, default_field_mapping_by_table_name, set()
+                    )
+            assert db.manuscript.count() == MANUSCRIPT_COUNT
+            assert db.manuscript_version.count() >= MANUSCRIPT_COUNT
+            assert db.manuscript_author.count() > 0
+            assert db.manuscript_keyword.count() > 0
+            assert db.manuscript_subject_area.count() > 0
+
+            _, editor_roles_filename, early_career_researchers_filename = (
+                dataset['csv_filenames']
+            )
+            with open(editor_roles_filename, 'r') as f:
+                import_editor_roles_and_keywords_csv.import_csv_file_to_database(
+                    editor_roles_filename, StringIO(f.read()), db
+                )
+            with open(early_career_researchers_filename, 'r') as f:
+                importEarlyCareerResearchersCsv.import_csv_file_to_database(
+                    early_career_researchers_filename, StringIO(f.read()), db
+                )
+            db.commit()
+            assert db.person_role.count() > 0
+            assert db.person.read_frame()['is_early_career_researcher'].any()
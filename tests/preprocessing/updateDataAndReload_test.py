@@ -1,6 +1,15 @@
+from unittest.mock import patch
+
+import pytest
+
+from peerscout.preprocessing import updateDataAndReload as updateDataAndReloadModule
+from peerscout.preprocessing.pipeline_runner import PipelineCheckpoint, validate_steps
 from peerscout.preprocessing.updateDataAndReload import (
+    DOWNLOAD_STEP_NAME,
     MODULE_NAMES,
-    load_modules
+    get_pipeline_steps,
+    load_modules,
+    main
 )
 
 
@@ -9,3 +18,69 @@ class TestLoadModules:
         assert MODULE_NAMES
         modules = list(load_modules(MODULE_NAMES))
         assert len(modules) == len(MODULE_NAMES)
+
+
+class TestGetPipelineSteps:
+    def test_should_declare_valid_dependencies(self):
+        validate_steps(get_pipeline_steps())
+
+
+class TestMain:
+    @pytest.fixture(name='checkpoint_filename')
+    def _checkpoint_filename(self, tmpdir):
+        checkpoint_filename = str(tmpdir.join('checkpoint.json'))
+        with patch.object(
+                updateDataAndReloadModule, 'get_checkpoint_filename',
+                return_value=checkpoint_filename):
+            yield checkpoint_filename
+
+    @pytest.fixture(name='download_main_mock')
+    def _download_main_mock(self):
+        with patch.object(updateDataAndReloadModule.downloadFiles, 'main') as mock:
+            yield mock
+
+    @pytest.fixture(name='run_module_main_mock')
+    def _run_module_main_mock(self):
+        with patch.object(updateDataAndReloadModule, 'run_module_main') as mock:
+            yield mock
+
+    def _run_module_names(self, run_module_main_mock):
+        return [c[0][0] for c in run_module_main_mock.call_args_list]
+
+    @pytest.mark.usefixtures('checkpoint_filename')
+    def test_should_skip_processing_if_no_files_were_downloaded(
+            self, download_main_mock, run_module_main_mock):
+        download_main_mock.return_value = False
+        assert not main([])
+        run_module_main_mock.assert_not_called()
+
+    def test_should_run_all_modules_and_remove_checkpoint(
+            self, checkpoint_filename, download_main_mock, run_module_main_mock):
+        download_main_mock.return_value = True
+        assert main([])
+        assert self._run_module_names(run_module_main_mock) == MODULE_NAMES
+        assert PipelineCheckpoint(checkpoint_filename).completed_step_names == []
+
+    def test_should_resume_failed_run_without_downloading_again(
+            self, checkpoint_filename, download_main_mock, run_module_main_mock):
+        download_main_mock.return_value = True
+        failed_module_name = MODULE_NAMES[1]
+        run_module_main_mock.side_effect = (
+            lambda module_name: _raise_error() if module_name == failed_module_name else None
+        )
+        with pytest.raises(RuntimeError):
+            main([])
+        checkpoint = PipelineCheckpoint(checkpoint_filename)
+        assert checkpoint.is_completed(DOWNLOAD_STEP_NAME)
+
+        download_main_mock.reset_mock()
+        run_module_main_mock.reset_mock()
+        run_module_main_mock.side_effect = None
+        assert main([])
+        download_main_mock.assert_not_called()
+        assert MODULE_NAMES[0] not in self._run_module_names(run_module_main_mock)
+        assert self._run_module_names(run_module_main_mock)[0] == failed_module_name
+
+
+def _raise_error():
+    raise RuntimeError('failed')
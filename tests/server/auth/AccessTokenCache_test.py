@@ -0,0 +1,139 @@
+import base64
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+from peerscout.server.auth.AccessTokenCache import (
+    AccessTokenCache,
+    get_access_token_digest,
+    get_jwt_expiry
+)
+
+EMAIL = 'user1@domain.org'
+ACCESS_TOKEN = 'access1'
+OTHER_ACCESS_TOKEN = 'access2'
+
+TTL = 100
+NEGATIVE_TTL = 10
+
+
+def _jwt_with_expiry(exp):
+    payload = base64.urlsafe_b64encode(json.dumps({'exp': exp}).encode('utf-8'))
+    return 'header.%s.signature' % payload.decode('utf-8').rstrip('=')
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _create_cache(clock=None, **kwargs):
+    return AccessTokenCache(
+        ttl=TTL, negative_ttl=NEGATIVE_TTL, get_time=clock or _Clock(), **kwargs
+    )
+
+
+class TestGetAccessTokenDigest:
+    def test_should_not_contain_access_token(self):
+        assert ACCESS_TOKEN not in get_access_token_digest(ACCESS_TOKEN)
+
+    def test_should_return_different_digest_for_different_tokens(self):
+        assert (
+            get_access_token_digest(ACCESS_TOKEN) !=
+            get_access_token_digest(OTHER_ACCESS_TOKEN)
+        )
+
+
+class TestGetJwtExpiry:
+    def test_should_return_exp_of_jwt(self):
+        assert get_jwt_expiry(_jwt_with_expiry(1234)) == 1234
+
+    def test_should_return_none_for_opaque_token(self):
+        assert get_jwt_expiry(ACCESS_TOKEN) is None
+
+
+class TestAccessTokenCache:
+    def test_should_return_verified_email(self):
+        cache = _create_cache()
+        assert cache.get_or_verify(ACCESS_TOKEN, lambda _: EMAIL) == EMAIL
+
+    def test_should_only_verify_once_within_ttl(self):
+        clock = _Clock()
+        cache = _create_cache(clock)
+        verify_fn = Mock(return_value=EMAIL)
+        cache.get_or_verify(ACCESS_TOKEN, verify_fn)
+        clock.now += TTL - 1
+        assert cache.get_or_verify(ACCESS_TOKEN, verify_fn) == EMAIL
+        assert verify_fn.call_count == 1
+
+    def test_should_verify_again_after_ttl(self):
+        clock = _Clock()
+        cache = _create_cache(clock)
+        verify_fn = Mock(return_value=EMAIL)
+        cache.get_or_verify(ACCESS_TOKEN, verify_fn)
+        clock.now += TTL
+        cache.get_or_verify(ACCESS_TOKEN, verify_fn)
+        assert verify_fn.call_count == 2
+
+    def test_should_not_cache_beyond_jwt_expiry(self):
+        clock = _Clock()
+        cache = _create_cache(clock)
+        access_token = _jwt_with_expiry(clock.now + 1)
+        verify_fn = Mock(return_value=EMAIL)
+        cache.get_or_verify(access_token, verify_fn)
+        clock.now += 1
+        cache.get_or_verify(access_token, verify_fn)
+        assert verify_fn.call_count == 2
+
+    def test_should_cache_invalid_token_for_negative_ttl(self):
+        clock = _Clock()
+        cache = _create_cache(clock)
+        verify_fn = Mock(return_value=None)
+        assert cache.get_or_verify(ACCESS_TOKEN, verify_fn) is None
+        clock.now += NEGATIVE_TTL - 1
+        assert cache.get_or_verify(ACCESS_TOKEN, verify_fn) is None
+        assert verify_fn.call_count == 1
+        clock.now += 1
+        cache.get_or_verify(ACCESS_TOKEN, verify_fn)
+        assert verify_fn.call_count == 2
+
+    def test_should_not_cache_exceptions(self):
+        cache = _create_cache()
+        verify_fn = Mock(side_effect=[RuntimeError('unavailable'), EMAIL])
+        try:
+            cache.get_or_verify(ACCESS_TOKEN, verify_fn)
+        except RuntimeError:
+            pass
+        assert cache.get_or_verify(ACCESS_TOKEN, verify_fn) == EMAIL
+
+    def test_should_evict_least_recently_used_token_above_max_size(self):
+        cache = _create_cache(max_size=1)
+        verify_fn = Mock(return_value=EMAIL)
+        cache.get_or_verify(ACCESS_TOKEN, verify_fn)
+        cache.get_or_verify(OTHER_ACCESS_TOKEN, verify_fn)
+        assert len(cache) == 1
+        cache.get_or_verify(ACCESS_TOKEN, verify_fn)
+        assert verify_fn.call_count == 3
+
+    def test_should_verify_concurrent_requests_with_same_token_once(self):
+        cache = _create_cache()
+        started = threading.Event()
+        release = threading.Event()
+
+        def verify_fn(_):
+            started.set()
+            release.wait()
+            return EMAIL
+
+        verify_fn_mock = Mock(side_effect=verify_fn)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(cache.get_or_verify, ACCESS_TOKEN, verify_fn_mock)
+            started.wait()
+            second = executor.submit(cache.get_or_verify, ACCESS_TOKEN, verify_fn_mock)
+            release.set()
+            assert (first.result(), second.result()) == (EMAIL, EMAIL)
+        assert verify_fn_mock.call_count == 1
@@ -1,6 +1,15 @@
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
 from unittest.mock import Mock
+from urllib.parse import urlparse, parse_qs
+
+import pytest
 
 from peerscout.server.auth.Auth0 import Auth0
+from peerscout.server.auth.AccessTokenCache import AccessTokenCache
 
 EMAIL = 'user1@domain.org'
 DOMAIN = 'test.auth0.com'
@@ -12,6 +21,7 @@ USER_INFO = {
 AUTHORIZED_RESULT = 'authorized'
 NOT_AUTHORIZED_RESULT = 'not-authorized'
 ACCESS_TOKEN = 'access1'
+INVALID_ACCESS_TOKEN = 'invalid1'
 
 
 def GET_USER_INFO(_):
@@ -113,3 +123,90 @@ def test_should_pass_keyword_arguments_to_request_handler_if_not_authorizing():
         requires_auth=lambda: False
     )(other='123')
     request_handler.assert_called_with(other='123')
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@contextmanager
+def _stub_auth0_server(status_code_by_access_token=None):
+    """Local stub of the Auth0 userinfo endpoint, counting the requests per access token."""
+    status_code_by_access_token = status_code_by_access_token or {}
+    request_count_by_access_token = {}
+
+    class RequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):  # pylint: disable=invalid-name
+            access_token = parse_qs(urlparse(self.path).query)['access_token'][0]
+            request_count_by_access_token[access_token] = (
+                request_count_by_access_token.get(access_token, 0) + 1
+            )
+            status_code = status_code_by_access_token.get(access_token, 200)
+            self.send_response(status_code)
+            self.end_headers()
+            if status_code == 200:
+                self.wfile.write(json.dumps(USER_INFO).encode('utf-8'))
+
+        def log_message(self, *_):  # pylint: disable=arguments-differ
+            pass
+
+    server = _ThreadingHTTPServer(('127.0.0.1', 0), RequestHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        yield 'http://%s:%d' % server.server_address, request_count_by_access_token
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@pytest.mark.slow
+class TestAuth0WithStubServer:
+    def test_should_get_email_for_valid_access_token(self):
+        with _stub_auth0_server() as (base_url, _):
+            auth0 = Auth0(domain=DOMAIN, base_url=base_url)
+            assert auth0.verify_access_token_and_get_email(ACCESS_TOKEN) == EMAIL
+
+    def test_should_return_none_for_rejected_access_token(self):
+        with _stub_auth0_server({INVALID_ACCESS_TOKEN: 401}) as (base_url, _):
+            auth0 = Auth0(domain=DOMAIN, base_url=base_url)
+            assert auth0.verify_access_token_and_get_email(INVALID_ACCESS_TOKEN) is None
+
+    def test_should_call_auth0_for_every_request_without_cache(self):
+        with _stub_auth0_server() as (base_url, request_count_by_access_token):
+            auth0 = Auth0(domain=DOMAIN, base_url=base_url)
+            auth0.verify_access_token_and_get_email(ACCESS_TOKEN)
+            auth0.verify_access_token_and_get_email(ACCESS_TOKEN)
+            assert request_count_by_access_token == {ACCESS_TOKEN: 2}
+
+    def test_should_call_auth0_once_per_token_with_cache(self):
+        with _stub_auth0_server({INVALID_ACCESS_TOKEN: 401}) as (
+                base_url, request_count_by_access_token):
+            auth0 = Auth0(
+                domain=DOMAIN, base_url=base_url, access_token_cache=AccessTokenCache()
+            )
+            for _ in range(2):
+                assert auth0.verify_access_token_and_get_email(ACCESS_TOKEN) == EMAIL
+                assert auth0.verify_access_token_and_get_email(INVALID_ACCESS_TOKEN) is None
+            assert request_count_by_access_token == {ACCESS_TOKEN: 1, INVALID_ACCESS_TOKEN: 1}
+
+    def test_should_not_cache_server_errors(self):
+        with _stub_auth0_server({ACCESS_TOKEN: 503}) as (
+                base_url, request_count_by_access_token):
+            auth0 = Auth0(
+                domain=DOMAIN, base_url=base_url, access_token_cache=AccessTokenCache()
+            )
+            assert auth0.verify_access_token_and_get_email(ACCESS_TOKEN) is None
+            assert auth0.verify_access_token_and_get_email(ACCESS_TOKEN) is None
+            assert request_count_by_access_token == {ACCESS_TOKEN: 2}
+
+    def test_should_not_cache_rate_limit_errors(self):
+        with _stub_auth0_server({ACCESS_TOKEN: 429}) as (
+                base_url, request_count_by_access_token):
+            auth0 = Auth0(
+                domain=DOMAIN, base_url=base_url, access_token_cache=AccessTokenCache()
+            )
+            assert auth0.verify_access_token_and_get_email(ACCESS_TOKEN) is None
+            assert auth0.verify_access_token_and_get_email(ACCESS_TOKEN) is None
+            assert request_count_by_access_token == {ACCESS_TOKEN: 2}
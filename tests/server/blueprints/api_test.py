@@ -3,6 +3,8 @@ from __future__ import absolute_import
 from configparser import ConfigParser
 import logging
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from unittest.mock import patch, Mock
 from urllib.parse import urlencode
@@ -13,12 +15,19 @@ from flask import Flask
 from werkzeug.exceptions import Forbidden
 
 from peerscout.utils.config import dict_to_config
+from peerscout.utils.metrics import MetricsRegistry
 from peerscout.server.config.search_config import SEARCH_SECTION_PREFIX
 
 from peerscout.shared.database import populated_in_memory_database
+from peerscout.shared.query_instrumentation import get_current_query_stats_collector
 
 from peerscout.server.blueprints import api as api_module
-from peerscout.server.blueprints.api import create_api_blueprint, ApiAuth, DEFAULT_LIMIT
+from peerscout.server.blueprints.api import (
+    create_api_blueprint,
+    get_recommend_reviewers_request_key,
+    ApiAuth,
+    DEFAULT_LIMIT
+)
 
 LOGGER = logging.getLogger(__name__)
 
@@ -35,6 +44,7 @@ MANUSCRIPT_NO_1 = '12345'
 MANUSCRIPT_NO_2 = '22222'
 VERSION_ID_1 = '%s-1' % MANUSCRIPT_NO_1
 LIMIT_1 = 123
+KEYWORD_SEARCH_LIMIT_1 = 12
 
 SEARCH_TYPE_1 = 'search_type1'
 SEARCH_TYPE_2 = 'search_type2'
@@ -54,12 +64,14 @@ def setup_module():
 
 
 @contextmanager
-def _api_test_client(config, dataset):
+def _api_test_client(config, dataset, metrics_registry=None):
     m = api_module
     with populated_in_memory_database(dataset, autocommit=True) as db:
         with patch.object(m, 'connect_configured_database') as connect_configured_database_mock:
             connect_configured_database_mock.return_value = db
-            blueprint, reload_api = create_api_blueprint(config)
+            blueprint, reload_api = create_api_blueprint(
+                config, metrics_registry=metrics_registry
+            )
             app = Flask(__name__)
             app.register_blueprint(blueprint)
             assert reload_api
@@ -121,6 +133,50 @@ class TestApiBlueprint:
                 response = test_client.get('/keywords')
                 assert _get_ok_json(response) == [VALUE_1, VALUE_2]
 
+    class TestKeywordsSearch:
+        def test_should_pass_prefix_and_limit_to_search_keywords(self, MockRecommendReviewers):
+            config = ConfigParser()
+            with _api_test_client(config, {}) as test_client:
+                search_keywords = MockRecommendReviewers.return_value.search_keywords
+                search_keywords.return_value = [VALUE_1, VALUE_2]
+                response = test_client.get('/keywords/search?' + urlencode({
+                    'prefix': VALUE_1[:3], 'limit': KEYWORD_SEARCH_LIMIT_1
+                }))
+                assert _get_ok_json(response) == [VALUE_1, VALUE_2]
+                search_keywords.assert_called_with(VALUE_1[:3], limit=KEYWORD_SEARCH_LIMIT_1)
+
+        def test_should_use_default_limit(self, MockRecommendReviewers):
+            config = ConfigParser()
+            with _api_test_client(config, {}) as test_client:
+                search_keywords = MockRecommendReviewers.return_value.search_keywords
+                search_keywords.return_value = []
+                _get_ok_json(test_client.get('/keywords/search?prefix=abc'))
+                search_keywords.assert_called_with(
+                    'abc', limit=api_module.DEFAULT_KEYWORD_SEARCH_LIMIT
+                )
+
+        def test_should_cap_limit_to_max_limit(self, MockRecommendReviewers):
+            config = ConfigParser()
+            with _api_test_client(config, {}) as test_client:
+                search_keywords = MockRecommendReviewers.return_value.search_keywords
+                search_keywords.return_value = []
+                _get_ok_json(test_client.get('/keywords/search?' + urlencode({
+                    'prefix': 'abc', 'limit': api_module.MAX_KEYWORD_SEARCH_LIMIT + 1
+                })))
+                search_keywords.assert_called_with(
+                    'abc', limit=api_module.MAX_KEYWORD_SEARCH_LIMIT
+                )
+
+        @pytest.mark.parametrize('limit', ['abc', '-1', '0'])
+        def test_should_return_400_for_invalid_limit(self, MockRecommendReviewers, limit):
+            config = ConfigParser()
+            with _api_test_client(config, {}) as test_client:
+                response = test_client.get('/keywords/search?' + urlencode({
+                    'prefix': 'abc', 'limit': limit
+                }))
+                assert response.status_code == 400
+                MockRecommendReviewers.return_value.search_keywords.assert_not_called()
+
     class TestSubjectAreas:
         def test_should_return_subject_areas(self, MockRecommendReviewers):
             config = ConfigParser()
@@ -378,6 +434,16 @@ class TestApiBlueprint:
                 }))
                 assert response.status_code == 400
 
+        def test_should_reject_invalid_limit(self, MockRecommendReviewers):
+            config = ConfigParser()
+            with _api_test_client(config, {}) as test_client:
+                response = test_client.get('/recommend-reviewers?' + urlencode({
+                    'manuscript_no': MANUSCRIPT_NO_1,
+                    'limit': 'abc'
+                }))
+                assert response.status_code == 400
+                MockRecommendReviewers.return_value.recommend.assert_not_called()
+
         def test_should_cache_with_same_parameters(self, MockRecommendReviewers):
             config = ConfigParser()
             with _api_test_client(config, {}) as test_client:
@@ -400,7 +466,144 @@ class TestApiBlueprint:
                 }))
                 assert MockRecommendReviewers.return_value.recommend.call_count == 2
 
+        def test_should_coalesce_concurrent_requests_with_same_parameters(
+                self, MockRecommendReviewers):
+
+            config = ConfigParser()
+            metrics_registry = MetricsRegistry()
+            started = threading.Event()
+            release = threading.Event()
+
+            def recommend(**_):
+                started.set()
+                release.wait()
+                return SOME_RESPONSE
+
+            MockRecommendReviewers.return_value.recommend.side_effect = recommend
+            url = '/recommend-reviewers?' + urlencode({'manuscript_no': MANUSCRIPT_NO_1})
+            with _api_test_client(config, {}, metrics_registry=metrics_registry) as test_client:
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    first = executor.submit(test_client.get, url)
+                    started.wait()
+                    second = executor.submit(test_client.get, url)
+                    while 'total 1.0' not in metrics_registry.to_prometheus_text():
+                        pass
+                    release.set()
+                    assert _get_ok_json(first.result()) == SOME_RESPONSE
+                    assert _get_ok_json(second.result()) == SOME_RESPONSE
+            MockRecommendReviewers.return_value.recommend.assert_called_once()
+
+        def test_should_return_debug_timing_and_bypass_cache(self, MockRecommendReviewers):
+            config = dict_to_config({'server': {'debug_timing_enabled': 'true'}})
+            url = '/recommend-reviewers?' + urlencode({
+                'manuscript_no': MANUSCRIPT_NO_1, 'debug_timing': '1'
+            })
+            with _api_test_client(config, {}) as test_client:
+                first_response = _get_ok_json(test_client.get(url))
+                _get_ok_json(test_client.get(url))
+            assert first_response['some-response'] == VALUE_1
+            assert 'debug_timing' in first_response
+            assert MockRecommendReviewers.return_value.recommend.call_count == 2
+
+        def test_should_ignore_debug_timing_if_not_enabled(self, MockRecommendReviewers):
+            config = ConfigParser()
+            url = '/recommend-reviewers?' + urlencode({
+                'manuscript_no': MANUSCRIPT_NO_1, 'debug_timing': '1'
+            })
+            with _api_test_client(config, {}) as test_client:
+                first_response = _get_ok_json(test_client.get(url))
+                _get_ok_json(test_client.get(url))
+            assert 'debug_timing' not in first_response
+            assert MockRecommendReviewers.return_value.recommend.call_count == 1
+
+        def test_should_collect_query_stats_of_request_if_enabled(
+                self, MockRecommendReviewers, caplog):
+            config = dict_to_config({'database': {'query_instrumentation_enabled': 'true'}})
+            collectors = []
+
+            def recommend(**_):
+                collector = get_current_query_stats_collector()
+                collector.add('select 1', 0.1, 1, 0)
+                collectors.append(collector)
+                return SOME_RESPONSE
+
+            MockRecommendReviewers.return_value.recommend.side_effect = recommend
+            with _api_test_client(config, {}) as test_client:
+                with caplog.at_level(logging.INFO):
+                    _get_ok_json(test_client.get('/recommend-reviewers?' + urlencode({
+                        'manuscript_no': MANUSCRIPT_NO_1
+                    })))
+            assert collectors[0] is not None
+            assert 'GET /recommend-reviewers: 1 queries' in caplog.text
+            assert get_current_query_stats_collector() is None
+
+        def test_should_record_timing_metrics_if_enabled(self):
+            config = dict_to_config({'server': {'timing_enabled': 'true'}})
+            metrics_registry = MetricsRegistry()
+            with _api_test_client(config, {}, metrics_registry=metrics_registry) as test_client:
+                test_client.get('/recommend-reviewers?' + urlencode({
+                    'manuscript_no': MANUSCRIPT_NO_1
+                }))
+            metrics_lines = metrics_registry.to_prometheus_text().splitlines()
+            assert (
+                'peerscout_api_request_duration_seconds_count'
+                '{endpoint="api._recommend_reviewers_api"} 1'
+            ) in metrics_lines
+            assert 'peerscout_api_stage_duration_seconds_count{stage="json_encode"} 1' in (
+                metrics_lines
+            )
+
+        def test_should_not_record_timing_metrics_by_default(self):
+            config = ConfigParser()
+            metrics_registry = MetricsRegistry()
+            with _api_test_client(config, {}, metrics_registry=metrics_registry) as test_client:
+                test_client.get('/recommend-reviewers?' + urlencode({
+                    'manuscript_no': MANUSCRIPT_NO_1
+                }))
+            assert '_count{' not in metrics_registry.to_prometheus_text()
+
+    class TestGetRecommendReviewersRequestKey:
+        def test_should_return_same_key_for_same_generation_and_parameters(self):
+            assert (
+                get_recommend_reviewers_request_key(1, keywords=VALUE_1, limit=LIMIT_1) ==
+                get_recommend_reviewers_request_key(1, limit=LIMIT_1, keywords=VALUE_1)
+            )
+
+        def test_should_return_different_key_for_different_parameters(self):
+            assert (
+                get_recommend_reviewers_request_key(1, keywords=VALUE_1) !=
+                get_recommend_reviewers_request_key(1, keywords=VALUE_2)
+            )
+
+        def test_should_return_different_key_for_different_generation(self):
+            assert (
+                get_recommend_reviewers_request_key(1, keywords=VALUE_1) !=
+                get_recommend_reviewers_request_key(2, keywords=VALUE_1)
+            )
+
     class TestRecommendWithAuth:
+        @pytest.mark.parametrize('email, is_staff', [
+            (EMAIL_1, False),
+            ('staff@' + DOMAIN_1, True)
+        ])
+        def test_should_only_allow_debug_timing_for_staff(
+                self, MockRecommendReviewers, MockFlaskAuth0, email, is_staff):
+
+            _setup_flask_auth0_mock_email(MockFlaskAuth0, email=email)
+
+            config = dict_to_config({
+                'auth': {'allowed_ips': '', 'valid_email_domains': DOMAIN_1},
+                'client': {'auth0_domain': DOMAIN_1},
+                'server': {'debug_timing_enabled': 'true'}
+            })
+            url = '/recommend-reviewers?' + urlencode({
+                'manuscript_no': MANUSCRIPT_NO_1, 'debug_timing': '1'
+            })
+            with _api_test_client(config, {}) as test_client:
+                MockRecommendReviewers.return_value.recommend.return_value = SOME_RESPONSE
+                response = _get_ok_json(test_client.get(url))
+            assert ('debug_timing' in response) == is_staff
+
         def test_should_allow_search_type_for_person_with_matching_role(
                 self, MockRecommendReviewers, MockFlaskAuth0):
 
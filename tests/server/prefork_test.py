@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+import signal
+import time
+from contextlib import contextmanager
+
+import pytest
+import requests
+from flask import Flask, jsonify
+
+from peerscout.server.prefork import PreforkServer
+
+WORKERS = 2
+TIMEOUT = 10
+
+
+def _create_app(state):
+    app = Flask(__name__)
+
+    @app.route('/')
+    def _index():
+        return jsonify({'pid': os.getpid(), 'generation': state['generation']})
+
+    return app
+
+
+def _wait_for(fn, timeout=TIMEOUT):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            result = fn()
+            if result:
+                return result
+        except requests.exceptions.ConnectionError:
+            pass
+        if time.time() > deadline:
+            raise AssertionError('timeout waiting for %s' % fn)
+        time.sleep(0.05)
+
+
+@contextmanager
+def _running_prefork_server():
+    state = {'generation': 1}
+
+    def reload_fn():
+        state['generation'] += 1
+
+    server = PreforkServer(
+        _create_app(state), host='127.0.0.1', port=0, workers=WORKERS,
+        reload_fn=reload_fn, poll_interval=0.05
+    )
+    url = 'http://%s:%d/' % server.server_address
+    process = multiprocessing.get_context('fork').Process(target=server.serve_forever)
+    process.start()
+    try:
+        yield process, url
+    finally:
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGTERM)
+        process.join(TIMEOUT)
+
+
+def _get_json(url):
+    return requests.get(url, timeout=TIMEOUT).json()
+
+
+@pytest.mark.slow
+class TestPreforkServer:
+    def test_should_serve_requests_from_forked_workers(self):
+        with _running_prefork_server() as (process, url):
+            result = _wait_for(lambda: _get_json(url))
+            assert result['generation'] == 1
+            assert result['pid'] != process.pid
+            assert result['pid'] != os.getpid()
+
+    def test_should_reload_in_master_and_replace_workers_on_sighup(self):
+        with _running_prefork_server() as (process, url):
+            previous_pid = _wait_for(lambda: _get_json(url))['pid']
+            os.kill(process.pid, signal.SIGHUP)
+            result = _wait_for(lambda: (
+                _get_json(url)['generation'] == 2 and _get_json(url)
+            ))
+            assert result['pid'] != previous_pid
+
+    def test_should_stop_on_sigterm(self):
+        with _running_prefork_server() as (process, url):
+            _wait_for(lambda: _get_json(url))
+            os.kill(process.pid, signal.SIGTERM)
+            process.join(TIMEOUT)
+            assert process.exitcode == 0
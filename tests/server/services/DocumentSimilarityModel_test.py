@@ -0,0 +1,104 @@
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+
+import pytest
+
+from peerscout.shared.database import populated_in_memory_database
+
+from peerscout.server.services.ManuscriptModel import ManuscriptModel
+from peerscout.server.services.DocumentSimilarityModel import (
+    DocumentSimilarityModel,
+    VERSION_ID,
+    SIMILARITY_COLUMN
+)
+
+from .test_data import (
+    MANUSCRIPT_VERSION1,
+    MANUSCRIPT_ID2,
+    MANUSCRIPT_ID_FIELDS1, MANUSCRIPT_ID_FIELDS2,
+    MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2,
+    VALID_DECISIONS, VALID_MANUSCRIPT_TYPES,
+    PUBLISHED_DECISIONS, PUBLISHED_MANUSCRIPT_TYPES
+)
+
+MANUSCRIPT_VERSION2 = {
+    **MANUSCRIPT_VERSION1,
+    **MANUSCRIPT_ID_FIELDS2,
+    'manuscript_id': MANUSCRIPT_ID2
+}
+
+DOCVEC1 = [1.0, 0.0]
+DOCVEC2 = [1.0, 1.0]
+
+
+def _ml_manuscript_data(id_fields, docvec):
+    return {**id_fields, 'lda_docvec': docvec, 'doc2vec_docvec': docvec}
+
+
+DATASET = {
+    'manuscript_version': [MANUSCRIPT_VERSION1, MANUSCRIPT_VERSION2],
+    'ml_manuscript_data': [
+        _ml_manuscript_data(MANUSCRIPT_ID_FIELDS1, DOCVEC1),
+        _ml_manuscript_data(MANUSCRIPT_ID_FIELDS2, DOCVEC2)
+    ]
+}
+
+
+@contextmanager
+def create_similarity_model(dataset, predicted_docvec=None):
+    with populated_in_memory_database(dataset) as db:
+        manuscript_model = ManuscriptModel(
+            db,
+            valid_decisions=VALID_DECISIONS,
+            valid_manuscript_types=VALID_MANUSCRIPT_TYPES,
+            published_decisions=PUBLISHED_DECISIONS,
+            published_manuscript_types=PUBLISHED_MANUSCRIPT_TYPES
+        )
+        predict_model = MagicMock(name='predict_model')
+        predict_model.transform.return_value = [predicted_docvec]
+        yield DocumentSimilarityModel(
+            db, manuscript_model=manuscript_model,
+            lda_docvec_predict_model=predict_model,
+            doc2vec_docvec_predict_model=predict_model
+        )
+
+
+def _similarity_by_version_id(df):
+    return df.set_index(VERSION_ID)[SIMILARITY_COLUMN].to_dict()
+
+
+@pytest.mark.slow
+class TestDocumentSimilarityModel:
+    class TestFindSimilarManuscripts:
+        def test_should_exclude_passed_in_version_ids(self):
+            with create_similarity_model(DATASET) as similarity_model:
+                result = _similarity_by_version_id(
+                    similarity_model.find_similar_manuscripts([MANUSCRIPT_VERSION_ID1])
+                )
+                assert result.keys() == {MANUSCRIPT_VERSION_ID2}
+                assert result[MANUSCRIPT_VERSION_ID2] == pytest.approx(0.5 ** 0.5)
+
+        def test_should_return_empty_result_if_all_version_ids_are_excluded(self):
+            with create_similarity_model(DATASET) as similarity_model:
+                result = similarity_model.find_similar_manuscripts([
+                    MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2
+                ])
+                assert len(result) == 0
+
+    class TestFindSimilarManuscriptsToAbstract:
+        def test_should_compare_predicted_docvec_with_all_manuscripts(self):
+            with create_similarity_model(DATASET, predicted_docvec=DOCVEC1) as similarity_model:
+                result = _similarity_by_version_id(
+                    similarity_model.find_similar_manuscripts_to_abstract('abstract')
+                )
+                assert result == {
+                    MANUSCRIPT_VERSION_ID1: pytest.approx(1.0),
+                    MANUSCRIPT_VERSION_ID2: pytest.approx(0.5 ** 0.5)
+                }
+
+        def test_should_return_empty_result_without_docvecs(self):
+            with create_similarity_model({
+                'manuscript_version': [MANUSCRIPT_VERSION1]
+            }, predicted_docvec=DOCVEC1) as similarity_model:
+                result = similarity_model.find_similar_manuscripts_to_abstract('abstract')
+                assert len(result) == 0
@@ -6,6 +6,7 @@ import pytest
 import pandas as pd
 
 from peerscout.shared.database import populated_in_memory_database
+from peerscout.utils.timing import collecting_timings
 
 from peerscout.server.services.ManuscriptModel import ManuscriptModel
 from peerscout.server.services.DocumentSimilarityModel import DocumentSimilarityModel
@@ -800,6 +801,18 @@ class TestRecommendReviewers:
             logger.debug("result_person: %s", PP.pformat(result_person))
             assert result_person.get('memberships') == [MEMBERSHIP1_RESULT]
 
+        def test_matching_one_keyword_author_should_return_person_status(self, logger):
+            dataset = {
+                'person': [{**PERSON1, 'status': 'Active'}],
+                'manuscript_version': [MANUSCRIPT_VERSION1],
+                'manuscript_author': [AUTHOR1],
+                'manuscript_keyword': [MANUSCRIPT_KEYWORD1]
+            }
+            result = recommend_for_dataset(dataset, keywords=KEYWORD1, manuscript_no='')
+            result_person = result['potential_reviewers'][0]['person']
+            logger.debug("result_person: %s", PP.pformat(result_person))
+            assert result_person.get('status') == 'Active'
+
         def test_matching_one_keyword_author_should_return_other_accepted_papers(self, logger):
             dataset = {
                 'person': [PERSON1],
@@ -1103,6 +1116,19 @@ class TestRecommendReviewers:
                 PERSON_ID1: 1.0
             }
 
+    class TestTiming:
+        def test_should_collect_stage_timings_of_recommendation(self):
+            dataset = {
+                'manuscript_version': [MANUSCRIPT_VERSION1],
+                'manuscript_keyword': [MANUSCRIPT_KEYWORD1]
+            }
+            with create_recommend_reviewers(dataset) as recommend_reviewers:
+                with collecting_timings() as timings:
+                    recommend_reviewers.recommend(keywords=KEYWORD1)
+            assert {
+                'recommend', 'find_manuscripts_by_keywords', 'populate_potential_reviewers'
+            } <= set(timings.duration_by_stage.keys())
+
     class TestAllKeywords:
         def test_should_include_manuscript_keywords_in_all_keywords(self):
             dataset = {
@@ -1120,6 +1146,21 @@ class TestRecommendReviewers:
             with create_recommend_reviewers(dataset) as recommend_reviewers:
                 assert recommend_reviewers.get_all_keywords() == [KEYWORD1]
 
+    class TestSearchKeywords:
+        def test_should_find_manuscript_and_person_keywords_by_prefix(self):
+            dataset = {
+                'person': [PERSON1],
+                'person_keyword': [{PERSON_ID: PERSON_ID1, 'keyword': 'abc'}],
+                'manuscript_version': [MANUSCRIPT_VERSION1],
+                'manuscript_keyword': [
+                    {**MANUSCRIPT_ID_FIELDS1, 'keyword': 'abd'},
+                    {**MANUSCRIPT_ID_FIELDS1, 'keyword': 'ABC'}
+                ]
+            }
+            with create_recommend_reviewers(dataset) as recommend_reviewers:
+                assert recommend_reviewers.search_keywords('AB') == ['ABC', 'abd']
+                assert recommend_reviewers.search_keywords('ab', limit=1) == ['ABC']
+
     class TestUserHasRoleByEmail:
         def test_should_return_wether_user_has_role(self):
             dataset = {
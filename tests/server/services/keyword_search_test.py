@@ -0,0 +1,84 @@
+from peerscout.server.services.keyword_search import (
+    KeywordSearchIndex,
+    PRECOMPUTED_PREFIX_LENGTH,
+    merge_keyword_counts
+)
+
+KEYWORD1 = 'keyword1'
+KEYWORD2 = 'keyword2'
+OTHER_KEYWORD = 'other'
+
+
+def _generate_keyword_counts(size):
+    return {
+        'a%05d' % i: (i * 7919) % 97
+        for i in range(size)
+    }
+
+
+def _get_expected_ranking(keyword_counts, prefix):
+    return sorted(
+        (keyword for keyword in keyword_counts if keyword.startswith(prefix)),
+        key=lambda keyword: (-keyword_counts[keyword], keyword)
+    )
+
+
+class TestMergeKeywordCounts:
+    def test_should_add_counts_of_same_keyword(self):
+        assert merge_keyword_counts([
+            {KEYWORD1: 1, KEYWORD2: 2},
+            {KEYWORD1: 10}
+        ]) == {KEYWORD1: 11, KEYWORD2: 2}
+
+
+class TestKeywordSearchIndex:
+    def test_should_return_empty_list_for_blank_prefix(self):
+        index = KeywordSearchIndex({KEYWORD1: 1})
+        assert index.search('') == []
+        assert index.search(None) == []
+
+    def test_should_return_keywords_matching_prefix(self):
+        index = KeywordSearchIndex({KEYWORD1: 1, OTHER_KEYWORD: 1})
+        assert index.search(KEYWORD1[:3]) == [KEYWORD1]
+
+    def test_should_match_prefix_case_insensitive(self):
+        index = KeywordSearchIndex({'MixedCase': 1})
+        assert index.search('mIXED') == ['MixedCase']
+
+    def test_should_rank_keywords_by_frequency_then_alphabetically(self):
+        index = KeywordSearchIndex({'abc': 1, 'abd': 5, 'abb': 1})
+        assert index.search('ab') == ['abd', 'abb', 'abc']
+
+    def test_should_limit_results(self):
+        index = KeywordSearchIndex({'abc': 1, 'abd': 5, 'abb': 1})
+        assert index.search('ab', limit=2) == ['abd', 'abb']
+
+    def test_should_combine_keywords_only_differing_in_case(self):
+        index = KeywordSearchIndex({'abc': 1, 'ABC': 2, 'abd': 2})
+        assert index.search('ab') == ['ABC', 'abd']
+        assert len(index) == 2
+
+    def test_should_return_precomputed_ranking_for_short_prefix(self):
+        keyword_counts = _generate_keyword_counts(10000)
+        index = KeywordSearchIndex(keyword_counts, max_limit=20)
+        for prefix in ['a', 'a0', 'a00'][:PRECOMPUTED_PREFIX_LENGTH]:
+            expected = _get_expected_ranking(keyword_counts, prefix)
+            assert index.search(prefix, limit=20) == expected[:20]
+            assert index.search(prefix, limit=5) == expected[:5]
+
+    def test_should_rank_prefix_range_for_limit_above_max_limit(self):
+        keyword_counts = _generate_keyword_counts(1000)
+        index = KeywordSearchIndex(keyword_counts, max_limit=5)
+        expected = _get_expected_ranking(keyword_counts, 'a')
+        assert index.search('a', limit=10) == expected[:10]
+        assert index.search('a') == expected
+
+    def test_should_rank_prefix_range_for_prefix_longer_than_precomputed(self):
+        keyword_counts = _generate_keyword_counts(1000)
+        index = KeywordSearchIndex(keyword_counts, precomputed_prefix_length=1)
+        expected = _get_expected_ranking(keyword_counts, 'a00')
+        assert index.search('A00', limit=3) == expected[:3]
+
+    def test_should_return_empty_list_for_short_prefix_without_matches(self):
+        index = KeywordSearchIndex({KEYWORD1: 1})
+        assert index.search('x', limit=10) == []
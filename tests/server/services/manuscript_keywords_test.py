@@ -73,6 +73,20 @@ class TestManuscriptKeywordService:
                     {MANUSCRIPT_VERSION_ID1: 1.0}
                 )
 
+        def test_should_match_valid_manuscript_of_many_valid_version_ids(self):
+            dataset = {
+                'manuscript_version': [MANUSCRIPT_VERSION1],
+                'manuscript_keyword': [{**MANUSCRIPT_ID_FIELDS1, 'keyword': KEYWORD1}]
+            }
+            valid_version_ids = [MANUSCRIPT_VERSION_ID1] + ['other%d' % i for i in range(2000)]
+            with create_manuscript_keyword_service(
+                    dataset, valid_version_ids=valid_version_ids
+                ) as manuscript_keyword_service:
+                assert (
+                    manuscript_keyword_service.get_keyword_scores([KEYWORD1]) ==
+                    {MANUSCRIPT_VERSION_ID1: 1.0}
+                )
+
         def test_should_not_match_invalid_manuscripts(self):
             dataset = {
                 'manuscript_version': [MANUSCRIPT_VERSION1],
@@ -139,6 +153,32 @@ class TestManuscriptKeywordService:
                     set()
                 )
 
+    class TestGetKeywordCounts:
+        def test_should_count_manuscripts_by_keyword(self):
+            dataset = {
+                'manuscript_version': [MANUSCRIPT_VERSION1],
+                'manuscript_keyword': [
+                    {**MANUSCRIPT_ID_FIELDS1, 'keyword': KEYWORD1},
+                    {**MANUSCRIPT_ID_FIELDS1, 'keyword': KEYWORD2},
+                    {**MANUSCRIPT_ID_FIELDS2, 'keyword': KEYWORD1}
+                ]
+            }
+            with create_manuscript_keyword_service(dataset) as manuscript_keyword_service:
+                assert (
+                    manuscript_keyword_service.get_keyword_counts() ==
+                    {KEYWORD1: 2, KEYWORD2: 1}
+                )
+
+        def test_should_not_count_keywords_of_invalid_manuscripts(self):
+            dataset = {
+                'manuscript_version': [MANUSCRIPT_VERSION1],
+                'manuscript_keyword': [{**MANUSCRIPT_ID_FIELDS1, 'keyword': KEYWORD1}]
+            }
+            with create_manuscript_keyword_service(
+                    dataset, valid_version_ids=['other']
+                ) as manuscript_keyword_service:
+                assert manuscript_keyword_service.get_keyword_counts() == {}
+
     class TestGetKeywordsByIds:
         def test_should_return_none_if_manuscript_has_no_keywords(self):
             dataset = {
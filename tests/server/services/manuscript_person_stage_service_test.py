@@ -80,3 +80,22 @@ class TestManuscriptPersonStageService:
                         MANUSCRIPT_VERSION_ID1: {PERSON_ID1}
                     }
                 )
+
+        def test_should_return_person_ids_of_many_version_ids(self):
+            dataset = {
+                'manuscript_version': [MANUSCRIPT_VERSION1],
+                'manuscript_stage': [{
+                    **MANUSCRIPT_ID_FIELDS1, 'person_id': PERSON_ID1,
+                    'stage_timestamp': pd.Timestamp('2017-01-01'),
+                    'stage_name': StageNames.REVIEW_RECEIVED
+                }]
+            }
+            version_ids = [MANUSCRIPT_VERSION_ID1] + ['other%d' % i for i in range(2000)]
+            with create_manuscript_person_stage_service(dataset) as service:
+                assert (
+                    service.get_person_ids_by_version_id_for_stage_names(
+                        version_ids, [StageNames.REVIEW_RECEIVED]
+                    ) == {
+                        MANUSCRIPT_VERSION_ID1: {PERSON_ID1}
+                    }
+                )
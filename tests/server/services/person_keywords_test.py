@@ -12,8 +12,8 @@ from peerscout.server.services.person_keywords import (
 
 from .test_data import (
     PERSON_ID,
-    PERSON_ID1,
-    PERSON1
+    PERSON_ID1, PERSON_ID2,
+    PERSON1, PERSON2
 )
 
 KEYWORD1 = 'keyword1'
@@ -124,6 +124,30 @@ class TestPersonKeywordService:
                     set()
                 )
 
+    class TestGetKeywordCounts:
+        def test_should_count_persons_by_keyword(self):
+            dataset = {
+                'person': [PERSON1, PERSON2],
+                'person_keyword': [
+                    {PERSON_ID: PERSON_ID1, 'keyword': KEYWORD1},
+                    {PERSON_ID: PERSON_ID1, 'keyword': KEYWORD2},
+                    {PERSON_ID: PERSON_ID2, 'keyword': KEYWORD1}
+                ]
+            }
+            with create_person_keyword_service(dataset) as person_keyword_service:
+                assert (
+                    person_keyword_service.get_keyword_counts() ==
+                    {KEYWORD1: 2, KEYWORD2: 1}
+                )
+
+        def test_should_not_count_keywords_of_inactive_persons(self):
+            dataset = {
+                'person': [{**PERSON1, 'status': Person.Status.INACTIVE}],
+                'person_keyword': [{PERSON_ID: PERSON_ID1, 'keyword': KEYWORD1}]
+            }
+            with create_person_keyword_service(dataset) as person_keyword_service:
+                assert person_keyword_service.get_keyword_counts() == {}
+
 
 class TestGetPersonIdsOfPersonKeywordsScores:
     def test_should_return_keys(self):
@@ -49,6 +49,18 @@ class TestPersonRoleService:
                     {PERSON_ID1}
                 )
 
+        def test_should_include_person_with_specified_role_of_many_person_ids(self):
+            dataset = {
+                'person': [PERSON1],
+                'person_role': [{PERSON_ID: PERSON_ID1, 'role': ROLE_1}]
+            }
+            person_ids = {PERSON_ID1} | {'other%d' % i for i in range(2000)}
+            with create_person_role_service(dataset) as person_role_service:
+                assert (
+                    person_role_service.filter_person_ids_by_role(person_ids, ROLE_1) ==
+                    {PERSON_ID1}
+                )
+
         def test_should_not_include_other_persons(self):
             dataset = {
                 'person': [PERSON1],
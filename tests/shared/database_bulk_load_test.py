@@ -0,0 +1,116 @@
+from collections import namedtuple
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from peerscout.shared.database import populated_in_memory_database
+from peerscout.shared.database_schema import ManuscriptStage, ML_ManuscriptData
+from peerscout.shared.database_bulk_load import (
+    BulkLoadMethods,
+    copy_from_stdin,
+    format_csv_value,
+    get_to_sql_insert_method,
+    DEFAULT_STAGED_LOAD_TABLE_NAMES,
+    parse_bulk_load_method,
+    parse_bulk_load_method_by_table_name,
+    parse_staged_load_table_names
+)
+
+PandasTable = namedtuple('PandasTable', ['name', 'schema'])
+
+
+class TestParseBulkLoadMethod:
+    def test_should_default_to_auto(self):
+        assert parse_bulk_load_method(None) == BulkLoadMethods.AUTO
+
+    def test_should_reject_unknown_method(self):
+        with pytest.raises(ValueError):
+            parse_bulk_load_method('other')
+
+    def test_should_parse_method_by_table_name(self):
+        assert parse_bulk_load_method_by_table_name(
+            'table1=copy, table2=executemany'
+        ) == {'table1': BulkLoadMethods.COPY, 'table2': BulkLoadMethods.EXECUTEMANY}
+
+
+class TestParseStagedLoadTableNames:
+    def test_should_default_to_large_composite_key_tables_on_postgresql(self):
+        assert parse_staged_load_table_names(None, 'postgresql') == (
+            DEFAULT_STAGED_LOAD_TABLE_NAMES
+        )
+
+    def test_should_default_to_no_tables_on_sqlite(self):
+        assert parse_staged_load_table_names(None, 'sqlite') == []
+
+    def test_should_parse_configured_table_names(self):
+        assert parse_staged_load_table_names('table1, table2', 'postgresql') == [
+            'table1', 'table2'
+        ]
+
+    def test_should_allow_disabling_staged_load_of_all_tables(self):
+        assert parse_staged_load_table_names('', 'postgresql') == []
+
+
+class TestFormatCsvValue:
+    def test_should_format_none_as_unquoted_empty_value(self):
+        assert format_csv_value(None) == ''
+
+    def test_should_quote_empty_string(self):
+        assert format_csv_value('') == '""'
+
+    def test_should_escape_quotes(self):
+        assert format_csv_value('a"b') == '"a""b"'
+
+
+class TestGetToSqlInsertMethod:
+    def test_should_use_copy_on_postgresql_by_default(self):
+        assert get_to_sql_insert_method(
+            BulkLoadMethods.AUTO, 'postgresql', ManuscriptStage.__table__
+        ) is copy_from_stdin
+
+    def test_should_not_use_copy_for_table_with_array_column(self):
+        assert get_to_sql_insert_method(
+            BulkLoadMethods.AUTO, 'postgresql', ML_ManuscriptData.__table__
+        ) is None
+
+    def test_should_use_executemany_on_sqlite_by_default(self):
+        assert get_to_sql_insert_method(
+            BulkLoadMethods.AUTO, 'sqlite', ManuscriptStage.__table__
+        ) is None
+
+    def test_should_reject_copy_on_sqlite(self):
+        with pytest.raises(ValueError):
+            get_to_sql_insert_method(BulkLoadMethods.COPY, 'sqlite', ManuscriptStage.__table__)
+
+
+class TestCopyFromStdin:
+    def test_should_pass_csv_rows_to_copy_expert(self):
+        conn = MagicMock(name='conn')
+        conn.dialect = postgresql.dialect()
+        cursor = conn.connection.cursor.return_value
+        copied = {}
+        cursor.copy_expert.side_effect = lambda sql, stream: copied.update(
+            sql=sql, data=stream.read()
+        )
+        copy_from_stdin(
+            PandasTable(name='person', schema=None), conn, ['person_id', 'first_name'],
+            iter([('p1', 'John'), ('p2', None)])
+        )
+        assert copied == {
+            'sql': 'COPY person (person_id, first_name) FROM STDIN WITH (FORMAT csv)',
+            'data': '"p1","John"\n"p2",\n'
+        }
+        cursor.close.assert_called()
+
+
+@pytest.mark.slow
+class TestWriteFrame:
+    def test_should_write_frame_using_executemany_on_sqlite(self):
+        with populated_in_memory_database({}) as db:
+            db.person.write_frame(
+                pd.DataFrame([{'person_id': 'p1', 'is_early_career_researcher': False}]),
+                bulk_load_method=BulkLoadMethods.EXECUTEMANY, index=False
+            )
+            assert db.person.count() == 1
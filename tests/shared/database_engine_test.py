@@ -0,0 +1,72 @@
+from unittest.mock import MagicMock
+
+import pytest
+import sqlalchemy
+
+from peerscout.shared.database import Database
+from peerscout.shared.database_engine import (
+    get_engine_pool_kwargs,
+    set_local_statement_timeout
+)
+from peerscout.utils.config import dict_to_config
+
+SLOW_QUERY = (
+    'with recursive c(x) as (select 1 union all select x + 1 from c where x < 100000000)'
+    ' select count(*) from c'
+)
+
+
+def _db_config(d):
+    return dict_to_config({'database': d})['database']
+
+
+class TestGetEnginePoolKwargs:
+    def test_should_return_no_options_by_default(self):
+        assert get_engine_pool_kwargs(_db_config({}), 'postgresql') == {}
+
+    def test_should_return_pool_sizing_and_pre_ping(self):
+        assert get_engine_pool_kwargs(_db_config({
+            'pool_size': '10', 'max_overflow': '5', 'pool_recycle': '3600',
+            'pool_pre_ping': 'true'
+        }), 'postgresql') == {
+            'pool_size': 10, 'max_overflow': 5, 'pool_recycle': 3600, 'pool_pre_ping': True
+        }
+
+    def test_should_ignore_pool_sizing_for_sqlite(self):
+        assert get_engine_pool_kwargs(_db_config({
+            'pool_size': '10', 'pool_pre_ping': 'true'
+        }), 'sqlite') == {'pool_pre_ping': True}
+
+
+class TestSetLocalStatementTimeout:
+    def test_should_set_local_statement_timeout_in_milliseconds_on_postgresql(self):
+        connection = MagicMock(name='connection')
+        connection.dialect.name = 'postgresql'
+        set_local_statement_timeout(connection, 1.5)
+        statement = connection.execute.call_args[0][0]
+        assert str(statement) == 'SET LOCAL statement_timeout = 1500'
+
+    def test_should_reject_unsupported_dialect(self):
+        connection = MagicMock(name='connection')
+        connection.dialect.name = 'other'
+        with pytest.raises(Exception):
+            set_local_statement_timeout(connection, 1.5)
+
+
+@pytest.mark.slow
+class TestSqliteStatementTimeout:
+    def test_should_interrupt_slow_statement_within_transaction(self):
+        db = Database(
+            sqlalchemy.create_engine('sqlite://'), autocommit=True, statement_timeout=0.01
+        )
+        with pytest.raises(sqlalchemy.exc.OperationalError):
+            with db.begin():
+                db.session.execute(SLOW_QUERY)
+
+    def test_should_not_interrupt_statement_outside_of_transaction(self):
+        db = Database(
+            sqlalchemy.create_engine('sqlite://'), autocommit=True, statement_timeout=0.01
+        )
+        with db.begin():
+            assert db.session.execute('select 1').scalar() == 1
+        assert db.session.execute(SLOW_QUERY.replace('100000000', '100000')).scalar() == 100000
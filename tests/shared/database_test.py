@@ -0,0 +1,433 @@
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+import sqlalchemy
+
+import peerscout.shared.database as database_module
+from peerscout.shared.database import (
+    connect_configured_database,
+    empty_in_memory_database,
+    populated_in_memory_database
+)
+from peerscout.utils.config import dict_to_config
+
+PERSON_ID = 'person_id'
+
+PERSON_ID1 = 'person1'
+PERSON_ID2 = 'person2'
+
+PERSON1 = {PERSON_ID: PERSON_ID1, 'first_name': 'John'}
+PERSON2 = {PERSON_ID: PERSON_ID2, 'first_name': 'Jane'}
+
+ROLE_1 = 'role1'
+ROLE_2 = 'role2'
+
+MANUSCRIPT_ID1 = 'manuscript1'
+VERSION_ID1 = 'manuscript1-1'
+
+STAGE_NAME1 = 'Review Received'
+
+
+def _person_first_name_by_id(db):
+    return {p.person_id: p.first_name for p in db.person.get_all()}
+
+
+def _person_roles(db):
+    return {(r.person_id, r.role) for r in db.person_role.get_all()}
+
+
+@pytest.mark.slow
+class TestEntity:
+    class TestUpdateOrCreateList:
+        def test_should_insert_new_and_update_existing_rows(self):
+            with populated_in_memory_database({'person': [PERSON1]}) as db:
+                db.person.update_or_create_list([
+                    {**PERSON1, 'first_name': 'updated'},
+                    PERSON2
+                ])
+                assert _person_first_name_by_id(db) == {
+                    PERSON_ID1: 'updated',
+                    PERSON_ID2: PERSON2['first_name']
+                }
+
+        def test_should_not_update_columns_not_passed_in(self):
+            with populated_in_memory_database({'person': [PERSON1]}) as db:
+                db.person.update_or_create_list([{PERSON_ID: PERSON_ID1, 'last_name': 'Smith'}])
+                person = db.person.get(PERSON_ID1)
+                assert (person.first_name, person.last_name) == (PERSON1['first_name'], 'Smith')
+
+        def test_should_use_last_row_with_same_primary_key(self):
+            with populated_in_memory_database({}) as db:
+                db.person.update_or_create_list([
+                    PERSON1, {**PERSON1, 'first_name': 'updated'}
+                ])
+                assert _person_first_name_by_id(db) == {PERSON_ID1: 'updated'}
+
+        def test_should_support_composite_primary_key(self):
+            dataset = {
+                'person': [PERSON1],
+                'person_role': [{PERSON_ID: PERSON_ID1, 'role': ROLE_1}]
+            }
+            with populated_in_memory_database(dataset) as db:
+                db.person_role.update_or_create_list([
+                    {PERSON_ID: PERSON_ID1, 'role': ROLE_1},
+                    {PERSON_ID: PERSON_ID1, 'role': ROLE_2}
+                ])
+                assert _person_roles(db) == {(PERSON_ID1, ROLE_1), (PERSON_ID1, ROLE_2)}
+
+        def test_should_insert_more_rows_than_fit_into_a_single_statement(self):
+            persons = [
+                {PERSON_ID: 'person%d' % i, 'first_name': 'name%d' % i}
+                for i in range(1500)
+            ]
+            with populated_in_memory_database({}) as db:
+                db.person.update_or_create_list(persons)
+                assert db.person.count() == len(persons)
+
+    class TestDeleteStale:
+        def test_should_remove_rows_of_replace_key_no_longer_present(self):
+            dataset = {
+                'person': [PERSON1, PERSON2],
+                'person_role': [
+                    {PERSON_ID: PERSON_ID1, 'role': ROLE_1},
+                    {PERSON_ID: PERSON_ID1, 'role': ROLE_2},
+                    {PERSON_ID: PERSON_ID2, 'role': ROLE_1}
+                ]
+            }
+            with populated_in_memory_database(dataset) as db:
+                assert db.person_role.delete_stale(
+                    [{PERSON_ID: PERSON_ID1, 'role': ROLE_2}],
+                    replace_key=PERSON_ID
+                ) == 1
+                assert _person_roles(db) == {(PERSON_ID1, ROLE_2), (PERSON_ID2, ROLE_1)}
+
+    class TestRowChanges:
+        def test_should_detect_inserted_updated_and_unchanged_rows(self):
+            with populated_in_memory_database({'person': [PERSON1, PERSON2]}) as db:
+                changes = db.person.get_row_changes([
+                    PERSON1,
+                    {**PERSON2, 'first_name': 'updated'},
+                    {PERSON_ID: 'person3', 'first_name': 'new'}
+                ])
+                assert changes.get_counts() == {
+                    'inserted': 1, 'updated': 1, 'deleted': 0, 'unchanged': 1
+                }
+                assert [o[PERSON_ID] for o in changes.updated] == [PERSON_ID2]
+                assert [o[PERSON_ID] for o in changes.inserted] == ['person3']
+
+        def test_should_only_compare_columns_passed_in(self):
+            with populated_in_memory_database({'person': [PERSON1]}) as db:
+                db.person.update_list([{PERSON_ID: PERSON_ID1, 'last_name': 'Smith'}])
+                changes = db.person.get_row_changes([PERSON1])
+                assert changes.unchanged_count == 1
+
+        def test_should_consider_timestamps_and_nulls_unchanged(self):
+            dataset = {
+                'person': [PERSON1],
+                'manuscript': [{'manuscript_id': MANUSCRIPT_ID1}],
+                'manuscript_version': [{
+                    'version_id': VERSION_ID1, 'manuscript_id': MANUSCRIPT_ID1
+                }]
+            }
+            stage = {
+                'version_id': VERSION_ID1, 'person_id': PERSON_ID1,
+                'stage_timestamp': pd.Timestamp('2017-01-01 10:11:12'),
+                'stage_name': STAGE_NAME1, 'triggered_by_person_id': None
+            }
+            with populated_in_memory_database(dataset) as db:
+                db.manuscript_stage.create_list([stage])
+                changes = db.manuscript_stage.get_row_changes([
+                    {**stage, 'triggered_by_person_id': float('nan')}
+                ], replace_key='version_id')
+                assert changes.get_counts()['unchanged'] == 1
+
+        def test_should_delete_rows_of_replace_key_no_longer_present(self):
+            dataset = {
+                'person': [PERSON1, PERSON2],
+                'person_role': [
+                    {PERSON_ID: PERSON_ID1, 'role': ROLE_1},
+                    {PERSON_ID: PERSON_ID1, 'role': ROLE_2},
+                    {PERSON_ID: PERSON_ID2, 'role': ROLE_1}
+                ]
+            }
+            with populated_in_memory_database(dataset) as db:
+                changes = db.person_role.get_row_changes(
+                    [{PERSON_ID: PERSON_ID1, 'role': ROLE_2}],
+                    replace_key=PERSON_ID
+                )
+                assert changes.deleted_keys == [(PERSON_ID1, ROLE_1)]
+                db.person_role.apply_row_changes(changes)
+                assert _person_roles(db) == {(PERSON_ID1, ROLE_2), (PERSON_ID2, ROLE_1)}
+
+        def test_should_apply_inserted_and_updated_rows(self):
+            with populated_in_memory_database({'person': [PERSON1]}) as db:
+                db.person.apply_row_changes(db.person.get_row_changes([
+                    {**PERSON1, 'first_name': 'updated'}, PERSON2
+                ]))
+                assert _person_first_name_by_id(db) == {
+                    PERSON_ID1: 'updated',
+                    PERSON_ID2: PERSON2['first_name']
+                }
+
+    class TestStagedLoad:
+        def test_should_replace_rows_of_replace_key_using_staging_table(self):
+            dataset = {
+                'person': [PERSON1, PERSON2],
+                'person_role': [
+                    {PERSON_ID: PERSON_ID1, 'role': ROLE_1},
+                    {PERSON_ID: PERSON_ID2, 'role': ROLE_1}
+                ]
+            }
+            with populated_in_memory_database(dataset) as db:
+                staging_table = db.person_role.stage_records([
+                    {PERSON_ID: PERSON_ID1, 'role': ROLE_2},
+                    {PERSON_ID: PERSON_ID1, 'role': ROLE_2}
+                ])
+                assert db.person_role.delete_stale_staged(staging_table, PERSON_ID) == 1
+                assert db.person_role.upsert_staged(staging_table) == 1
+                assert _person_roles(db) == {(PERSON_ID1, ROLE_2), (PERSON_ID2, ROLE_1)}
+
+        def test_should_only_update_staged_columns(self):
+            with populated_in_memory_database({'person': [PERSON1]}) as db:
+                db.person.update_list([{PERSON_ID: PERSON_ID1, 'last_name': 'Smith'}])
+                staging_table = db.person.stage_records([
+                    {PERSON_ID: PERSON_ID1, 'first_name': 'updated'},
+                    {PERSON_ID: PERSON_ID2, 'first_name': PERSON2['first_name']}
+                ])
+                db.person.upsert_staged(staging_table)
+                assert _person_first_name_by_id(db) == {
+                    PERSON_ID1: 'updated', PERSON_ID2: PERSON2['first_name']
+                }
+                assert db.person.get(PERSON_ID1).last_name == 'Smith'
+
+    class TestReadFrame:
+        def test_should_read_all_columns_indexed_by_primary_key(self):
+            with populated_in_memory_database({'person': [PERSON1]}) as db:
+                df = db.person.read_frame()
+                assert df.index.name == PERSON_ID
+                assert df.loc[PERSON_ID1, 'first_name'] == PERSON1['first_name']
+                assert df.loc[PERSON_ID1, 'last_name'] is None
+
+        def test_should_only_read_selected_columns(self):
+            with populated_in_memory_database({'person': [PERSON1]}) as db:
+                df = db.person.read_frame(columns=['first_name'])
+                assert list(df.reset_index().columns) == [PERSON_ID, 'first_name']
+
+        def test_should_filter_rows(self):
+            with populated_in_memory_database({'person': [PERSON1, PERSON2]}) as db:
+                df = db.person.read_frame(where=db.person.table.first_name == 'Jane')
+                assert list(df.index) == [PERSON_ID2]
+
+        def test_should_read_frame_in_chunks(self):
+            with populated_in_memory_database({'person': [PERSON1, PERSON2]}) as db:
+                chunks = list(db.person.read_frame(chunksize=1))
+                assert [list(df.index) for df in chunks] == [[PERSON_ID1], [PERSON_ID2]]
+
+        def test_should_preserve_dtypes_and_use_categoricals(self):
+            dataset = {
+                'person': [PERSON1],
+                'manuscript': [{'manuscript_id': MANUSCRIPT_ID1}],
+                'manuscript_version': [{
+                    'version_id': VERSION_ID1, 'manuscript_id': MANUSCRIPT_ID1
+                }],
+                'manuscript_stage': [{
+                    'version_id': VERSION_ID1, 'person_id': PERSON_ID1,
+                    'stage_timestamp': pd.Timestamp('2017-01-01'), 'stage_name': STAGE_NAME1
+                }]
+            }
+            with populated_in_memory_database(dataset) as db:
+                df = db.manuscript_stage.read_frame(preserve_dtypes=True)
+                assert df['stage_name'].dtype.name == 'category'
+                assert pd.api.types.is_datetime64_any_dtype(df['stage_timestamp'])
+                assert pd.isnull(df['triggered_by_person_id'][0])
+
+        def test_should_use_nullable_integer_type_for_integers_with_nulls(self):
+            dataset = {
+                'person': [PERSON1, PERSON2],
+                'manuscript': [{'manuscript_id': MANUSCRIPT_ID1}],
+                'manuscript_version': [{
+                    'version_id': VERSION_ID1, 'manuscript_id': MANUSCRIPT_ID1
+                }],
+                'manuscript_author': [
+                    {'version_id': VERSION_ID1, 'person_id': PERSON_ID1, 'seq': 1},
+                    {'version_id': VERSION_ID1, 'person_id': PERSON_ID2, 'seq': None}
+                ]
+            }
+            with populated_in_memory_database(dataset) as db:
+                df = db.manuscript_author.read_frame(
+                    columns=['person_id', 'seq'], preserve_dtypes=True
+                ).sort_values('person_id')
+                assert df['seq'].dtype.name == 'Int64'
+                assert df['seq'].iloc[0] == 1
+                assert pd.isnull(df['seq'].iloc[1])
+
+    class TestRefreshMaterializedViews:
+        def test_should_only_refresh_review_stats_of_pending_persons(self):
+            dataset = {
+                'person': [PERSON1, PERSON2],
+                'manuscript': [{'manuscript_id': MANUSCRIPT_ID1}],
+                'manuscript_version': [{
+                    'version_id': VERSION_ID1, 'manuscript_id': MANUSCRIPT_ID1
+                }]
+            }
+            with populated_in_memory_database(dataset) as db:
+                db.manuscript_stage.create_list([{
+                    'version_id': VERSION_ID1, 'person_id': person_id,
+                    'stage_timestamp': pd.Timestamp('2017-01-01'),
+                    'stage_name': 'Contacting Reviewers'
+                } for person_id in [PERSON_ID1, PERSON_ID2]])
+                db.person_review_stats_refresh.create_list([{PERSON_ID: PERSON_ID1}])
+                db.commit()
+                assert db.refresh_materialized_views() == 1
+                assert list(db.person_review_stats_overall.read_frame().index) == [PERSON_ID1]
+                assert db.person_review_stats_refresh.count() == 0
+
+        def test_should_refresh_all_review_stats_if_full_refresh_was_requested(self):
+            dataset = {
+                'person': [PERSON1],
+                'manuscript': [{'manuscript_id': MANUSCRIPT_ID1}],
+                'manuscript_version': [{
+                    'version_id': VERSION_ID1, 'manuscript_id': MANUSCRIPT_ID1
+                }]
+            }
+            with populated_in_memory_database(dataset) as db:
+                db.manuscript_stage.create_list([{
+                    'version_id': VERSION_ID1, 'person_id': PERSON_ID1,
+                    'stage_timestamp': pd.Timestamp('2017-01-01'),
+                    'stage_name': 'Contacting Reviewers'
+                }])
+                db.commit()
+                db.refresh_materialized_views(full=True)
+                assert db.person_review_stats_overall.count() == 1
+
+
+def _get_index_names(db):
+    return {
+        row[0]
+        for row in db.engine.execute("select name from sqlite_master where type = 'index'")
+    }
+
+
+@pytest.mark.slow
+class TestDatabase:
+    class TestIndexes:
+        def test_should_create_schema_indexes(self):
+            with empty_in_memory_database() as db:
+                assert {
+                    'ix_person_email',
+                    'ix_person_keyword_lower_keyword',
+                    'ix_manuscript_stage_version_id_stage_name',
+                    'ix_manuscript_author_person_id'
+                } <= _get_index_names(db)
+
+        def test_should_create_missing_indexes_when_updating_schema(self):
+            with empty_in_memory_database() as db:
+                db.drop_indexes()
+                assert 'ix_person_email' not in _get_index_names(db)
+                db.update_schema()
+                assert {index.name for index in db.get_schema_indexes()} <= _get_index_names(db)
+
+        def test_should_use_functional_index_for_lower_keyword(self):
+            with empty_in_memory_database() as db:
+                query_plan = ' '.join(
+                    str(row[-1]) for row in db.engine.execute(
+                        'explain query plan select person_id from person_keyword'
+                        ' where lower(keyword) in (?)', 'keyword1'
+                    )
+                )
+                assert 'ix_person_keyword_lower_keyword' in query_plan
+
+    class TestInIdsCondition:
+        def _get_person_ids(self, db, ids, **kwargs):
+            with db.in_ids_condition(db.person.table.person_id, ids, **kwargs) as condition:
+                return {
+                    row[0] for row in db.session.query(db.person.table.person_id).filter(condition)
+                }
+
+        def test_should_filter_by_ids_below_threshold(self):
+            with populated_in_memory_database({'person': [PERSON1, PERSON2]}) as db:
+                assert self._get_person_ids(db, [PERSON_ID1, 'other']) == {PERSON_ID1}
+
+        def test_should_filter_by_ids_using_temporary_table_above_threshold(self):
+            with populated_in_memory_database({'person': [PERSON1, PERSON2]}) as db:
+                assert self._get_person_ids(
+                    db, [PERSON_ID1, PERSON_ID2, 'other', None], threshold=1
+                ) == {PERSON_ID1, PERSON_ID2}
+                assert list(db.session.execute(
+                    "select name from sqlite_temp_master where type = 'table'"
+                )) == []
+
+        def test_should_filter_by_more_ids_than_sqlite_parameter_limit(self):
+            ids = [PERSON_ID1] + ['other%d' % i for i in range(2000)]
+            with populated_in_memory_database({'person': [PERSON1, PERSON2]}) as db:
+                assert self._get_person_ids(db, ids) == {PERSON_ID1}
+
+        def test_should_use_temporary_table_with_autocommit_session(self):
+            with populated_in_memory_database(
+                    {'person': [PERSON1, PERSON2]}, autocommit=True) as db:
+                assert self._get_person_ids(
+                    db, [PERSON_ID1, 'other'], threshold=1
+                ) == {PERSON_ID1}
+
+    class TestSavepoint:
+        def test_should_only_roll_back_changes_within_failed_savepoint(self):
+            with empty_in_memory_database() as db:
+                db.person.create(**PERSON1)
+                with pytest.raises(RuntimeError):
+                    with db.savepoint():
+                        db.person.create(**PERSON2)
+                        db.session.flush()
+                        raise RuntimeError('failed')
+                with db.savepoint():
+                    db.person.update_or_create(**{**PERSON1, 'first_name': 'Updated'})
+                db.commit()
+                assert _person_first_name_by_id(db) == {PERSON_ID1: 'Updated'}
+
+        def test_should_not_commit_released_savepoint_outside_of_transaction(self, tmpdir):
+            database_url = 'sqlite:///%s' % tmpdir.join('test.db')
+            db = database_module.Database(sqlalchemy.create_engine(database_url))
+            other_db = database_module.Database(sqlalchemy.create_engine(database_url))
+            try:
+                db.update_schema()
+                with db.savepoint():
+                    db.person.create(**PERSON1)
+                assert _person_first_name_by_id(other_db) == {}
+                other_db.session.rollback()
+                db.commit()
+                assert _person_first_name_by_id(other_db) == {PERSON_ID1: 'John'}
+            finally:
+                other_db.close()
+                db.close()
+
+
+@pytest.mark.slow
+class TestConnectConfiguredDatabase:
+    @pytest.fixture(name='app_config')
+    def _app_config(self, tmpdir):
+        app_config = dict_to_config({'database': {
+            'name': 'sqlite:///%s' % tmpdir.join('primary.db'),
+            'read_only_url': 'sqlite:///%s' % tmpdir.join('replica.db'),
+            'request_statement_timeout': '10'
+        }})
+        with patch.object(database_module, 'get_app_config') as get_app_config_mock:
+            get_app_config_mock.return_value = app_config
+            yield app_config
+
+    def test_should_connect_to_primary_database_by_default(self, app_config):
+        db = connect_configured_database()
+        assert str(db.engine.url) == app_config['database']['name']
+        assert not db.read_only
+
+    def test_should_connect_to_read_only_replica_if_requested(self, app_config):
+        db = connect_configured_database(autocommit=True, read_only=True)
+        assert str(db.engine.url) == app_config['database']['read_only_url']
+        assert db.read_only
+        assert db.is_auto_commit()
+        assert db.statement_timeout == 10.0
+
+    @pytest.mark.usefixtures('app_config')
+    def test_should_not_use_temporary_table_for_read_only_replica(self):
+        db = connect_configured_database(read_only=True)
+        with db.in_ids_condition(db.person.table.person_id, ['id1', 'id2'], threshold=1) as c:
+            assert 'select' not in str(c).lower()
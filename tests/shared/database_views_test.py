@@ -0,0 +1,55 @@
+from peerscout.shared.database_views import (
+    PENDING_REFRESH_PERSON_CONDITION,
+    create_views,
+    get_create_view_statements,
+    get_refresh_view_statements
+)
+
+
+def _get_view(dialect, name):
+    return {view.__tablename__: view for view in create_views(dialect)}[name]
+
+
+class TestGetCreateViewStatements:
+    def test_should_create_table_for_incrementally_refreshed_view_on_postgresql(self):
+        view = _get_view('postgresql', 'person_review_stats_overall')
+        statements = get_create_view_statements('postgresql', view)
+        assert statements[0].startswith('CREATE TABLE person_review_stats_overall AS ')
+
+    def test_should_create_materialized_view_for_fully_refreshed_view_on_postgresql(self):
+        view = _get_view('postgresql', 'person_review_stats_last12m')
+        statements = get_create_view_statements('postgresql', view)
+        assert statements[0].startswith(
+            'CREATE MATERIALIZED VIEW person_review_stats_last12m AS '
+        )
+
+    def test_should_create_table_for_materialized_view_on_sqlite(self):
+        view = _get_view('sqlite', 'person_review_stats_last12m')
+        statements = get_create_view_statements('sqlite', view)
+        assert statements[0].startswith('CREATE TABLE person_review_stats_last12m AS ')
+
+
+class TestGetRefreshViewStatements:
+    def test_should_only_refresh_pending_persons_on_postgresql(self):
+        view = _get_view('postgresql', 'person_review_stats_overall')
+        statements = get_refresh_view_statements('postgresql', view)
+        assert statements[0] == 'DELETE FROM person_review_stats_overall WHERE {}'.format(
+            PENDING_REFRESH_PERSON_CONDITION
+        )
+        assert statements[1] == 'INSERT INTO person_review_stats_overall {}'.format(
+            view.__refresh_query__
+        )
+
+    def test_should_refresh_all_persons_on_postgresql_if_full_refresh_was_requested(self):
+        view = _get_view('postgresql', 'person_review_stats_overall')
+        statements = get_refresh_view_statements('postgresql', view, full=True)
+        assert statements == [
+            'DELETE FROM person_review_stats_overall',
+            'INSERT INTO person_review_stats_overall {}'.format(view.__query__)
+        ]
+
+    def test_should_refresh_materialized_view_concurrently_on_postgresql(self):
+        view = _get_view('postgresql', 'person_review_stats_last12m')
+        assert get_refresh_view_statements('postgresql', view) == [
+            'REFRESH MATERIALIZED VIEW CONCURRENTLY person_review_stats_last12m'
+        ]
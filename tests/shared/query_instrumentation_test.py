@@ -0,0 +1,81 @@
+import logging
+
+import pytest
+import sqlalchemy
+
+from peerscout.shared.query_instrumentation import (
+    collecting_query_stats,
+    format_parameters,
+    get_current_query_stats_collector,
+    get_statement_fingerprint,
+    instrument_engine
+)
+
+
+@pytest.fixture(name='engine')
+def _engine():
+    engine = sqlalchemy.create_engine('sqlite://')
+    engine.execute('create table t (id integer primary key, name text)')
+    engine.execute('insert into t (id, name) values (1, \'a\'), (2, \'b\')')
+    return engine
+
+
+class TestGetStatementFingerprint:
+    def test_should_replace_literals_and_parameters(self):
+        assert get_statement_fingerprint(
+            "select * from t where name = 'x' and id = 1 and other = ?"
+        ) == 'select * from t where name = ? and id = ? and other = ?'
+
+    def test_should_collapse_parameter_lists_and_whitespace(self):
+        assert get_statement_fingerprint(
+            'select *\n  from t where id in (%(id_1)s, %(id_2)s, %(id_3)s)'
+        ) == 'select * from t where id in (?...)'
+
+    def test_should_not_replace_postgresql_casts(self):
+        assert get_statement_fingerprint('select :x::text') == 'select ?::text'
+
+
+class TestFormatParameters:
+    def test_should_truncate_long_parameters(self):
+        assert format_parameters(('a' * 100,), max_length=10) == "('aaaaaaaa... (105 characters)"
+
+
+class TestInstrumentEngine:
+    def test_should_aggregate_statements_by_fingerprint(self, engine):
+        instrument_engine(engine)
+        with collecting_query_stats() as query_stats:
+            for i in [1, 2]:
+                engine.execute(sqlalchemy.text('select name from t where id = :id'), id=i)
+            engine.execute(
+                sqlalchemy.text('select name from t where id in (:id1, :id2)'), id1=1, id2=2
+            )
+        assert query_stats.query_count == 3
+        top_statements = query_stats.get_top_statements()
+        assert {
+            s['fingerprint']: (s['count'], s['max_parameter_count']) for s in top_statements
+        } == {
+            'select name from t where id = ?': (2, 1),
+            'select name from t where id in (?...)': (1, 2)
+        }
+        assert get_current_query_stats_collector() is None
+
+    def test_should_record_updated_row_count(self, engine):
+        instrument_engine(engine)
+        with collecting_query_stats() as query_stats:
+            engine.execute("update t set name = 'c'")
+        assert query_stats.get_top_statements()[0]['total_rows'] == 2
+
+    def test_should_log_slow_queries(self, engine, caplog):
+        instrument_engine(engine, slow_query_threshold=0)
+        with caplog.at_level(logging.WARNING):
+            engine.execute(sqlalchemy.text('select name from t where id = :id'), id=1)
+        assert 'slow query' in caplog.text
+        assert 'select name from t where id = ?' in caplog.text
+
+    def test_should_continue_recording_after_failed_statement(self, engine):
+        instrument_engine(engine)
+        with collecting_query_stats() as query_stats:
+            with pytest.raises(sqlalchemy.exc.OperationalError):
+                engine.execute('select * from unknown_table')
+            engine.execute('select * from t')
+        assert query_stats.query_count == 1
@@ -1,5 +1,6 @@
 from peerscout.utils.collection import (
     force_list,
+    iter_chunks,
     invert_set_dict
 )
 
@@ -15,6 +16,14 @@ class TestForceList:
         assert force_list(1) == [1]
 
 
+class TestIterChunks:
+    def test_should_return_no_chunks_for_empty_list(self):
+        assert list(iter_chunks([], 2)) == []
+
+    def test_should_split_into_chunks_with_smaller_last_chunk(self):
+        assert list(iter_chunks(iter([1, 2, 3, 4, 5]), 2)) == [[1, 2], [3, 4], [5]]
+
+
 class TestInvertSetDict:
     def test_should_return_empty_dict_for_empty_dict(self):
         assert invert_set_dict({}) == {}
@@ -0,0 +1,15 @@
+from peerscout.utils.html import unescape_and_strip_tags
+
+
+class TestUnescapeAndStripTags:
+    def test_should_return_plain_text_unchanged(self):
+        assert unescape_and_strip_tags('plain text; a > b') == 'plain text; a > b'
+
+    def test_should_unescape_entities(self):
+        assert unescape_and_strip_tags('a &amp; b') == 'a & b'
+
+    def test_should_strip_tags(self):
+        assert unescape_and_strip_tags('a <i>b</i> c') == 'a b c'
+
+    def test_should_strip_escaped_tags(self):
+        assert unescape_and_strip_tags('a &lt;i&gt;b&lt;/i&gt;') == 'a b'
@@ -0,0 +1,67 @@
+import pytest
+
+from peerscout.utils.metrics import MetricsRegistry
+
+NAME_1 = 'name1'
+DESCRIPTION_1 = 'description 1'
+
+
+class TestMetricsRegistry:
+    def test_should_return_empty_text_without_metrics(self):
+        assert MetricsRegistry().to_prometheus_text() == ''
+
+    def test_should_format_counter(self):
+        metrics_registry = MetricsRegistry()
+        counter = metrics_registry.counter(NAME_1, DESCRIPTION_1)
+        counter.inc()
+        counter.inc(2)
+        assert metrics_registry.to_prometheus_text().splitlines() == [
+            '# HELP %s %s' % (NAME_1, DESCRIPTION_1),
+            '# TYPE %s counter' % NAME_1,
+            '%s 3.0' % NAME_1
+        ]
+
+    def test_should_reject_duplicate_metric_name(self):
+        metrics_registry = MetricsRegistry()
+        metrics_registry.counter(NAME_1, DESCRIPTION_1)
+        with pytest.raises(ValueError):
+            metrics_registry.counter(NAME_1, DESCRIPTION_1)
+
+    def test_should_format_histogram_with_label(self):
+        metrics_registry = MetricsRegistry()
+        histogram = metrics_registry.histogram(
+            NAME_1, DESCRIPTION_1, label_name='stage', buckets=[0.1, 1.0]
+        )
+        histogram.observe(0.5, 'stage1')
+        histogram.observe(2.0, 'stage1')
+        assert histogram.get_count('stage1') == 2
+        assert metrics_registry.to_prometheus_text().splitlines() == [
+            '# HELP %s %s' % (NAME_1, DESCRIPTION_1),
+            '# TYPE %s histogram' % NAME_1,
+            '%s_bucket{stage="stage1",le="0.1"} 0' % NAME_1,
+            '%s_bucket{stage="stage1",le="1.0"} 1' % NAME_1,
+            '%s_bucket{stage="stage1",le="+Inf"} 2' % NAME_1,
+            '%s_sum{stage="stage1"} 2.5' % NAME_1,
+            '%s_count{stage="stage1"} 2' % NAME_1
+        ]
+
+    def test_should_format_histogram_without_label(self):
+        metrics_registry = MetricsRegistry()
+        histogram = metrics_registry.histogram(NAME_1, DESCRIPTION_1, buckets=[1.0])
+        histogram.observe(1.0)
+        assert metrics_registry.to_prometheus_text().splitlines()[2:] == [
+            '%s_bucket{le="1.0"} 1' % NAME_1,
+            '%s_bucket{le="+Inf"} 1' % NAME_1,
+            '%s_sum 1.0' % NAME_1,
+            '%s_count 1' % NAME_1
+        ]
+
+    def test_should_escape_label_values(self):
+        metrics_registry = MetricsRegistry()
+        histogram = metrics_registry.histogram(
+            NAME_1, DESCRIPTION_1, label_name='stage', buckets=[]
+        )
+        histogram.observe(1.0, 'a"b')
+        assert '%s_count{stage="a\\"b"} 1' % NAME_1 in (
+            metrics_registry.to_prometheus_text().splitlines()
+        )
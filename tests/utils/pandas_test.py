@@ -5,6 +5,7 @@ import pandas as pd
 
 from peerscout.utils.pandas import (
     groupby_agg_droplevel,
+    iter_records,
     replace_null_with_none
 )
 
@@ -92,3 +93,38 @@ class TestReplaceNullWithNone:
         assert replace_null_with_none(
             pd.DataFrame([[pd.NaT]])
         )[0][0] is None
+
+    def test_should_convert_all_columns_to_object(self):
+        df = replace_null_with_none(pd.DataFrame({
+            'int': [1], 'datetime': [pd.Timestamp('2017-01-01')]
+        }))
+        assert list(df.dtypes) == [np.dtype(object), np.dtype(object)]
+        assert df['datetime'][0] == pd.Timestamp('2017-01-01')
+
+    def test_should_keep_duplicate_column_names(self):
+        assert list(replace_null_with_none(
+            pd.DataFrame([[1, 2]], columns=['a', 'a'])
+        ).columns) == ['a', 'a']
+
+
+class TestIterRecords:
+    def test_should_return_records_with_null_replaced_with_none(self):
+        df = pd.DataFrame({
+            'int': [1, 2],
+            'float': [1.5, np.NaN],
+            'datetime': [pd.Timestamp('2017-01-01'), pd.NaT],
+            'str': ['a', None],
+            'list': [[1], None]
+        })
+        assert list(iter_records(df)) == [
+            {
+                'int': 1, 'float': 1.5, 'datetime': pd.Timestamp('2017-01-01'),
+                'str': 'a', 'list': [1]
+            },
+            {'int': 2, 'float': None, 'datetime': None, 'str': None, 'list': None}
+        ]
+
+    def test_should_not_change_dtypes_of_frame(self):
+        df = pd.DataFrame({'float': [np.NaN]})
+        list(iter_records(df))
+        assert df['float'].dtype == np.dtype(float)
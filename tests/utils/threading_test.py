@@ -1,10 +1,17 @@
+import threading
 from unittest.mock import Mock
 from concurrent.futures import ThreadPoolExecutor
 
+import pytest
+
 from peerscout.utils.threading import (
-    lazy_thread_local
+    lazy_thread_local,
+    SingleFlight
 )
 
+KEY_1 = 'key1'
+KEY_2 = 'key2'
+
 
 def _run_in_thread(callable_):
     with ThreadPoolExecutor(max_workers=1) as executor:
@@ -39,3 +46,69 @@ class TestLazyThreadLocal:
         )
         assert result == (creator.return_value, creator.return_value)
         assert creator.call_count == 2
+
+
+class TestSingleFlight:
+    def test_should_return_result_of_function(self):
+        single_flight = SingleFlight()
+        assert single_flight(KEY_1, lambda: 'result') == 'result'
+
+    def test_should_call_function_again_once_previous_call_completed(self):
+        single_flight = SingleFlight()
+        fn = Mock()
+        single_flight(KEY_1, fn)
+        single_flight(KEY_1, fn)
+        assert fn.call_count == 2
+        assert single_flight.coalesced_count == 0
+
+    def test_should_share_result_of_in_flight_call_with_same_key(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        fn = Mock(side_effect=lambda: (started.set(), release.wait(), 'result')[-1])
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(single_flight, KEY_1, fn)
+            started.wait()
+            second = executor.submit(single_flight, KEY_1, fn)
+            while single_flight.coalesced_count == 0:
+                pass
+            release.set()
+            assert (first.result(), second.result()) == ('result', 'result')
+        assert fn.call_count == 1
+        assert single_flight.coalesced_count == 1
+
+    def test_should_call_on_coalesced_for_coalesced_call(self):
+        on_coalesced = Mock()
+        single_flight = SingleFlight(on_coalesced=on_coalesced)
+        started = threading.Event()
+        release = threading.Event()
+        fn = Mock(side_effect=lambda: (started.set(), release.wait(), 'result')[-1])
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(single_flight, KEY_1, fn)
+            started.wait()
+            second = executor.submit(single_flight, KEY_1, fn)
+            while single_flight.coalesced_count == 0:
+                pass
+            release.set()
+            first.result()
+            second.result()
+        on_coalesced.assert_called_once_with()
+
+    def test_should_not_share_in_flight_call_with_different_key(self):
+        single_flight = SingleFlight()
+        release = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            first = executor.submit(single_flight, KEY_1, lambda: release.wait() and 'first')
+            assert single_flight(KEY_2, lambda: 'second') == 'second'
+            release.set()
+            assert first.result() == 'first'
+        assert single_flight.coalesced_count == 0
+
+    def test_should_pass_on_exception(self):
+        single_flight = SingleFlight()
+
+        def fn():
+            raise ValueError('failed')
+
+        with pytest.raises(ValueError):
+            single_flight(KEY_1, fn)
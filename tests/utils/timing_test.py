@@ -0,0 +1,55 @@
+from peerscout.utils.timing import (
+    collecting_timings,
+    get_current_timing_collector,
+    timed,
+    timing_span
+)
+
+STAGE_1 = 'stage1'
+STAGE_2 = 'stage2'
+
+
+class TestTimingSpan:
+    def test_should_not_fail_if_timings_are_not_being_collected(self):
+        assert get_current_timing_collector() is None
+        with timing_span(STAGE_1):
+            pass
+
+    def test_should_collect_duration_of_stage(self):
+        with collecting_timings() as timings:
+            with timing_span(STAGE_1):
+                pass
+        assert list(timings.duration_by_stage.keys()) == [STAGE_1]
+        assert timings.duration_by_stage[STAGE_1] >= 0
+
+    def test_should_keep_order_in_which_nested_stages_started(self):
+        with collecting_timings() as timings:
+            with timing_span(STAGE_1):
+                with timing_span(STAGE_2):
+                    pass
+        assert list(timings.duration_by_stage.keys()) == [STAGE_1, STAGE_2]
+
+    def test_should_add_durations_of_repeated_stage(self):
+        with collecting_timings() as timings:
+            with timing_span(STAGE_1):
+                pass
+            first_duration = timings.duration_by_stage[STAGE_1]
+            with timing_span(STAGE_1):
+                pass
+        assert timings.duration_by_stage[STAGE_1] >= first_duration
+
+    def test_should_stop_collecting_after_context(self):
+        with collecting_timings():
+            pass
+        assert get_current_timing_collector() is None
+
+
+class TestTimed:
+    def test_should_return_result_and_collect_duration(self):
+        @timed(STAGE_1)
+        def f(x):
+            return x * 2
+
+        with collecting_timings() as timings:
+            assert f(3) == 6
+        assert list(timings.duration_by_stage.keys()) == [STAGE_1]